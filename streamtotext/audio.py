@@ -7,12 +7,13 @@ The two main base classes are :class:`AudioSource` which provides audio and
 
 
 import asyncio
-import audioop
+import bisect
 import collections
+import mmap
+import struct
 import time
 import wave
 
-import janus
 try:
     import pyaudio
 except ImportError:
@@ -20,6 +21,9 @@ except ImportError:
     # TODO(greghaynes): Only fail open during doc gen
     pass
 
+from streamtotext import dsp
+from streamtotext import metrics
+
 
 class NoMoreChunksError(Exception):
     pass
@@ -60,58 +64,313 @@ class AudioBlock(object):
     Blocks are used to deliniate continuous chunks of audio. As an example,
     when using the :class:`SquelchedSource` audio source a consumer often
     would like to know at what points the squelch was triggered on and off.
+
+    Ending a block is signalled in-band: :func:`end` marks the block as
+    ended and calls :func:`_wake` so that a subclass which may be waiting on
+    a producer can deliver a stop marker. Retrieving a chunk therefore costs
+    a single await on :func:`_next_chunk`.
+
+    When a :mod:`metrics` sink is set each chunk is timed and counted under
+    :attr:`metrics_stage`, the class name of the block by default.
     """
+    metrics_stage = None
+
     def __init__(self):
-        self._stopped = asyncio.Event()
+        self._ended = False
 
     def __aiter__(self):
         return self
 
     @property
     def ended(self):
-        return self._stopped.is_set()
+        return self._ended
 
     def end(self):
-        self._stopped.set()
+        if not self._ended:
+            self._ended = True
+            self._wake()
+
+    def _wake(self):
+        """Wake a consumer blocked in :func:`_next_chunk` after :func:`end`.
+
+        Subclasses which wait on a producer should override this.
+        """
+        pass
 
     async def __anext__(self):
-        if self._stopped.is_set():
+        if self._ended:
             raise StopAsyncIteration()
+        if metrics._sink is not None:
+            return await self._timed_next_chunk()
 
-        chunk_task = asyncio.ensure_future(self._next_chunk())
-        stop_task = asyncio.ensure_future(self._stopped.wait())
         try:
-            done, pending = await asyncio.wait(
-                [chunk_task, stop_task],
-                return_when=asyncio.FIRST_COMPLETED
-            )
+            return await self._next_chunk()
+        except StopAsyncIteration:
+            self._ended = True
+            raise
+
+    async def _timed_next_chunk(self):
+        stage = self.metrics_stage or self.__class__.__name__
+        timer = metrics.StageTimer(stage)
+        try:
+            chunk = await self._next_chunk()
+        except StopAsyncIteration:
+            timer.cancel()
+            self._ended = True
+            raise
+        except BaseException:
+            timer.cancel()
+            raise
+        timer.stop(chunk)
+        return chunk
 
-            for task in pending:
-                task.cancel()
 
-            if chunk_task.done():
-                try:
-                    return chunk_task.result()
-                except StopAsyncIteration:
-                    self.end()
-                    raise
-            else:
-                raise StopAsyncIteration()
-        finally:
-            chunk_task.cancel()
-            stop_task.cancel()
+class _BlockEnd(object):
+    """Stop marker placed on a queue by :func:`QueueAudioBlock.end`."""
+    __slots__ = ('block',)
+
+    def __init__(self, block):
+        self.block = block
+
+
+OVERFLOW_BLOCK = 'block'
+"""Wait for space when putting on a full queue."""
+OVERFLOW_DROP_OLDEST = 'drop-oldest'
+"""Discard the oldest queued item to make space."""
+OVERFLOW_DROP_NEWEST = 'drop-newest'
+"""Discard the item being put."""
+OVERFLOW_COALESCE = 'coalesce'
+"""Merge the chunk being put into the newest queued chunk."""
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST,
+                     OVERFLOW_DROP_NEWEST, OVERFLOW_COALESCE)
+
+
+DEFAULT_QUEUE_SIZE = 100
+"""Default maximum number of chunks queued by queue fed sources."""
+
+
+def _wake_next(waiters):
+    while waiters:
+        waiter = waiters.popleft()
+        if not waiter.done():
+            waiter.set_result(None)
+            return
+
+
+class OverflowQueue(object):
+    """An asyncio.Queue like queue with a policy for when it is full.
+
+    ``None`` and block end markers are control items: they are never
+    dropped or coalesced and are queued even when the queue is full, making
+    room by dropping the oldest item which is not a control item if needed,
+    unless the policy is :data:`OVERFLOW_BLOCK`.
+
+    Coalescing copies the queued chunk on every merge, so a merged chunk is
+    limited to max_coalesce_bytes. Once the newest queued chunk reaches it
+    the oldest item is dropped instead.
+
+    :parameter maxsize: Maximum number of queued items, 0 for no limit.
+    :type maxsize: int
+    :parameter overflow: One of :data:`OVERFLOW_POLICIES`.
+    :type overflow: str
+    :parameter max_coalesce_bytes: Maximum size of a coalesced chunk.
+    :type max_coalesce_bytes: int
+    """
+    def __init__(self, maxsize=0, overflow=OVERFLOW_BLOCK,
+                 max_coalesce_bytes=320000):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown overflow policy %s' % overflow)
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.max_coalesce_bytes = max_coalesce_bytes
+        self._items = collections.deque()
+        self._getters = collections.deque()
+        self._putters = collections.deque()
+        self._joiners = []
+        self._unfinished = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def qsize(self):
+        return len(self._items)
+
+    def empty(self):
+        return not self._items
+
+    def full(self):
+        return 0 < self.maxsize <= len(self._items)
+
+    def put_nowait(self, item):
+        if self.full():
+            if self.overflow == OVERFLOW_BLOCK:
+                raise asyncio.QueueFull()
+            if not self._is_control(item):
+                if self.overflow == OVERFLOW_DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                if self.overflow == OVERFLOW_COALESCE and self._coalesce(item):
+                    return
+            self._drop_oldest()
+        self._items.append(item)
+        self._unfinished += 1
+        depth = len(self._items)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        _wake_next(self._getters)
+
+    async def put(self, item):
+        if self.overflow == OVERFLOW_BLOCK:
+            while self.full():
+                await self._wait(self._putters)
+        self.put_nowait(item)
+
+    def get_nowait(self):
+        if not self._items:
+            raise asyncio.QueueEmpty()
+        item = self._items.popleft()
+        _wake_next(self._putters)
+        return item
+
+    async def get(self):
+        while not self._items:
+            await self._wait(self._getters)
+        return self.get_nowait()
+
+    def task_done(self):
+        if self._unfinished <= 0:
+            raise ValueError('task_done() called too many times')
+        self._unfinished -= 1
+        if not self._unfinished:
+            joiners = self._joiners
+            self._joiners = []
+            for joiner in joiners:
+                if not joiner.done():
+                    joiner.set_result(None)
+
+    async def join(self):
+        if self._unfinished:
+            joiner = asyncio.get_event_loop().create_future()
+            self._joiners.append(joiner)
+            await joiner
+
+    async def _wait(self, waiters):
+        waiter = asyncio.get_event_loop().create_future()
+        waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            waiter.cancel()
+            try:
+                waiters.remove(waiter)
+            except ValueError:
+                pass
+            if waiter.done() and not waiter.cancelled():
+                # Woken then cancelled, pass the wake up on
+                _wake_next(waiters)
+            raise
+
+    def offer(self, item):
+        """Put an item without waiting.
+
+        Unlike :func:`put_nowait` this never raises, an item which does not
+        fit a full :data:`OVERFLOW_BLOCK` queue is counted as dropped.
+
+        :ret: False if the item was dropped.
+        """
+        try:
+            self.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        return True
+
+    def _is_control(self, item):
+        return item is None or item.__class__ is _BlockEnd
+
+    def _drop_oldest(self):
+        # Control items are kept, a queue holding only control items grows
+        # past maxsize.
+        for ndx, item in enumerate(self._items):
+            if not self._is_control(item):
+                del self._items[ndx]
+                self.task_done()
+                self.dropped += 1
+                return
+
+    def _coalesce(self, chunk):
+        tail = self._items[-1]
+        if not isinstance(tail, AudioChunk):
+            return False
+        if (tail.width, tail.freq) != (chunk.width, chunk.freq):
+            return False
+        if len(tail.audio) + len(chunk.audio) > self.max_coalesce_bytes:
+            return False
+        self._items[-1] = merge_chunks((tail, chunk))
+        self.coalesced += 1
+        return True
+
+    def stats(self):
+        """Counters describing the queue.
+
+        :ret: dict with depth, max_depth, dropped and coalesced.
+        """
+        return {'depth': self.qsize(), 'max_depth': self.max_depth,
+                'dropped': self.dropped, 'coalesced': self.coalesced}
 
 
 class QueueAudioBlock(AudioBlock):
-    def __init__(self, queue=None):
-        self._q = queue or asyncio.Queue()
+    """An :class:`AudioBlock` fed from a queue of :class:`AudioChunk`.
+
+    A ``None`` item on the queue ends the block.
+
+    :parameter queue: Queue to read chunks from, a new
+        :class:`OverflowQueue` by default.
+    :type queue: OverflowQueue
+    :parameter maxsize: Size of the new queue, 0 for no limit.
+    :type maxsize: int
+    :parameter overflow: Overflow policy of the new queue.
+    :type overflow: str
+    """
+    def __init__(self, queue=None, maxsize=DEFAULT_QUEUE_SIZE,
+                 overflow=OVERFLOW_BLOCK):
+        self._q = queue or OverflowQueue(maxsize, overflow)
+        self._waiting = False
         super(QueueAudioBlock, self).__init__()
 
+    @property
+    def queue(self):
+        return self._q
+
+    def _wake(self):
+        # Only a consumer blocked on an empty queue needs a marker, anything
+        # else notices the ended flag on its next call.
+        if self._waiting:
+            try:
+                self._q.put_nowait(_BlockEnd(self))
+            except asyncio.QueueFull:
+                pass
+
     async def _next_chunk(self):
-        chunk = await self._q.get()
-        if chunk is None:
-            raise StopAsyncIteration('No more audio chunks')
-        return chunk
+        q = self._q
+        while True:
+            if q.empty():
+                self._waiting = True
+                try:
+                    chunk = await q.get()
+                finally:
+                    self._waiting = False
+            else:
+                chunk = q.get_nowait()
+
+            if chunk is None:
+                raise StopAsyncIteration('No more audio chunks')
+            if chunk.__class__ is _BlockEnd:
+                if chunk.block is self or self._ended:
+                    raise StopAsyncIteration('Block ended')
+                # Stale marker left by an earlier block sharing this queue
+                continue
+            return chunk
 
     async def add_chunk(self, chunk):
         await self._q.put(chunk)
@@ -135,6 +394,19 @@ def merge_chunks(chunks):
                       chunks[0].freq)
 
 
+def sample_time(chunk, sample_offset):
+    """Timestamp of a sample within an AudioChunk.
+
+    :param chunk: The chunk containing the sample.
+    :type chunk: AudioChunk
+    :param sample_offset: Index of the sample within the chunk.
+    :type sample_offset: int
+    """
+    if not sample_offset:
+        return chunk.start_time
+    return chunk.start_time + float(sample_offset) / chunk.freq
+
+
 def split_chunk(chunk, sample_offset):
     offset = int(sample_offset * chunk.width)
     first_audio = memoryview(chunk.audio)[:offset]
@@ -143,7 +415,8 @@ def split_chunk(chunk, sample_offset):
         chunk.start_time, first_audio, chunk.width, chunk.freq
     )
     second_chunk = AudioChunk(
-        chunk.start_time, second_audio, chunk.width, chunk.freq
+        sample_time(chunk, sample_offset), second_audio, chunk.width,
+        chunk.freq
     )
     return first_chunk, second_chunk
 
@@ -151,6 +424,11 @@ def split_chunk(chunk, sample_offset):
 class EvenChunkIterator(object):
     """Iterate over chunks from an audio source in even sized increments.
 
+    Each incoming byte is copied at most once. A resulting chunk which lies
+    entirely within an incoming chunk is a memoryview slice of it, one which
+    straddles incoming chunks is assembled in a preallocated bytearray.
+    Resulting chunks carry the exact start_time of their first sample.
+
     :parameter iterator: Iterator over audio chunks.
     :type iterator: Iterator
     :parameter chunk_size: Number of samples in resulting chunks
@@ -160,30 +438,58 @@ class EvenChunkIterator(object):
         self._iterator = iterator
         self._chunk_size = chunk_size
         self._cur_chunk = None
+        self._cur_view = None
+        self._cur_offset = 0
 
     def __aiter__(self):
         return self
 
+    async def _next_src_chunk(self):
+        chunk = self._cur_chunk
+        if chunk is None:
+            chunk = await self._iterator.__anext__()
+            self._cur_chunk = chunk
+            self._cur_view = None
+            self._cur_offset = 0
+        return chunk
+
+    def _take(self, chunk, n_bytes):
+        """Take up to n_bytes from the current incoming chunk."""
+        if self._cur_view is None:
+            self._cur_view = memoryview(chunk.audio)
+        start = self._cur_offset
+        end = min(start + n_bytes, len(self._cur_view))
+        if end == len(self._cur_view):
+            self._cur_chunk = None
+        else:
+            self._cur_offset = end
+        return self._cur_view[start:end]
+
     async def __anext__(self):
-        sample_queue = collections.deque()
+        chunk = await self._next_src_chunk()
+        width = chunk.width
+        need = self._chunk_size * width
+        start_time = sample_time(chunk, self._cur_offset // width)
 
-        ret_chunk_size = 0
-        while ret_chunk_size < self._chunk_size:
-            chunk = self._cur_chunk or await self._iterator.__anext__()
+        if self._cur_offset == 0 and len(chunk.audio) == need:
+            # Incoming chunk is already the right size
             self._cur_chunk = None
-            cur_chunk_size = chunk_sample_cnt(chunk)
-            ret_chunk_size += cur_chunk_size
-            sample_queue.append(chunk)
+            return chunk
 
-            if ret_chunk_size > self._chunk_size:
-                # We need to break up the chunk
-                merged_chunk = merge_chunks(sample_queue)
-                ret_chunk, leftover_chunk = split_chunk(merged_chunk,
-                                                        self._chunk_size)
-                self._cur_chunk = leftover_chunk
-                return ret_chunk
+        piece = self._take(chunk, need)
+        if len(piece) == need:
+            return AudioChunk(start_time, piece, width, chunk.freq)
 
-        return merge_chunks(sample_queue)
+        # Resulting chunk straddles incoming chunks
+        buff = bytearray(need)
+        fill = len(piece)
+        buff[:fill] = piece
+        while fill < need:
+            chunk = await self._next_src_chunk()
+            piece = self._take(chunk, need - fill)
+            buff[fill:fill + len(piece)] = piece
+            fill += len(piece)
+        return AudioChunk(start_time, buff, width, chunk.freq)
 
 
 class RememberingIterator(object):
@@ -204,6 +510,94 @@ class RememberingIterator(object):
         return self._buff
 
 
+class AudioRingBuffer(object):
+    """Hold the most recent seconds of audio.
+
+    Whole chunks are kept, the oldest are dropped once the chunks held span
+    more than max_seconds.
+
+    :parameter max_seconds: Seconds of audio to hold.
+    :type max_seconds: float
+    """
+    def __init__(self, max_seconds):
+        self.max_seconds = max_seconds
+        self._chunks = collections.deque()
+        self._samples = 0
+
+    def __len__(self):
+        return len(self._chunks)
+
+    @property
+    def seconds(self):
+        if not self._chunks:
+            return 0.
+        return float(self._samples) / self._chunks[0].freq
+
+    def append(self, chunk):
+        self._chunks.append(chunk)
+        self._samples += chunk_sample_cnt(chunk)
+        max_samples = self.max_seconds * chunk.freq
+        while self._samples > max_samples:
+            old = self._chunks.popleft()
+            self._samples -= chunk_sample_cnt(old)
+
+    def chunks(self):
+        return list(self._chunks)
+
+    def clear(self):
+        self._chunks.clear()
+        self._samples = 0
+
+
+def squelch_state(level, is_triggered, median_rms):
+    """Whether the squelch is triggered given the median rms of a window.
+
+    Once triggered, the squelch stays triggered until the median rms falls
+    below 80% of level.
+    """
+    if is_triggered:
+        return median_rms >= (level * .8)
+    else:
+        return median_rms > level
+
+
+class SquelchDetector(RememberingIterator):
+    """A :class:`RememberingIterator` tracking the median rms of its memory.
+
+    The rms of each chunk is computed once as it enters the window. Values
+    are kept in a sorted list maintained by bisection so the median is
+    available without rescanning or resorting the window.
+
+    :parameter iterator: Iterator over audio chunks.
+    :type iterator: Iterator
+    :parameter memory_size: Number of chunks in the sliding window.
+    :type memory_size: int
+    """
+    def __init__(self, iterator, memory_size):
+        super(SquelchDetector, self).__init__(iterator, memory_size)
+        self._rms_window = collections.deque()
+        self._sorted_rms = []
+        self._dsp = dsp.get_backend()
+
+    async def __anext__(self):
+        ret = await super(SquelchDetector, self).__anext__()
+        self.add_rms(self._dsp.rms(ret.audio, ret.width))
+        return ret
+
+    def add_rms(self, rms):
+        if len(self._rms_window) == self.memory_size:
+            old = self._rms_window.popleft()
+            del self._sorted_rms[bisect.bisect_left(self._sorted_rms, old)]
+        self._rms_window.append(rms)
+        bisect.insort(self._sorted_rms, rms)
+
+    def median_rms(self):
+        return self._sorted_rms[int(len(self._sorted_rms) * .5)]
+
+    def check(self, level, is_triggered):
+        return squelch_state(level, is_triggered, self.median_rms())
+
+
 class _ListenCtxtMgr(object):
     def __init__(self, source):
         self._source = source
@@ -256,8 +650,13 @@ class AudioSource(object):
         return self
 
     async def __anext__(self):
-        self._last_block = await self._next_block()
-        return self._last_block
+        block = await self._next_block()
+        if metrics._sink is not None:
+            block.metrics_stage = self.__class__.__name__
+            metrics._sink.increment('blocks_total',
+                                    stage=block.metrics_stage)
+        self._last_block = block
+        return block
 
 
 class SingleBlockAudioSource(AudioSource):
@@ -273,6 +672,32 @@ class SingleBlockAudioSource(AudioSource):
             return await self._get_block()
 
 
+class QueueAudioSource(SingleBlockAudioSource):
+    """An audio source fed with chunks by a producer.
+
+    The source provides a single :class:`QueueAudioBlock` which ends once
+    :func:`end` is called.
+
+    :parameter maxsize: Maximum number of queued chunks, 0 for no limit.
+    :type maxsize: int
+    :parameter overflow: Overflow policy of the queue.
+    :type overflow: str
+    """
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE, overflow=OVERFLOW_BLOCK):
+        super(QueueAudioSource, self).__init__()
+        self.queue = OverflowQueue(maxsize, overflow)
+
+    async def add_chunk(self, chunk):
+        await self.queue.put(chunk)
+
+    async def end(self):
+        """Signal that no more chunks will be added."""
+        await self.queue.put(None)
+
+    async def _get_block(self):
+        return QueueAudioBlock(self.queue)
+
+
 class AudioSourceProcessor(AudioSource):
     """Base class for being a pipeline processor of an :class:`AudioSource`
 
@@ -303,6 +728,11 @@ class AudioSourceProcessor(AudioSource):
 class Microphone(AudioSource):
     """Use a local microphone as an audio source.
 
+    Audio captured by PyAudio is queued for the consumer. A microphone
+    cannot wait for a slow consumer, so when a bounded queue is full chunks
+    are dropped or coalesced according to the overflow policy, and an
+    :data:`OVERFLOW_BLOCK` policy drops the newest chunk.
+
     :parameter audio_format: Sample format, default paInt16
     :type audio: PyAudio format
     :parameter channels: Number of channels in microphone.
@@ -311,26 +741,40 @@ class Microphone(AudioSource):
     :type rate: int
     :parameter device_ndx: PyAudio device index
     :type device_ndx: int
+    :parameter queue_size: Maximum number of queued chunks, 0 for no limit.
+    :type queue_size: int
+    :parameter overflow: Overflow policy of the queue.
+    :type overflow: str
     """
     def __init__(self,
                  audio_format=None,
                  channels=1,
                  rate=16000,
-                 device_ndx=0):
+                 device_ndx=0,
+                 queue_size=DEFAULT_QUEUE_SIZE,
+                 overflow=OVERFLOW_DROP_OLDEST):
         super(Microphone, self).__init__()
         audio_format = audio_format or pyaudio.paInt16
         self._format = audio_format
         self._channels = channels
         self._rate = rate
         self._device_ndx = device_ndx
+        self._queue_size = queue_size
+        self._overflow = overflow
         self._pyaudio = None
         self._stream = None
         self._stream_queue = None
+        self._loop = None
+
+    @property
+    def queue_stats(self):
+        """Counters of the capture queue, see :func:`OverflowQueue.stats`."""
+        return self._stream_queue.stats()
 
     async def start(self):
         await super(Microphone, self).start()
-        loop = asyncio.get_event_loop()
-        self._stream_queue = janus.Queue(loop=loop)
+        self._loop = asyncio.get_event_loop()
+        self._stream_queue = OverflowQueue(self._queue_size, self._overflow)
 
         self._pyaudio = pyaudio.PyAudio()
         self._stream = self._pyaudio.open(
@@ -343,20 +787,28 @@ class Microphone(AudioSource):
         )
 
     async def stop(self):
-        await self._stream_queue.async_q.put(None)
+        self._stream_queue.offer(None)
         await super(Microphone, self).stop()
         self._stream.stop_stream()
         self._stream.close()
         self._pyaudio.terminate()
 
     async def _next_block(self):
-        return QueueAudioBlock(self._stream_queue.async_q)
+        return QueueAudioBlock(self._stream_queue)
 
     def _stream_callback(self, in_data, frame_count,
                          time_info, status_flags):
-        chunk = AudioChunk(start_time=time_info['input_buffer_adc_time'],
+        # PortAudio times are on the stream's clock, start times are unix
+        # timestamps. Not all host APIs report them, in which case the
+        # buffer is assumed to have just been filled.
+        adc_time = time_info['input_buffer_adc_time']
+        if adc_time:
+            delay = time_info['current_time'] - adc_time
+        else:
+            delay = float(frame_count) / self._rate
+        chunk = AudioChunk(start_time=time.time() - delay,
                            audio=in_data, freq=self._rate, width=2)
-        self._stream_queue.sync_q.put(chunk)
+        self._loop.call_soon_threadsafe(self._stream_queue.offer, chunk)
         retflag = pyaudio.paContinue if self.running else pyaudio.paComplete
         return (None, retflag)
 
@@ -369,11 +821,12 @@ class _WaveAudioBlock(AudioBlock):
         self._sampwidth = sampwidth
         self._samprate = samprate
         self._n_channels = n_channels
+        self._dsp = dsp.get_backend()
 
     async def _next_chunk(self):
         frames = self._wave_fp.readframes(self._nframes)
         if self._n_channels == 2:
-            frames = audioop.tomono(frames, self._sampwidth, .5, .5)
+            frames = self._dsp.tomono(frames, self._sampwidth, .5, .5)
         if len(frames) == 0:
             raise StopAsyncIteration('No more frames in wav')
         chunk = AudioChunk(0, audio=frames, width=self._sampwidth,
@@ -420,6 +873,191 @@ class WaveSource(SingleBlockAudioSource):
                                self._width, self._channels)
 
 
+class WaveFormatError(Exception):
+    def __init__(self, path, msg):
+        super(WaveFormatError, self).__init__(
+            'Unsupported wave file %s: %s' % (path, msg)
+        )
+
+
+WaveInfo = collections.namedtuple('WaveInfo', ['freq', 'width', 'channels',
+                                               'nframes', 'data_offset'])
+"""Layout of a PCM wave file, see :func:`wave_info`."""
+
+
+# Sub format of WAVE_FORMAT_EXTENSIBLE PCM, KSDATAFORMAT_SUBTYPE_PCM
+_PCM_SUBFORMAT = (b'\x01\x00\x00\x00\x00\x00\x10\x00'
+                  b'\x80\x00\x00\xaa\x00\x38\x9b\x71')
+
+
+def _parse_wave_header(path, buff):
+    if buff[0:4] != b'RIFF' or buff[8:12] != b'WAVE':
+        raise WaveFormatError(path, 'not a RIFF WAVE file')
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(buff):
+        chunk_id = bytes(buff[pos:pos + 4])
+        chunk_size = struct.unpack_from('<I', buff, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b'fmt ':
+            fmt = struct.unpack_from('<HHIIHH', buff, body)
+            # 0xFFFE is WAVE_FORMAT_EXTENSIBLE, whose sub format follows
+            if fmt[0] == 0xFFFE:
+                if chunk_size < 40:
+                    raise WaveFormatError(path, 'truncated fmt chunk')
+                sub_format = bytes(buff[body + 24:body + 40])
+                if sub_format != _PCM_SUBFORMAT:
+                    raise WaveFormatError(path, 'extensible format is not '
+                                                'PCM')
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise WaveFormatError(path, 'data before fmt chunk')
+            tag, channels, freq, _, block_align, _ = fmt
+            # 1 is PCM
+            if tag not in (1, 0xFFFE):
+                raise WaveFormatError(path, 'format %d is not PCM' % tag)
+            data_size = min(chunk_size, len(buff) - body)
+            return WaveInfo(freq, block_align // channels, channels,
+                            data_size // block_align, body)
+        pos = body + chunk_size + (chunk_size & 1)
+    raise WaveFormatError(path, 'no data chunk')
+
+
+def wave_info(wave_path):
+    """Read the layout of a PCM wave file.
+
+    :param wave_path: Path to wave file.
+    :type wave_path: string
+    :ret: WaveInfo(freq, width, channels, nframes, data_offset)
+    """
+    with open(wave_path, 'rb') as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _parse_wave_header(wave_path, mm)
+
+
+def _time_to_frame(seconds, freq):
+    return int(round(seconds * freq))
+
+
+class _MappedWaveAudioBlock(AudioBlock):
+    def __init__(self, source):
+        super(_MappedWaveAudioBlock, self).__init__()
+        self._source = source
+        self._dsp = dsp.get_backend()
+
+    async def _next_chunk(self):
+        src = self._source
+        info = src.info
+        frame_size = info.width * info.channels
+        start = src._frame
+        end = min(start + src._chunk_frames, src._end_frame)
+        if start >= end:
+            raise StopAsyncIteration('No more frames in wav')
+        src._frame = end
+        offset = info.data_offset + start * frame_size
+        frames = src._view[offset:offset + (end - start) * frame_size]
+        if info.channels == 2:
+            frames = self._dsp.tomono(frames, info.width, .5, .5)
+        return AudioChunk(float(start) / info.freq, frames, info.width,
+                          info.freq)
+
+
+class MappedWaveSource(SingleBlockAudioSource):
+    """Use a memory mapped wave file as an audio source.
+
+    Chunks of a mono file are memoryviews of the mapped file rather than
+    copies. Chunk start times are seconds from the start of the file. A
+    source may cover part of a file, and :func:`split` divides a file into
+    segments which can be read, and transcribed, in parallel.
+
+    :parameter wave_path: Path to wave file.
+    :type wave_path: string
+    :parameter chunk_frames: Number of frames per chunk, the whole range by
+        default.
+    :type chunk_frames: int
+    :parameter start: Seconds from the start of the file to begin at.
+    :type start: float
+    :parameter end: Seconds from the start of the file to end at, the end
+        of the file if None.
+    :type end: float
+    """
+    def __init__(self, wave_path, chunk_frames=None, start=0., end=None):
+        super(MappedWaveSource, self).__init__()
+        self._wave_path = wave_path
+        self._chunk_frames_arg = chunk_frames
+        self._start = start
+        self._end = end
+        self.info = None
+        self._fp = None
+        self._mmap = None
+        self._view = None
+        self._frame = 0
+        self._end_frame = 0
+        self._chunk_frames = None
+
+    @property
+    def duration(self):
+        """Seconds of audio covered by the source, once started."""
+        start_frame = _time_to_frame(self._start, self.info.freq)
+        return float(self._end_frame - start_frame) / self.info.freq
+
+    async def start(self):
+        await super(MappedWaveSource, self).start()
+        self._fp = open(self._wave_path, 'rb')
+        self._mmap = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self.info = _parse_wave_header(self._wave_path, self._view)
+        assert self.info.channels <= 2
+        self._end_frame = self.info.nframes
+        if self._end is not None:
+            self._end_frame = min(self._end_frame,
+                                  _time_to_frame(self._end, self.info.freq))
+        self._chunk_frames = self._chunk_frames_arg or self.info.nframes
+        self.seek(self._start)
+
+    async def stop(self):
+        await super(MappedWaveSource, self).stop()
+        try:
+            self._view.release()
+            self._mmap.close()
+        except BufferError:
+            # Chunks still reference the mapping, it is unmapped once they
+            # are collected.
+            pass
+        self._fp.close()
+
+    def seek(self, seconds):
+        """Move to a time in the file, the next chunk read starts there."""
+        self._frame = max(0, min(_time_to_frame(seconds, self.info.freq),
+                                 self._end_frame))
+
+    def tell(self):
+        """Time in the file of the next chunk."""
+        return float(self._frame) / self.info.freq
+
+    def split(self, n_segments):
+        """Divide the source into consecutive segments.
+
+        :param n_segments: Number of segments.
+        :type n_segments: int
+        :ret: List of :class:`MappedWaveSource`, one per segment.
+        """
+        info = wave_info(self._wave_path)
+        start_frame = _time_to_frame(self._start, info.freq)
+        end_frame = info.nframes
+        if self._end is not None:
+            end_frame = min(end_frame, _time_to_frame(self._end, info.freq))
+        bounds = [start_frame + (end_frame - start_frame) * x // n_segments
+                  for x in range(n_segments + 1)]
+        return [MappedWaveSource(self._wave_path, self._chunk_frames_arg,
+                                 float(bounds[x]) / info.freq,
+                                 float(bounds[x + 1]) / info.freq)
+                for x in range(n_segments)]
+
+    async def _get_block(self):
+        return _MappedWaveAudioBlock(self)
+
+
 class _RateConvertBlock(AudioBlock):
     def __init__(self, src_block, n_channels, out_rate):
         super(_RateConvertBlock, self).__init__()
@@ -427,12 +1065,13 @@ class _RateConvertBlock(AudioBlock):
         self._n_channels = n_channels
         self._out_rate = out_rate
         self._state = None
+        self._dsp = dsp.get_backend()
 
     async def _next_chunk(self):
         chunk = await self._src_block.__anext__()
-        new_aud, self._state = audioop.ratecv(chunk.audio, 2, self._n_channels,
-                                              chunk.freq, self._out_rate,
-                                              self._state)
+        new_aud, self._state = self._dsp.ratecv(chunk.audio, 2,
+                                                self._n_channels, chunk.freq,
+                                                self._out_rate, self._state)
         return AudioChunk(chunk.start_time, new_aud, 2, self._out_rate)
 
 
@@ -448,28 +1087,88 @@ class RateConvert(AudioSourceProcessor):
 
 
 class SquelchedBlock(AudioBlock):
-    def __init__(self, source, squelch_level):
+    """Audio from a :class:`SquelchDetector` while the squelch is open.
+
+    The block starts with the pre-roll merged into one chunk, then any
+    chunks read ahead by :func:`read_ahead`. It ends once the squelch has
+    been closed for more than hangover seconds of audio, and the squelch
+    reopening within the hangover continues the block.
+
+    :parameter source: Detector the squelch triggered on.
+    :type source: SquelchDetector
+    :parameter squelch_level: RMS value of the squelch.
+    :type squelch_level: int
+    :parameter preroll: Chunks preceding the first chunk read from source,
+        the detector's memory if None.
+    :type preroll: list
+    :parameter hangover: Seconds of audio the block continues for after
+        the squelch closes.
+    :type hangover: float
+    :parameter ring: Pre-roll buffer of the next block, which audio read
+        but not emitted is added to.
+    :type ring: AudioRingBuffer
+    """
+    def __init__(self, source, squelch_level, preroll=None, hangover=0.,
+                 ring=None):
         super(SquelchedBlock, self).__init__()
         self._source = source
         self.squelch_level = squelch_level
+        self._preroll = preroll
+        self._hangover = hangover
+        self._ring = ring
         self._sent_mem = False
+        self._pending = collections.deque()
+        self._triggered = True
+        self._quiet_samples = 0
+
+    async def read_ahead(self, seconds):
+        """Read at least seconds of audio before the block is consumed.
+
+        :ret: False if the block ended first, in which case what was read
+            is dropped.
+        """
+        samples = 0
+        while True:
+            try:
+                chunk = await self._read()
+            except StopAsyncIteration:
+                self._drop_pending()
+                return False
+            self._pending.append(chunk)
+            samples += chunk_sample_cnt(chunk)
+            if samples >= seconds * chunk.freq:
+                return True
+
+    async def _read(self):
+        chunk = await self._source.__anext__()
+        if self._source.check(self.squelch_level, self._triggered):
+            self._triggered = True
+            self._quiet_samples = 0
+        else:
+            self._triggered = False
+            self._quiet_samples += chunk_sample_cnt(chunk)
+            if self._quiet_samples > self._hangover * chunk.freq:
+                self._pending.append(chunk)
+                self._drop_pending()
+                raise StopAsyncIteration()
+        return chunk
+
+    def _drop_pending(self):
+        if self._ring is not None:
+            for chunk in self._pending:
+                self._ring.append(chunk)
+        self._pending.clear()
 
     async def _next_chunk(self):
         if not self._sent_mem:
             self._sent_mem = True
-            return merge_chunks(self._source.memory())
-
-        async for chunk in self._source:
-            squelch_triggered = SquelchedSource.check_squelch(
-                self.squelch_level,
-                True,
-                self._source.memory()
-            )
-            if squelch_triggered:
-                return chunk
-            else:
-                raise StopAsyncIteration()
-        raise StopAsyncIteration()
+            preroll = self._preroll
+            if preroll is None:
+                preroll = self._source.memory()
+            return merge_chunks(preroll)
+        if self._pending:
+            return self._pending.popleft()
+        return await self._read()
 
 
 class SquelchedSource(AudioSourceProcessor):
@@ -484,6 +1183,15 @@ class SquelchedSource(AudioSourceProcessor):
     source begins to emit audio. Once the rms of the sliding window passes
     below 80% of the squelch level this source stop emitting audio.
 
+    Each block starts with a pre-roll of the audio preceding the trigger,
+    by default the sliding window. With preroll set the pre-roll is instead
+    the last preroll seconds of audio not already emitted, held in an
+    :class:`AudioRingBuffer`, so word onsets quieter than the squelch are
+    kept. With hangover set a block continues for up to hangover seconds
+    of audio after the squelch closes, so pauses shorter than that stay in
+    one block. Triggers on which the squelch does not stay open, including
+    hangover, for min_utterance seconds are dropped.
+
     :parameter source: Input source
     :type source: AudioSource
     :parameter sample_size: Size of each sample to inspect.
@@ -492,30 +1200,44 @@ class SquelchedSource(AudioSourceProcessor):
     :type squelch_level: int
     :parameter prefix_samples: Number of samples of sample_size to check
     :type prefix_samples: int
+    :parameter preroll: Seconds of audio preceding a trigger to start
+        blocks with, the sliding window if None.
+    :type preroll: float
+    :parameter hangover: Seconds of audio blocks continue for after the
+        squelch closes.
+    :type hangover: float
+    :parameter min_utterance: Minimum seconds of audio after a trigger
+        for a block to be emitted.
+    :type min_utterance: float
     """
     def __init__(self, source, sample_size=1600, squelch_level=None,
-                 prefix_samples=4):
+                 prefix_samples=4, preroll=None, hangover=0.,
+                 min_utterance=0.):
         super(SquelchedSource, self).__init__(source)
         self._sample_size = sample_size
         self.squelch_level = squelch_level
         self._prefix_samples = prefix_samples
+        self.preroll = preroll
+        self.hangover = hangover
+        self.min_utterance = min_utterance
         self._sample_width = 2
         self._src_block = None
+        self._ring = None
+        if preroll is not None:
+            self._ring = AudioRingBuffer(preroll)
+        self.dropped = 0
 
     @staticmethod
     def check_squelch(level, is_triggered, chunks):
-        rms_vals = [audioop.rms(x.audio, x.width) for x in chunks]
+        """Check the squelch over a list of chunks.
+
+        This recomputes the rms of every chunk, :class:`SquelchDetector`
+        should be preferred when checking a sliding window.
+        """
+        rms = dsp.get_backend().rms
+        rms_vals = [rms(x.audio, x.width) for x in chunks]
         median_rms = sorted(rms_vals)[int(len(rms_vals) * .5)]
-        if is_triggered:
-            if median_rms < (level * .8):
-                return False
-            else:
-                return True
-        else:
-            if median_rms > level:
-                return True
-            else:
-                return False
+        return squelch_state(level, is_triggered, median_rms)
 
     async def detect_squelch_level(self, detect_time=10, threshold=.8):
         start_time = time.time()
@@ -532,7 +1254,8 @@ class SquelchedSource(AudioSourceProcessor):
                 except StopAsyncIteration:
                     pass
 
-        rms_vals = [audioop.rms(x.audio, self._sample_width) for x in
+        rms = dsp.get_backend().rms
+        rms_vals = [rms(x.audio, self._sample_width) for x in
                     audio_chunks
                     if len(x.audio) == self._sample_size * self._sample_width]
         level = sorted(rms_vals)[int(threshold * len(rms_vals)):][0]
@@ -547,17 +1270,154 @@ class SquelchedSource(AudioSourceProcessor):
         if self._src_block is None or self._src_block.ended:
             self._src_block = await self._source.__anext__()
             even_iter = EvenChunkIterator(self._src_block, self._sample_size)
-            self._mem_iter = RememberingIterator(even_iter,
-                                                 self._prefix_samples)
-        async for _ in self._mem_iter:  # NOQA
-            if SquelchedSource.check_squelch(self.squelch_level,
-                                             False,
-                                             self._mem_iter.memory()):
-                return SquelchedBlock(self._mem_iter,
-                                      self.squelch_level)
+            self._mem_iter = SquelchDetector(even_iter, self._prefix_samples)
+        ring = self._ring
+        async for chunk in self._mem_iter:
+            if not self._mem_iter.check(self.squelch_level, False):
+                if ring is not None:
+                    ring.append(chunk)
+                continue
+            preroll = None
+            if ring is not None:
+                preroll = ring.chunks() + [chunk]
+                ring.clear()
+            block = SquelchedBlock(self._mem_iter, self.squelch_level,
+                                   preroll, self.hangover, ring)
+            if self.min_utterance > 0:
+                if not await block.read_ahead(self.min_utterance):
+                    self.dropped += 1
+                    continue
+            return block
         raise StopAsyncIteration()
 
 
+class _MonitoredBlock(AudioBlock):
+    def __init__(self, src_block, monitor):
+        super(_MonitoredBlock, self).__init__()
+        self._src_block = src_block
+        self._monitor = monitor
+
+    async def _next_chunk(self):
+        chunk = await self._src_block.__anext__()
+        self._monitor._observe(chunk)
+        return chunk
+
+
+class RealtimeMonitor(AudioSourceProcessor):
+    """Monitor whether consumers of a source keep up with real time.
+
+    Audio is passed through unchanged. As each chunk is consumed the time
+    between capture of its last sample and now is its lag. Over a sliding
+    window the realtime factor is the seconds of audio consumed per second
+    and drift is the change in lag per second, a positive drift means the
+    consumer is falling behind. The monitor is typically the last stage
+    before a transcriber.
+
+    By default capture times are the chunk start times, as for live sources
+    such as :class:`Microphone`. With use_start_times False capture times
+    are instead counted in audio from when the first chunk was consumed,
+    which suits sources whose start times are not wall clock times but which
+    deliver audio without gaps.
+
+    When lag rises above or falls back below one of thresholds, callback is
+    called with the monitor, the threshold and whether lag is now above it.
+    Callbacks are called from the consumer and should not block. When a
+    :mod:`metrics` sink is set lag is recorded as ``lag_seconds`` and
+    crossings as ``lag_threshold_crossings_total``, labelled by stream.
+
+    :parameter source: Input source
+    :type source: AudioSource
+    :parameter thresholds: Lags in seconds to call callback at.
+    :type thresholds: list
+    :parameter callback: Callable taking (monitor, threshold, exceeded).
+    :type callback: callable
+    :parameter window: Seconds over which realtime factor and drift are
+        measured.
+    :type window: float
+    :parameter use_start_times: Whether chunk start times are capture
+        times.
+    :type use_start_times: bool
+    :parameter stream_id: Name of the stream for metrics.
+    :type stream_id: str
+    """
+    def __init__(self, source, thresholds=(), callback=None, window=5.,
+                 use_start_times=True, stream_id=None):
+        super(RealtimeMonitor, self).__init__(source)
+        self.thresholds = sorted(thresholds)
+        self._callback = callback
+        self._window = window
+        self._use_start_times = use_start_times
+        self.stream_id = stream_id or 'default'
+        self._history = collections.deque()
+        self._exceeded = set()
+        self._origin = None
+        self.audio_time = 0.
+        self.lag = None
+
+    async def _next_block(self):
+        return _MonitoredBlock(await self._source.__anext__(), self)
+
+    def _window_rate(self, ndx):
+        if len(self._history) < 2:
+            return None
+        start = self._history[0]
+        end = self._history[-1]
+        if end[0] == start[0]:
+            return None
+        return (end[ndx] - start[ndx]) / (end[0] - start[0])
+
+    @property
+    def realtime_factor(self):
+        """Seconds of audio consumed per second over the window."""
+        return self._window_rate(1)
+
+    @property
+    def drift(self):
+        """Change in lag per second over the window."""
+        return self._window_rate(2)
+
+    def stats(self):
+        return {'stream_id': self.stream_id,
+                'lag': self.lag,
+                'realtime_factor': self.realtime_factor,
+                'drift': self.drift,
+                'audio_time': self.audio_time}
+
+    def _observe(self, chunk):
+        now = time.time()
+        duration = float(chunk_sample_cnt(chunk)) / chunk.freq
+        if self._use_start_times:
+            captured = chunk.start_time + duration
+        else:
+            if self._origin is None:
+                self._origin = now - duration
+            captured = self._origin + self.audio_time + duration
+        self.audio_time += duration
+        self.lag = lag = now - captured
+
+        history = self._history
+        history.append((now, self.audio_time, lag))
+        while now - history[0][0] > self._window:
+            history.popleft()
+
+        sink = metrics._sink
+        if sink is not None:
+            sink.observe('lag_seconds', lag, stream=self.stream_id)
+        for threshold in self.thresholds:
+            exceeded = lag > threshold
+            if exceeded == (threshold in self._exceeded):
+                continue
+            if exceeded:
+                self._exceeded.add(threshold)
+            else:
+                self._exceeded.discard(threshold)
+            if sink is not None:
+                sink.increment('lag_threshold_crossings_total',
+                               stream=self.stream_id, threshold=threshold)
+            if self._callback is not None:
+                self._callback(self, threshold, exceeded)
+
+
 class AudioPlayer(object):
     """Play audio from an audio source.
 
@@ -0,0 +1,5 @@
+"""Performance benchmarks for streamtotext components.
+
+Each module in this package can be run directly, e.g.
+``python -m streamtotext.benchmarks.block_iteration``.
+"""
@@ -0,0 +1,139 @@
+"""Compare chunk delivery rates of AudioBlock iteration strategies.
+
+The legacy strategy raced ``_next_chunk`` against a stop event with
+``asyncio.wait`` for every chunk. The current strategy signals stop in-band
+and delivers each chunk with a single await.
+"""
+
+import argparse
+import asyncio
+import io
+import time
+import wave
+
+from streamtotext import audio
+
+
+class LegacyIterationMixin(object):
+    """Chunk iteration as performed before in-band stop signalling."""
+
+    async def __anext__(self):
+        if self._ended:
+            raise StopAsyncIteration()
+
+        if getattr(self, '_legacy_stopped', None) is None:
+            self._legacy_stopped = asyncio.Event()
+        chunk_task = asyncio.ensure_future(self._next_chunk())
+        stop_task = asyncio.ensure_future(self._legacy_stopped.wait())
+        try:
+            done, pending = await asyncio.wait(
+                [chunk_task, stop_task],
+                return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for task in pending:
+                task.cancel()
+
+            if chunk_task.done():
+                try:
+                    return chunk_task.result()
+                except StopAsyncIteration:
+                    self.end()
+                    raise
+            else:
+                raise StopAsyncIteration()
+        finally:
+            chunk_task.cancel()
+            stop_task.cancel()
+
+
+class LegacyQueueAudioBlock(LegacyIterationMixin, audio.QueueAudioBlock):
+    pass
+
+
+class LegacyWaveAudioBlock(LegacyIterationMixin, audio._WaveAudioBlock):
+    pass
+
+
+class LegacyRateConvertBlock(LegacyIterationMixin, audio._RateConvertBlock):
+    pass
+
+
+def make_wave(seconds, freq=16000, channels=1):
+    """Create an in memory wave file of silence."""
+    buff = io.BytesIO()
+    wav = wave.open(buff, 'wb')
+    wav.setnchannels(channels)
+    wav.setsampwidth(2)
+    wav.setframerate(freq)
+    wav.writeframes(b'\0\0' * channels * int(seconds * freq))
+    wav.close()
+    buff.seek(0)
+    return buff
+
+
+async def drain(block):
+    cnt = 0
+    async for _ in block:  # NOQA
+        cnt += 1
+    return cnt
+
+
+def queue_block(block_cls, n_chunks, chunk_frames):
+    q = asyncio.Queue()
+    chunk = audio.AudioChunk(0, b'\0\0' * chunk_frames, 2, 16000)
+    for _ in range(n_chunks):
+        q.put_nowait(chunk)
+    q.put_nowait(None)
+    return block_cls(q)
+
+
+def wave_block(block_cls, n_chunks, chunk_frames):
+    wav = wave.open(make_wave(n_chunks * chunk_frames / 16000.))
+    return block_cls(wav, chunk_frames, 16000, 2, 1)
+
+
+def rate_convert_block(block_cls, n_chunks, chunk_frames):
+    src = queue_block(audio.QueueAudioBlock, n_chunks, chunk_frames)
+    return block_cls(src, 1, 8000)
+
+
+BENCHMARKS = (
+    ('QueueAudioBlock', queue_block,
+     LegacyQueueAudioBlock, audio.QueueAudioBlock),
+    ('_WaveAudioBlock', wave_block,
+     LegacyWaveAudioBlock, audio._WaveAudioBlock),
+    ('_RateConvertBlock', rate_convert_block,
+     LegacyRateConvertBlock, audio._RateConvertBlock),
+)
+
+
+def chunks_per_sec(loop, make_block, block_cls, n_chunks, chunk_frames):
+    block = make_block(block_cls, n_chunks, chunk_frames)
+    start = time.perf_counter()
+    cnt = loop.run_until_complete(drain(block))
+    return cnt / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--chunks', type=int, default=20000,
+                        help='Number of chunks per run.')
+    parser.add_argument('-f', '--chunk-frames', type=int, default=160,
+                        help='Samples per chunk.')
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    print('%-20s %14s %14s %8s' % ('block', 'legacy c/s', 'current c/s',
+                                   'speedup'))
+    for name, make_block, legacy_cls, cur_cls in BENCHMARKS:
+        legacy = chunks_per_sec(loop, make_block, legacy_cls, args.chunks,
+                                args.chunk_frames)
+        cur = chunks_per_sec(loop, make_block, cur_cls, args.chunks,
+                             args.chunk_frames)
+        print('%-20s %14.0f %14.0f %7.1fx' % (name, legacy, cur, cur / legacy))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Measure DSP backend throughput on long wave files.
+
+A stereo wave file of noise is generated and read through a
+``WaveSource`` (stereo downmix), ``RateConvert`` and a ``SquelchDetector``
+(rms) once per available backend.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import wave
+
+from streamtotext import audio
+from streamtotext import dsp
+
+
+def write_noise_wave(path, seconds, freq=44100):
+    rand = random.Random(0)
+    block = bytes(rand.getrandbits(8) for _ in range(freq * 4))
+    wav = wave.open(path, 'wb')
+    wav.setnchannels(2)
+    wav.setsampwidth(2)
+    wav.setframerate(freq)
+    for _ in range(int(seconds)):
+        wav.writeframes(block)
+    wav.close()
+
+
+async def run_pipeline(path, chunk_frames, out_rate):
+    wav = audio.WaveSource(path, chunk_frames=chunk_frames)
+    conv = audio.RateConvert(wav, 1, out_rate)
+    async with conv.listen():
+        block = await conv.__anext__()
+        detector = audio.SquelchDetector(block, 50)
+        async for _ in detector:  # NOQA
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-s', '--seconds', type=int, default=180,
+                        help='Length of the generated wave file.')
+    parser.add_argument('-f', '--chunk-frames', type=int, nargs='+',
+                        default=[1024, 8192, 65536],
+                        help='Frames read from the wave file per chunk.')
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    loop = asyncio.new_event_loop()
+    try:
+        write_noise_wave(path, args.seconds)
+        print('%-8s %12s %16s' % ('backend', 'chunk_frames',
+                                  'audio sec/sec'))
+        for backend_cls in dsp.BACKENDS:
+            if not backend_cls.available():
+                continue
+            dsp.set_backend(backend_cls.name)
+            for chunk_frames in args.chunk_frames:
+                start = time.perf_counter()
+                loop.run_until_complete(
+                    run_pipeline(path, chunk_frames, 16000)
+                )
+                elapsed = time.perf_counter() - start
+                print('%-8s %12d %16.1f' % (backend_cls.name, chunk_frames,
+                                            args.seconds / elapsed))
+    finally:
+        dsp.set_backend(None)
+        loop.close()
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Find the number of streams at which a pipeline falls behind real time.
+
+Generated sources from ``streamtotext.benchmarks.sources``, paced at
+``--speed`` times real time, are read through a pipeline by many streams
+at once. The number of streams is doubled until the p95 lag of streams
+behind their sources exceeds ``--max-lag`` seconds.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from streamtotext import audio
+from streamtotext import utils
+from streamtotext.benchmarks import sources
+
+
+FREQ = 16000
+
+SOURCES = {
+    'silence': sources.SilentAudioSource,
+    'tone': sources.ToneAudioSource,
+    'noise': sources.NoiseAudioSource,
+    'bursts': sources.BurstAudioSource,
+}
+
+
+def squelch(source):
+    return audio.SquelchedSource(source, squelch_level=1000)
+
+
+def rate_convert(source):
+    return audio.RateConvert(source, 1, 8000)
+
+
+def squelch_rate_convert(source):
+    return rate_convert(squelch(source))
+
+
+PIPELINES = {
+    'none': lambda source: source,
+    'squelch': squelch,
+    'rate_convert': rate_convert,
+    'squelch_rate_convert': squelch_rate_convert,
+}
+
+
+def run_level(loop, stream_cnt, source_cls, pipeline, seconds, speed,
+              chunk_samples):
+    """Run stream_cnt streams and measure their lag.
+
+    :ret: dict of results.
+    """
+    async def consume(source):
+        await sources.drain_source(pipeline(source))
+
+    chunk_cnt = int(seconds * FREQ / chunk_samples)
+    start = time.perf_counter()
+    streams = loop.run_until_complete(sources.fan_out(
+        stream_cnt, source_cls, consume, chunk_samples=chunk_samples,
+        sample_rate=FREQ, speed=speed, chunk_cnt=chunk_cnt
+    ))
+    wall_time = time.perf_counter() - start
+    lags = [x.block.max_lag for x in streams]
+    return {
+        'streams': stream_cnt,
+        'wall_seconds': wall_time,
+        'audio_seconds_per_second': stream_cnt * seconds / wall_time,
+        'lag_p50': utils.percentile(lags, 50),
+        'lag_p95': utils.percentile(lags, 95),
+        'lag_max': max(lags),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', choices=sorted(SOURCES),
+                        default='bursts',
+                        help='Generated audio for each stream.')
+    parser.add_argument('--pipeline', choices=sorted(PIPELINES),
+                        default='squelch_rate_convert',
+                        help='Processing applied to each stream.')
+    parser.add_argument('-s', '--seconds', type=float, default=5,
+                        help='Seconds of audio per stream.')
+    parser.add_argument('--speed', type=float, default=1.,
+                        help='Multiple of real time to generate audio at.')
+    parser.add_argument('-f', '--chunk-frames', type=int, default=1600,
+                        help='Samples per chunk.')
+    parser.add_argument('--start-streams', type=int, default=16,
+                        help='Number of streams to start with.')
+    parser.add_argument('--max-streams', type=int, default=16384,
+                        help='Number of streams to stop at.')
+    parser.add_argument('--max-lag', type=float, default=.1,
+                        help='Lag in seconds at which a pipeline is behind '
+                             'real time.')
+    parser.add_argument('-o', '--output',
+                        help='File to write JSON results to.')
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = []
+    stream_cnt = args.start_streams
+    behind_at = None
+    print('%8s %12s %10s %10s' % ('streams', 'audio s/s', 'p95 lag',
+                                  'max lag'))
+    try:
+        while stream_cnt <= args.max_streams:
+            result = run_level(loop, stream_cnt, SOURCES[args.source],
+                               PIPELINES[args.pipeline], args.seconds,
+                               args.speed, args.chunk_frames)
+            results.append(result)
+            print('%8d %12.1f %10.3f %10.3f' % (
+                stream_cnt, result['audio_seconds_per_second'],
+                result['lag_p95'], result['lag_max']
+            ))
+            if result['lag_p95'] > args.max_lag:
+                behind_at = stream_cnt
+                break
+            stream_cnt *= 2
+    finally:
+        loop.close()
+
+    if behind_at is None:
+        print('Kept up with real time up to %d streams' % (stream_cnt // 2))
+    else:
+        print('Fell behind real time at %d streams' % behind_at)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump({'source': args.source, 'pipeline': args.pipeline,
+                       'speed': args.speed, 'behind_at': behind_at,
+                       'results': results}, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
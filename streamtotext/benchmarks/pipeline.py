@@ -0,0 +1,260 @@
+"""Benchmark the audio pipeline and transcribers.
+
+Synthetic tone and noise sources from ``streamtotext.benchmarks.sources``,
+which generate audio as fast as it is consumed, are read through each
+component for several chunk sizes, measuring chunks and bytes per second.
+The Watson transcriber is measured against a local fake websocket server.
+
+Results are printed as a table and can be written as JSON with
+``--output``. Passing a previous JSON result with ``--baseline`` reports
+benchmarks whose throughput regressed, and exits with a non zero status if
+any did.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import wave
+
+from streamtotext import audio
+from streamtotext import dsp
+from streamtotext import transcriber
+from streamtotext.benchmarks import sources
+from streamtotext.tests import watson_fakes
+
+
+FREQ = 16000
+
+
+async def _drain_iter(iterator, start):
+    chunks = 0
+    n_bytes = 0
+    async for chunk in iterator:
+        chunks += 1
+        n_bytes += len(chunk.audio)
+    return chunks, n_bytes, time.perf_counter() - start
+
+
+async def _drain_source(source, start):
+    chunks = 0
+    n_bytes = 0
+    async with source.listen():
+        async for block in source:
+            async for chunk in block:
+                chunks += 1
+                n_bytes += len(chunk.audio)
+    return chunks, n_bytes, time.perf_counter() - start
+
+
+async def bench_even_chunk_iterator(chunk_cnt, chunk_frames, ctx):
+    block = sources.ToneAudioBlock(chunk_samples=chunk_frames,
+                                   speed=None, chunk_cnt=chunk_cnt)
+    return await _drain_iter(audio.EvenChunkIterator(block, 1600),
+                             time.perf_counter())
+
+
+async def bench_remembering_iterator(chunk_cnt, chunk_frames, ctx):
+    block = sources.ToneAudioBlock(chunk_samples=chunk_frames,
+                                   speed=None, chunk_cnt=chunk_cnt)
+    return await _drain_iter(audio.RememberingIterator(block, 4),
+                             time.perf_counter())
+
+
+async def bench_squelched_source(chunk_cnt, chunk_frames, ctx):
+    src = audio.SquelchedSource(
+        sources.NoiseAudioSource(chunk_samples=chunk_frames, speed=None,
+                                 chunk_cnt=chunk_cnt),
+        squelch_level=1000
+    )
+    return await _drain_source(src, time.perf_counter())
+
+
+async def bench_rate_convert(chunk_cnt, chunk_frames, ctx):
+    src = audio.RateConvert(
+        sources.NoiseAudioSource(chunk_samples=chunk_frames, speed=None,
+                                 chunk_cnt=chunk_cnt), 1, 8000
+    )
+    return await _drain_source(src, time.perf_counter())
+
+
+async def bench_wave_source(chunk_cnt, chunk_frames, ctx):
+    return await _drain_source(
+        audio.WaveSource(ctx['wave_path'], chunk_frames=chunk_frames),
+        time.perf_counter()
+    )
+
+
+async def bench_mapped_wave_source(chunk_cnt, chunk_frames, ctx):
+    return await _drain_source(
+        audio.MappedWaveSource(ctx['wave_path'], chunk_frames=chunk_frames),
+        time.perf_counter()
+    )
+
+
+async def bench_watson(chunk_cnt, chunk_frames, ctx):
+    server = watson_fakes.FakeWatsonServer()
+    await server.start()
+    pool = transcriber.WatsonConnectionPool('user', 'pass', host=server.host,
+                                            uri_base='', secure=False)
+    try:
+        await pool.warm(1)
+        src = sources.ToneAudioSource(chunk_samples=chunk_frames,
+                                      speed=None, chunk_cnt=chunk_cnt)
+        ts = transcriber.WatsonTranscriber(src, FREQ, 'user', 'pass',
+                                           connection_pool=pool)
+        start = time.perf_counter()
+        await ts.transcribe()
+        elapsed = time.perf_counter() - start
+    finally:
+        await pool.close()
+        await server.stop()
+    return chunk_cnt, server.audio_bytes, elapsed
+
+
+BENCHMARKS = (
+    ('EvenChunkIterator', bench_even_chunk_iterator),
+    ('RememberingIterator', bench_remembering_iterator),
+    ('SquelchedSource', bench_squelched_source),
+    ('RateConvert', bench_rate_convert),
+    ('WaveSource', bench_wave_source),
+    ('MappedWaveSource', bench_mapped_wave_source),
+    ('WatsonTranscriber', bench_watson),
+)
+
+
+def write_noise_wave(path, seconds):
+    period = sources.NoiseAudioBlock(sample_rate=FREQ).gen_period()
+    wav = wave.open(path, 'wb')
+    wav.setnchannels(1)
+    wav.setsampwidth(2)
+    wav.setframerate(FREQ)
+    for _ in range(int(seconds)):
+        wav.writeframes(period)
+    wav.close()
+
+
+def run(names, chunk_frames_list, seconds, repeat=1):
+    """Run benchmarks.
+
+    :param names: Names of benchmarks to run, all if empty.
+    :type names: list
+    :param chunk_frames_list: Chunk sizes to run each benchmark with.
+    :type chunk_frames_list: list
+    :param seconds: Seconds of audio per run.
+    :type seconds: int
+    :param repeat: Number of runs, the fastest is reported.
+    :type repeat: int
+    :ret: List of result dicts.
+    """
+    fd, wave_path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    ctx = {'wave_path': wave_path}
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = []
+    try:
+        write_noise_wave(wave_path, seconds)
+        for name, bench in BENCHMARKS:
+            if names and name not in names:
+                continue
+            for chunk_frames in chunk_frames_list:
+                chunk_cnt = seconds * FREQ // chunk_frames
+                chunks, n_bytes, elapsed = min(
+                    (loop.run_until_complete(bench(chunk_cnt, chunk_frames,
+                                                   ctx))
+                     for _ in range(repeat)),
+                    key=lambda x: x[2]
+                )
+                results.append({
+                    'benchmark': name,
+                    'chunk_frames': chunk_frames,
+                    'chunks': chunks,
+                    'bytes': n_bytes,
+                    'seconds': elapsed,
+                    'chunks_per_sec': chunks / elapsed,
+                    'bytes_per_sec': n_bytes / elapsed,
+                })
+    finally:
+        loop.close()
+        os.remove(wave_path)
+    return results
+
+
+def compare(baseline, results, tolerance):
+    """Find results slower than a baseline.
+
+    :param baseline: Results from a previous :func:`run`.
+    :type baseline: list
+    :param tolerance: Allowed fractional drop in bytes per second.
+    :type tolerance: float
+    :ret: List of (benchmark, chunk_frames, ratio) of regressed results.
+    """
+    base_rates = dict(((x['benchmark'], x['chunk_frames']),
+                       x['bytes_per_sec']) for x in baseline)
+    regressions = []
+    for result in results:
+        key = (result['benchmark'], result['chunk_frames'])
+        if key not in base_rates:
+            continue
+        ratio = result['bytes_per_sec'] / base_rates[key]
+        if ratio < 1 - tolerance:
+            regressions.append(key + (ratio,))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-b', '--benchmark', action='append', default=[],
+                        help='Benchmark to run, may be repeated. All by '
+                             'default.')
+    parser.add_argument('-f', '--chunk-frames', type=int, nargs='+',
+                        default=[160, 1600, 16000],
+                        help='Samples per chunk.')
+    parser.add_argument('-s', '--seconds', type=int, default=60,
+                        help='Seconds of audio per run.')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Runs per benchmark, the fastest is kept.')
+    parser.add_argument('-o', '--output',
+                        help='File to write JSON results to.')
+    parser.add_argument('--baseline',
+                        help='JSON results to compare against.')
+    parser.add_argument('--tolerance', type=float, default=.1,
+                        help='Allowed fractional drop in throughput.')
+    args = parser.parse_args()
+
+    results = run(args.benchmark, args.chunk_frames, args.seconds,
+                  args.repeat)
+    print('%-20s %12s %14s %14s' % ('benchmark', 'chunk_frames',
+                                    'chunks/sec', 'MB/sec'))
+    for result in results:
+        print('%-20s %12d %14.0f %14.2f' % (
+            result['benchmark'], result['chunk_frames'],
+            result['chunks_per_sec'], result['bytes_per_sec'] / 1e6
+        ))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump({'python': platform.python_version(),
+                       'dsp_backend': dsp.get_backend().name,
+                       'seconds': args.seconds,
+                       'results': results}, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)['results']
+        regressions = compare(baseline, results, args.tolerance)
+        for name, chunk_frames, ratio in regressions:
+            print('REGRESSION %s chunk_frames=%d at %.0f%% of baseline' % (
+                name, chunk_frames, ratio * 100
+            ))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
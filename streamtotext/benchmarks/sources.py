@@ -0,0 +1,246 @@
+"""Generated audio sources
+
+Tone, noise and speech-like burst sources paced relative to real time, for
+benchmarks and tests which need audio without a microphone or files.
+"""
+
+import asyncio
+import functools
+import math
+import random
+import struct
+import time
+import wave
+
+from streamtotext import audio
+
+
+class GeneratedAudioBlock(audio.AudioBlock):
+    """Generates audio paced relative to real time.
+
+    Chunk n is delivered once n chunk durations, divided by speed, have
+    passed since the first chunk. A block which is consumed late does not
+    catch up by delivering larger chunks, the delay is recorded in
+    :attr:`max_lag` instead.
+
+    Subclasses implement :func:`gen_period`, and samples are sliced from the
+    repeated period so generating a chunk costs little more than a copy.
+    Periods are generated when the block is created and cached between
+    blocks with the same settings.
+
+    :parameter chunk_samples: Samples per chunk.
+    :type chunk_samples: int
+    :parameter sample_rate: Sampling frequency.
+    :type sample_rate: int
+    :parameter speed: Multiple of real time to generate audio at, None to
+        generate audio as fast as it is consumed.
+    :type speed: float
+    :parameter chunk_cnt: Number of chunks to generate, None for no limit.
+    :type chunk_cnt: int
+    """
+    def __init__(self, chunk_samples=1600, sample_rate=16000, speed=1.,
+                 chunk_cnt=None):
+        super(GeneratedAudioBlock, self).__init__()
+        self._chunk_samples = chunk_samples
+        self._sample_rate = sample_rate
+        self._speed = speed
+        self._chunk_cnt = chunk_cnt
+        self._chunk_ndx = 0
+        self._start_time = None
+        period = self.gen_period()
+        # Repeat the period so a chunk is always a single slice of it
+        self._period_len = len(period)
+        self._period = period * (2 + chunk_samples * 2 // len(period))
+        self._period_offset = 0
+        self.max_lag = 0.
+
+    @property
+    def chunk_duration(self):
+        return float(self._chunk_samples) / self._sample_rate
+
+    async def _next_chunk(self):
+        if self._chunk_cnt is not None and self._chunk_ndx >= self._chunk_cnt:
+            raise StopAsyncIteration()
+        cur_time = time.time()
+        if self._start_time is None:
+            self._start_time = cur_time
+        ndx = self._chunk_ndx
+        self._chunk_ndx += 1
+        if self._speed:
+            due = self._start_time + ndx * self.chunk_duration / self._speed
+            if due > cur_time:
+                await asyncio.sleep(due - cur_time)
+            else:
+                self.max_lag = max(self.max_lag, cur_time - due)
+        return self.gen_sample(self._start_time + ndx * self.chunk_duration,
+                               self._chunk_samples)
+
+    def gen_period(self):
+        """16 bit audio which is repeated, one second of silence here."""
+        return b'\0\0' * self._sample_rate
+
+    def gen_sample(self, start_time, sample_cnt):
+        n_bytes = sample_cnt * 2
+        offset = self._period_offset
+        self._period_offset = (offset + n_bytes) % self._period_len
+        return audio.AudioChunk(start_time=start_time,
+                                audio=self._period[offset:offset + n_bytes],
+                                width=2, freq=self._sample_rate)
+
+
+class SilentAudioBlock(GeneratedAudioBlock):
+    def gen_period(self):
+        return b'\0\0'
+
+    def gen_sample(self, start_time, sample_cnt):
+        sample = b'\0\0' * sample_cnt
+        return audio.AudioChunk(start_time=start_time, audio=sample,
+                                width=2, freq=self._sample_rate)
+
+
+class ToneAudioBlock(GeneratedAudioBlock):
+    def __init__(self, tone_freq=440, amplitude=8000, **kwargs):
+        self._tone_freq = tone_freq
+        self._amplitude = amplitude
+        super(ToneAudioBlock, self).__init__(**kwargs)
+
+    def gen_period(self):
+        return _tone(self._sample_rate, self._sample_rate, self._tone_freq,
+                     self._amplitude)
+
+
+class NoiseAudioBlock(GeneratedAudioBlock):
+    """White noise."""
+    def __init__(self, amplitude=8000, seed=0, **kwargs):
+        self._amplitude = amplitude
+        self._seed = seed
+        super(NoiseAudioBlock, self).__init__(**kwargs)
+
+    def gen_period(self):
+        return _noise(self._sample_rate, self._amplitude, self._seed)
+
+
+class BurstAudioBlock(GeneratedAudioBlock):
+    """Speech-like bursts of voiced audio separated by quiet.
+
+    Each burst_period starts with duty_cycle * burst_period seconds of
+    harmonics of a voice-like fundamental, modulated at a syllable rate,
+    followed by low level noise.
+    """
+    def __init__(self, duty_cycle=.5, burst_period=2., amplitude=8000,
+                 seed=0, **kwargs):
+        self._duty_cycle = duty_cycle
+        self._burst_period = burst_period
+        self._amplitude = amplitude
+        self._seed = seed
+        super(BurstAudioBlock, self).__init__(**kwargs)
+
+    def gen_period(self):
+        return _bursts(int(self._burst_period * self._sample_rate),
+                       self._sample_rate, self._duty_cycle, self._amplitude,
+                       self._seed)
+
+
+class GeneratedAudioSource(audio.SingleBlockAudioSource):
+    """Source of a single generated block.
+
+    Keyword arguments are passed to block_cls.
+    """
+    block_cls = SilentAudioBlock
+
+    def __init__(self, **kwargs):
+        super(GeneratedAudioSource, self).__init__()
+        self._block_kwargs = kwargs
+        self.block = None
+
+    async def _get_block(self):
+        self.block = self.block_cls(**self._block_kwargs)
+        return self.block
+
+
+class SilentAudioSource(GeneratedAudioSource):
+    block_cls = SilentAudioBlock
+
+
+class ToneAudioSource(GeneratedAudioSource):
+    block_cls = ToneAudioBlock
+
+
+class NoiseAudioSource(GeneratedAudioSource):
+    block_cls = NoiseAudioBlock
+
+
+class BurstAudioSource(GeneratedAudioSource):
+    block_cls = BurstAudioBlock
+
+
+async def drain_source(source):
+    """Consume all audio from a source."""
+    async with source.listen():
+        async for block in source:
+            async for _ in block:  # NOQA
+                pass
+
+
+async def fan_out(stream_cnt, source_cls=SilentAudioSource,
+                  pipeline=drain_source, **source_kwargs):
+    """Run a pipeline over many generated sources at once.
+
+    :param stream_cnt: Number of sources.
+    :type stream_cnt: int
+    :param source_cls: Subclass of :class:`GeneratedAudioSource` to create,
+        with source_kwargs.
+    :param pipeline: Coroutine function consuming a source.
+    :ret: The sources, whose blocks record their lag behind real time.
+    """
+    sources = [source_cls(**source_kwargs) for _ in range(stream_cnt)]
+    await asyncio.gather(*[pipeline(x) for x in sources])
+    return sources
+
+
+@functools.lru_cache()
+def _tone(sample_cnt, sample_rate, tone_freq, amplitude):
+    return struct.pack('<%dh' % sample_cnt, *[
+        int(amplitude * math.sin(2 * math.pi * tone_freq * ndx / sample_rate))
+        for ndx in range(sample_cnt)
+    ])
+
+
+@functools.lru_cache()
+def _noise(sample_cnt, amplitude, seed):
+    rand = random.Random(seed)
+    return struct.pack('<%dh' % sample_cnt, *[
+        rand.randint(-amplitude, amplitude) for _ in range(sample_cnt)
+    ])
+
+
+@functools.lru_cache()
+def _bursts(sample_cnt, sample_rate, duty_cycle, amplitude, seed):
+    rand = random.Random(seed)
+    voiced_cnt = int(sample_cnt * duty_cycle)
+    samples = []
+    for ndx in range(sample_cnt):
+        sample = rand.randint(-amplitude, amplitude) // 50
+        if ndx < voiced_cnt:
+            t = float(ndx) / sample_rate
+            envelope = abs(math.sin(math.pi * 4 * t))
+            voice = sum(math.sin(2 * math.pi * 150 * x * t) / x
+                        for x in range(1, 4))
+            sample += int(amplitude * .5 * envelope * voice)
+        samples.append(sample)
+    return struct.pack('<%dh' % sample_cnt, *samples)
+
+
+def write_tone_wave(path, segments, freq=16000, tone_freq=440):
+    """Write a mono 16 bit wave file of tones and silence.
+
+    :param segments: List of (seconds, amplitude) tuples, an amplitude of 0
+        is silence.
+    """
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(freq)
+        for seconds, amplitude in segments:
+            wav.writeframes(_tone(int(seconds * freq), freq, tone_freq,
+                                  amplitude))
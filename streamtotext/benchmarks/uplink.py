@@ -0,0 +1,117 @@
+"""Measure bytes sent to Watson with each uplink encoding.
+
+Generated audio from ``streamtotext.benchmarks.sources`` is transcribed by
+:class:`transcriber.WatsonTranscriber` against a local fake websocket
+server for each encoding in :data:`uplink.ENCODERS` whose encoder program
+is installed, reporting the audio bytes the server received, the
+reduction against unencoded ``audio/l16``, and the websocket frames sent.
+Passing ``--frame-delay`` joins audio into larger frames with
+:class:`uplink.CoalescingSender`.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from streamtotext import transcriber
+from streamtotext import uplink
+from streamtotext.benchmarks import sources
+from streamtotext.tests import watson_fakes
+
+
+FREQ = 16000
+
+SOURCES = {
+    'tone': sources.ToneAudioSource,
+    'noise': sources.NoiseAudioSource,
+    'bursts': sources.BurstAudioSource,
+}
+
+
+async def bench_encoding(encoding, source_cls, seconds, chunk_frames,
+                         frame_delay=None):
+    server = watson_fakes.FakeWatsonServer()
+    await server.start()
+    pool = transcriber.WatsonConnectionPool('user', 'pass', host=server.host,
+                                            uri_base='', secure=False)
+    try:
+        await pool.warm(1)
+        src = source_cls(chunk_samples=chunk_frames, sample_rate=FREQ,
+                         speed=None,
+                         chunk_cnt=int(seconds * FREQ / chunk_frames))
+        ts = transcriber.WatsonTranscriber(src, FREQ, 'user', 'pass',
+                                           connection_pool=pool,
+                                           encoding=encoding,
+                                           frame_delay=frame_delay)
+        start = time.perf_counter()
+        await ts.transcribe()
+        elapsed = time.perf_counter() - start
+    finally:
+        await pool.close()
+        await server.stop()
+    stats = ts.uplink_stats()
+    return {
+        'encoding': encoding,
+        'audio_bytes': stats['bytes_in'],
+        'wire_bytes': server.audio_bytes,
+        'ratio': float(server.audio_bytes) / stats['bytes_in'],
+        'frames': server.audio_frames,
+        'frames_per_sec': stats['frames_per_sec'],
+        'avg_frame_size': stats['avg_frame_size'],
+        'seconds': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', choices=sorted(SOURCES),
+                        default='bursts',
+                        help='Generated audio to transcribe.')
+    parser.add_argument('-s', '--seconds', type=float, default=30,
+                        help='Seconds of audio to transcribe.')
+    parser.add_argument('-f', '--chunk-frames', type=int, default=1600,
+                        help='Samples per chunk.')
+    parser.add_argument('--frame-delay', type=float,
+                        help='Maximum seconds audio is held back to join '
+                             'it into larger frames.')
+    parser.add_argument('-o', '--output',
+                        help='File to write JSON results to.')
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = []
+    print('%-8s %12s %12s %10s %8s %10s %10s' % (
+        'encoding', 'audio bytes', 'wire bytes', 'reduction', 'frames',
+        'avg frame', 'seconds'
+    ))
+    try:
+        for encoding, encoder_cls in sorted(uplink.ENCODERS.items()):
+            if not encoder_cls.available():
+                print('%-8s skipped, %s is not installed' % (
+                    encoding, encoder_cls.program
+                ))
+                continue
+            result = loop.run_until_complete(bench_encoding(
+                encoding, SOURCES[args.source], args.seconds,
+                args.chunk_frames, args.frame_delay
+            ))
+            results.append(result)
+            print('%-8s %12d %12d %9.1f%% %8d %10.0f %10.3f' % (
+                encoding, result['audio_bytes'], result['wire_bytes'],
+                (1 - result['ratio']) * 100, result['frames'],
+                result['avg_frame_size'], result['seconds']
+            ))
+    finally:
+        loop.close()
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump({'source': args.source, 'seconds': args.seconds,
+                       'frame_delay': args.frame_delay,
+                       'results': results}, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark parsing of Watson result messages.
+
+Synthetic interim and final result messages, shaped like those Watson sends
+with interim results, three alternatives, word confidences and timestamps,
+are decoded and turned into :class:`transcriber.TranscribeEvent` with each
+available JSON backend, measuring messages per second. Runs which also
+access word timestamps and confidences measure the cost of the lazily
+parsed fields.
+"""
+
+import argparse
+import json
+import time
+
+from streamtotext import transcriber
+
+
+WORDS = ('the quick brown fox jumps over the lazy dog and keeps on running '
+         'through the field until the sun goes down').split()
+
+
+def interim_msg(n_words):
+    words = WORDS[:n_words]
+    return json.dumps({
+        'result_index': 0,
+        'results': [{
+            'final': False,
+            'alternatives': [{'transcript': ' '.join(words)}],
+        }],
+    })
+
+
+def final_msg(n_words, n_alternatives=3):
+    words = WORDS[:n_words]
+    first = {
+        'transcript': ' '.join(words),
+        'confidence': .9,
+        'timestamps': [[w, ndx * .4, ndx * .4 + .3]
+                       for ndx, w in enumerate(words)],
+        'word_confidence': [[w, .9] for w in words],
+    }
+    others = [{'transcript': ' '.join(words[:-1])}
+              for _ in range(n_alternatives - 1)]
+    return json.dumps({
+        'result_index': 0,
+        'results': [{'final': True, 'alternatives': [first] + others}],
+    })
+
+
+def messages(count, n_words, finals_every=10):
+    """Interim results for growing transcripts, then a final."""
+    ret = []
+    for ndx in range(count):
+        step = ndx % finals_every
+        if step == finals_every - 1:
+            ret.append(final_msg(n_words))
+        else:
+            ret.append(interim_msg(1 + step * n_words // finals_every))
+    return ret
+
+
+def parse(msgs, words):
+    loads = transcriber._json_loads
+    to_event = transcriber._watson_msg_to_event
+    start = time.perf_counter()
+    for msg in msgs:
+        ev = to_event(loads(msg))
+        if words:
+            for result in ev.results:
+                result.timestamps
+                result.word_confidence
+    return time.perf_counter() - start
+
+
+def run(count, n_words, repeat):
+    msgs = messages(count, n_words)
+    n_bytes = sum(len(x) for x in msgs)
+    results = []
+    try:
+        for backend in transcriber.JSON_BACKENDS:
+            transcriber.set_json_backend(backend)
+            for words in (False, True):
+                elapsed = min(parse(msgs, words) for _ in range(repeat))
+                results.append({
+                    'backend': backend,
+                    'word_fields': words,
+                    'messages': count,
+                    'seconds': elapsed,
+                    'messages_per_sec': count / elapsed,
+                    'bytes_per_sec': n_bytes / elapsed,
+                })
+    finally:
+        transcriber.set_json_backend(None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--messages', type=int, default=100000,
+                        help='Messages parsed per run.')
+    parser.add_argument('-w', '--words', type=int, default=12,
+                        help='Words in final transcripts.')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Runs per backend, the fastest is kept.')
+    parser.add_argument('-o', '--output',
+                        help='File to write JSON results to.')
+    args = parser.parse_args()
+
+    results = run(args.messages, args.words, args.repeat)
+    print('%-8s %12s %14s %10s' % ('backend', 'word fields', 'messages/sec',
+                                   'MB/sec'))
+    for result in results:
+        print('%-8s %12s %14.0f %10.2f' % (
+            result['backend'], result['word_fields'],
+            result['messages_per_sec'], result['bytes_per_sec'] / 1e6
+        ))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump({'words': args.words, 'results': results}, fp,
+                      indent=2)
+
+
+if __name__ == '__main__':
+    main()
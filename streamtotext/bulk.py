@@ -0,0 +1,198 @@
+"""Bulk transcription of recorded audio files
+
+A recording does not have to be transcribed in a single sequential
+pipeline. :func:`find_utterances` scans a wave file with the squelch logic
+of :class:`audio.SquelchedSource` to find utterance boundaries, and
+:class:`BulkTranscriber` transcribes every utterance with its own
+transcriber, a bounded number at a time. Events are returned stitched
+back together in time order.
+"""
+
+import asyncio
+import collections
+
+from streamtotext import audio
+from streamtotext import dsp
+
+
+Utterance = collections.namedtuple('Utterance', ['start', 'end'])
+"""Seconds from the start of a file at which an utterance starts and ends."""
+
+
+class UtteranceEvent(object):
+    """A :class:`transcriber.TranscribeEvent` of an utterance in a file.
+
+    :parameter utterance: Utterance the event was transcribed from.
+    :type utterance: Utterance
+    :parameter event: The transcription event.
+    :type event: transcriber.TranscribeEvent
+    """
+    __slots__ = ('utterance', 'event')
+
+    def __init__(self, utterance, event):
+        self.utterance = utterance
+        self.event = event
+
+    def __str__(self):
+        return 'UtteranceEvent(start=%.3f, end=%.3f, event=%s)' % (
+            self.utterance.start, self.utterance.end, self.event
+        )
+
+    def as_dict(self):
+        ret = self.event.as_dict()
+        ret['start'] = self.utterance.start
+        ret['end'] = self.utterance.end
+        return ret
+
+
+async def detect_squelch_level(wave_path, sample_size=1600, threshold=.8):
+    """Detect a squelch level from the audio of a whole wave file.
+
+    As with ``SquelchedSource.detect_squelch_level``, the level is the rms
+    at the threshold quantile of all samples.
+    """
+    rms = dsp.get_backend().rms
+    src = audio.MappedWaveSource(wave_path, chunk_frames=sample_size)
+    rms_vals = []
+    async with src.listen():
+        async for block in src:
+            async for chunk in block:
+                if len(chunk.audio) == sample_size * chunk.width:
+                    rms_vals.append(rms(chunk.audio, chunk.width))
+    if not rms_vals:
+        return 0
+    return sorted(rms_vals)[int(threshold * len(rms_vals))]
+
+
+async def find_utterances(wave_path, squelch_level=None, sample_size=1600,
+                          prefix_samples=4, threshold=.8, preroll=None,
+                          hangover=0., min_utterance=0.):
+    """Find the utterances in a wave file.
+
+    :param wave_path: Path to wave file.
+    :type wave_path: str
+    :param squelch_level: Squelch level, detected from the file if None.
+    :type squelch_level: int
+    :param sample_size: As for :class:`audio.SquelchedSource`.
+    :type sample_size: int
+    :param prefix_samples: As for :class:`audio.SquelchedSource`.
+    :type prefix_samples: int
+    :param threshold: Quantile used to detect the squelch level.
+    :type threshold: float
+    :param preroll: As for :class:`audio.SquelchedSource`.
+    :type preroll: float
+    :param hangover: As for :class:`audio.SquelchedSource`.
+    :type hangover: float
+    :param min_utterance: As for :class:`audio.SquelchedSource`.
+    :type min_utterance: float
+    :ret: List of :class:`Utterance` in time order.
+    """
+    if squelch_level is None:
+        squelch_level = await detect_squelch_level(wave_path, sample_size,
+                                                   threshold)
+    src = audio.SquelchedSource(
+        audio.MappedWaveSource(wave_path,
+                               chunk_frames=sample_size * prefix_samples),
+        sample_size=sample_size, squelch_level=squelch_level,
+        prefix_samples=prefix_samples, preroll=preroll, hangover=hangover,
+        min_utterance=min_utterance
+    )
+    utterances = []
+    async with src.listen():
+        async for block in src:
+            start = end = None
+            async for chunk in block:
+                if start is None:
+                    start = chunk.start_time
+                end = audio.sample_time(chunk, audio.chunk_sample_cnt(chunk))
+            if start is not None:
+                utterances.append(Utterance(start, end))
+    return utterances
+
+
+class BulkTranscriber(object):
+    """Transcribe wave files by transcribing their utterances in parallel.
+
+    Utterances are read with :class:`audio.MappedWaveSource` and are not
+    paced, so a file is transcribed as fast as the transcribers allow. The
+    concurrency limit is shared by all files transcribed with the same
+    BulkTranscriber.
+
+    :parameter transcriber_factory: Callable taking an audio source and its
+        sampling frequency and returning a :class:`transcriber.Transcriber`.
+        It is called once per utterance.
+    :type transcriber_factory: callable
+    :parameter concurrency: Maximum number of utterances transcribed at
+        once.
+    :type concurrency: int
+    :parameter squelch_level: Squelch level, detected per file if None.
+    :type squelch_level: int
+    :parameter sample_size: As for :class:`audio.SquelchedSource`.
+    :type sample_size: int
+    :parameter prefix_samples: As for :class:`audio.SquelchedSource`.
+    :type prefix_samples: int
+    :parameter chunk_frames: Frames per chunk sent to transcribers.
+    :type chunk_frames: int
+    :parameter preroll: As for :class:`audio.SquelchedSource`.
+    :type preroll: float
+    :parameter hangover: As for :class:`audio.SquelchedSource`.
+    :type hangover: float
+    :parameter min_utterance: As for :class:`audio.SquelchedSource`.
+    :type min_utterance: float
+    """
+    def __init__(self, transcriber_factory, concurrency=4,
+                 squelch_level=None, sample_size=1600, prefix_samples=4,
+                 chunk_frames=1600, preroll=None, hangover=0.,
+                 min_utterance=0.):
+        self._factory = transcriber_factory
+        self.concurrency = concurrency
+        self.squelch_level = squelch_level
+        self._sample_size = sample_size
+        self._prefix_samples = prefix_samples
+        self._chunk_frames = chunk_frames
+        self.preroll = preroll
+        self.hangover = hangover
+        self.min_utterance = min_utterance
+        self._semaphore = None
+
+    async def find_utterances(self, wave_path):
+        return await find_utterances(wave_path, self.squelch_level,
+                                     self._sample_size, self._prefix_samples,
+                                     preroll=self.preroll,
+                                     hangover=self.hangover,
+                                     min_utterance=self.min_utterance)
+
+    async def transcribe(self, wave_path, utterances=None):
+        """Transcribe a wave file.
+
+        :param wave_path: Path to wave file.
+        :type wave_path: str
+        :param utterances: Utterances to transcribe, found with
+            :func:`find_utterances` if None.
+        :type utterances: list
+        :ret: List of :class:`UtteranceEvent` in time order.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if utterances is None:
+            utterances = await self.find_utterances(wave_path)
+        freq = audio.wave_info(wave_path).freq
+        results = await asyncio.gather(*[
+            self._transcribe_utterance(wave_path, freq, x)
+            for x in utterances
+        ])
+        return [ev for events in results for ev in events]
+
+    async def _transcribe_utterance(self, wave_path, freq, utterance):
+        events = []
+
+        async def collect_event(event):
+            events.append(UtteranceEvent(utterance, event))
+
+        async with self._semaphore:
+            source = audio.MappedWaveSource(wave_path, self._chunk_frames,
+                                            utterance.start, utterance.end)
+            ts = self._factory(source, freq)
+            ts.register_event_handler(collect_event)
+            await ts.transcribe()
+        return events
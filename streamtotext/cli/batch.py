@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+
+from streamtotext import audio
+from streamtotext import bulk
+from streamtotext import uplink
+from streamtotext import utils
+from streamtotext.cli import util
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Transcribe a batch of wave files.'
+    )
+
+    parser.add_argument('transcription_service',
+                        help='Name of transcription service to use.',
+                        type=str,
+                        choices=['watson', 'pocketsphinx'])
+    parser.add_argument('paths',
+                        help='Wave files, directories of wave files or glob '
+                             'patterns.',
+                        nargs='+')
+    parser.add_argument('-u', '--username',
+                        help='Username for service account (if applicable).',
+                        type=str)
+    parser.add_argument('-p', '--password',
+                        help='Password for service account (if applicable).',
+                        type=str)
+    parser.add_argument('-o', '--output',
+                        help='File to write JSONL transcripts to, stdout by '
+                             'default.',
+                        type=str)
+    parser.add_argument('-j', '--concurrency',
+                        help='Number of files transcribed at once.',
+                        default=4,
+                        type=int)
+    parser.add_argument('-U', '--utterance-concurrency',
+                        help='Number of utterances transcribed at once over '
+                             'all files.',
+                        default=8,
+                        type=int)
+    parser.add_argument('-s', '--squelch-level',
+                        help='Squelch level used to find utterances, '
+                             'detected per file by default.',
+                        type=int)
+    parser.add_argument('--preroll',
+                        help='Seconds of audio before an utterance to '
+                             'include in it.',
+                        type=float)
+    parser.add_argument('--hangover',
+                        help='Seconds of pause which do not end an '
+                             'utterance.',
+                        default=0.,
+                        type=float)
+    parser.add_argument('--min-utterance',
+                        help='Minimum seconds of an utterance, shorter '
+                             'ones are skipped.',
+                        default=0.,
+                        type=float)
+    parser.add_argument('-r', '--rate',
+                        help='Sampling frequency to convert files to.',
+                        default=16000,
+                        type=int)
+    parser.add_argument('-e', '--encoding',
+                        help='Encoding of audio sent to Watson.',
+                        default='l16',
+                        choices=sorted(uplink.ENCODERS))
+    parser.add_argument('--frame-delay',
+                        help='Maximum seconds audio is held back to send '
+                             'it to Watson in larger frames.',
+                        type=float)
+    parser.add_argument('-w', '--workers',
+                        help='Number of pocketsphinx decoding workers.',
+                        type=int)
+    parser.add_argument('--processes',
+                        help='Run pocketsphinx workers in processes.',
+                        action='store_true')
+    return parser.parse_args(argv)
+
+
+def find_wave_files(paths):
+    """Expand files, directories and glob patterns to wave file paths."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = []
+            for dirpath, _, filenames in os.walk(path):
+                matches.extend(os.path.join(dirpath, x) for x in filenames
+                               if x.lower().endswith('.wav'))
+            found.extend(sorted(matches))
+        else:
+            found.extend(sorted(glob.glob(path)))
+    ret = []
+    for path in found:
+        if path not in ret:
+            ret.append(path)
+    return ret
+
+
+def rate_converting_factory(factory, rate):
+    """Wrap a transcriber factory to convert sources to rate."""
+    def convert_factory(source, freq):
+        if freq != rate:
+            source = audio.RateConvert(source, 1, rate)
+        return factory(source, rate)
+    return convert_factory
+
+
+async def _transcribe_file(bulk_ts, path, semaphore):
+    async with semaphore:
+        start = time.time()
+        result = {'path': path, 'duration': 0.}
+        try:
+            info = audio.wave_info(path)
+            result['duration'] = float(info.nframes) / info.freq
+            events = await bulk_ts.transcribe(path)
+        except Exception as e:
+            result['error'] = repr(e)
+        else:
+            result['events'] = [x.as_dict() for x in events]
+        result['wall_time'] = time.time() - start
+        result['processing_ratio'] = None
+        duration = result['duration']
+        if duration > 0:
+            result['processing_ratio'] = result['wall_time'] / duration
+        return result
+
+
+async def run_batch(bulk_ts, paths, concurrency, out_fp, progress_fp=None):
+    """Transcribe wave files writing a JSONL line per file to out_fp.
+
+    Each line has the file's path, duration and wall_time in seconds, and
+    its processing_ratio of wall_time to duration, so lower is faster and
+    below 1 is faster than realtime. This is the inverse of
+    :attr:`audio.RealtimeMonitor.realtime_factor`. Lines have the file's
+    events, or the error which failed it.
+
+    :param bulk_ts: Transcriber for the files.
+    :type bulk_ts: bulk.BulkTranscriber
+    :param paths: Wave file paths.
+    :type paths: list
+    :param concurrency: Number of files transcribed at once.
+    :type concurrency: int
+    :ret: dict of throughput statistics for the batch.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.time()
+    latencies = []
+    audio_time = 0.
+    failed = 0
+    tasks = [asyncio.ensure_future(_transcribe_file(bulk_ts, x, semaphore))
+             for x in paths]
+    for ndx, task in enumerate(asyncio.as_completed(tasks)):
+        result = await task
+        out_fp.write(json.dumps(result) + '\n')
+        out_fp.flush()
+        latencies.append(result['wall_time'])
+        audio_time += result['duration']
+        if 'error' in result:
+            failed += 1
+        if progress_fp is not None:
+            ratio = result['processing_ratio']
+            print('[%d/%d] %s processing ratio %s%s' % (
+                ndx + 1, len(paths), result['path'],
+                '-' if ratio is None else '%.3f' % ratio,
+                ' FAILED' if 'error' in result else ''
+            ), file=progress_fp)
+    wall_time = time.time() - start
+    return {
+        'files': len(paths),
+        'failed': failed,
+        'audio_seconds': audio_time,
+        'wall_seconds': wall_time,
+        'audio_seconds_per_second': audio_time / wall_time,
+        'latency_p50': utils.percentile(latencies, 50),
+        'latency_p95': utils.percentile(latencies, 95),
+    }
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    paths = find_wave_files(args.paths)
+    if not paths:
+        util.exit_with_error(error='No wave files found.')
+
+    factory = rate_converting_factory(util.get_transcriber_factory(args),
+                                      args.rate)
+    bulk_ts = bulk.BulkTranscriber(factory,
+                                   concurrency=args.utterance_concurrency,
+                                   squelch_level=args.squelch_level,
+                                   preroll=args.preroll,
+                                   hangover=args.hangover,
+                                   min_utterance=args.min_utterance)
+
+    out_fp = sys.stdout
+    if args.output:
+        out_fp = open(args.output, 'w')
+    loop = asyncio.get_event_loop()
+    try:
+        stats = loop.run_until_complete(
+            run_batch(bulk_ts, paths, args.concurrency, out_fp, sys.stderr)
+        )
+    finally:
+        if out_fp is not sys.stdout:
+            out_fp.close()
+    print(json.dumps(stats), file=sys.stderr)
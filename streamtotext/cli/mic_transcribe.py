@@ -5,6 +5,7 @@ import sys
 
 from streamtotext import audio
 from streamtotext import transcriber
+from streamtotext import uplink
 
 
 def parse_args(argv):
@@ -36,6 +37,24 @@ def parse_args(argv):
                         action='store_true')
     parser.add_argument('-s', '--squelch-level',
                         type=int)
+    parser.add_argument('-q', '--queue-size',
+                        help='Maximum number of queued mic chunks, 0 for no '
+                             'limit.',
+                        default=audio.DEFAULT_QUEUE_SIZE,
+                        type=int)
+    parser.add_argument('-o', '--overflow',
+                        help='What to do with mic audio when the queue is '
+                             'full.',
+                        default=audio.OVERFLOW_DROP_OLDEST,
+                        choices=audio.OVERFLOW_POLICIES)
+    parser.add_argument('-e', '--encoding',
+                        help='Encoding of audio sent to Watson.',
+                        default='l16',
+                        choices=sorted(uplink.ENCODERS))
+    parser.add_argument('--frame-delay',
+                        help='Maximum seconds audio is held back to send '
+                             'it to Watson in larger frames.',
+                        type=float)
     return parser.parse_args(argv)
 
 
@@ -48,11 +67,15 @@ async def handle_transcribe_event(ev):
     print(ev)
 
 
-def get_audio_source(channels, frequency, device_ndx=None):
+def get_audio_source(channels, frequency, device_ndx=None,
+                     queue_size=audio.DEFAULT_QUEUE_SIZE,
+                     overflow=audio.OVERFLOW_DROP_OLDEST):
     mic = audio.Microphone(
         channels=channels,
         rate=frequency,
-        device_ndx=device_ndx)
+        device_ndx=device_ndx,
+        queue_size=queue_size,
+        overflow=overflow)
     return mic
 
 
@@ -66,7 +89,8 @@ def transcribe(args):
     loop = asyncio.get_event_loop()
 
     src = get_audio_source(args.channels, args.frequency,
-                           args.device_index)
+                           args.device_index, args.queue_size,
+                           args.overflow)
 
     if not args.no_squelch:
         squelch_level = None
@@ -90,12 +114,19 @@ def transcribe(args):
         if not password:
             exit(error='You must specify a password.')
 
+        try:
+            uplink.get_encoder_factory(args.encoding)
+        except uplink.EncoderError as e:
+            exit(error=str(e))
+
         print('Beginning transcription.')
         ts = transcriber.WatsonTranscriber(
             src,
             args.frequency,
             user=username,
-            password=password
+            password=password,
+            encoding=args.encoding,
+            frame_delay=args.frame_delay
         )
     elif service == 'pocketsphinx':
         ts = transcriber.PocketSphinxTranscriber.default_config(src)
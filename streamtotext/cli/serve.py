@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import logging
+import sys
+
+from streamtotext import server
+from streamtotext import uplink
+from streamtotext.cli import util
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Serve transcription of audio streams over TCP.'
+    )
+
+    parser.add_argument('transcription_service',
+                        help='Name of transcription service to use.',
+                        type=str,
+                        choices=['watson', 'pocketsphinx'])
+    parser.add_argument('-u', '--username',
+                        help='Username for service account (if applicable).',
+                        type=str)
+    parser.add_argument('-p', '--password',
+                        help='Password for service account (if applicable).',
+                        type=str)
+    parser.add_argument('-H', '--host',
+                        help='Address to listen on.',
+                        default='127.0.0.1',
+                        type=str)
+    parser.add_argument('-P', '--port',
+                        help='Port to listen on.',
+                        default=8765,
+                        type=int)
+    parser.add_argument('-s', '--squelch-level',
+                        help='Squelch level for streams which do not set '
+                             'one, by default all audio is transcribed.',
+                        type=int)
+    parser.add_argument('-r', '--rate',
+                        help='Sampling frequency to convert streams to.',
+                        default=16000,
+                        type=int)
+    parser.add_argument('-e', '--encoding',
+                        help='Encoding of audio sent to Watson.',
+                        default='l16',
+                        choices=sorted(uplink.ENCODERS))
+    parser.add_argument('--frame-delay',
+                        help='Maximum seconds audio is held back to send '
+                             'it to Watson in larger frames.',
+                        type=float)
+    parser.add_argument('-w', '--workers',
+                        help='Number of pocketsphinx decoding workers.',
+                        type=int)
+    parser.add_argument('--processes',
+                        help='Run pocketsphinx workers in processes.',
+                        action='store_true')
+    return parser.parse_args(argv)
+
+
+async def serve(srv):
+    await srv.start()
+    print('Listening on %s:%d' % (srv.host, srv.port))
+    while True:
+        await asyncio.sleep(10)
+        print(srv.stats())
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    logging.basicConfig()
+    srv = server.TranscriptionServer(
+        util.get_transcriber_factory(args),
+        host=args.host,
+        port=args.port,
+        squelch_level=args.squelch_level,
+        out_rate=args.rate
+    )
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(serve(srv))
@@ -1,11 +1,17 @@
 import argparse
 import asyncio
 import os
+import sys
 
-import pyaudio
+try:
+    import pyaudio
+except ImportError:
+    # As in audio, the batch and serve commands do not need pyaudio
+    pass
 
 from streamtotext import audio
 from streamtotext import transcriber
+from streamtotext import uplink
 from streamtotext import utils
 
 
@@ -13,11 +19,53 @@ class CommandError(Exception):
     pass
 
 
-async def handle_events(ts):
-    while not ts.running:
-        await asyncio.sleep(.1)
-
-    async for ev in ts.events:
+def exit_with_error(error):
+    print("ERROR: %s" % error, file=sys.stderr)
+    sys.exit(1)
+
+
+def get_transcriber_factory(args):
+    service = args.transcription_service
+    if service == 'watson':
+        username = os.environ.get('WATSON_SST_USER') or args.username
+        password = os.environ.get('WATSON_SST_PASSWORD') or args.password
+
+        if not username:
+            exit_with_error(error='You must specify a username.')
+        if not password:
+            exit_with_error(error='You must specify a password.')
+
+        encoding = args.encoding
+        frame_delay = args.frame_delay
+        try:
+            uplink.get_encoder_factory(encoding)
+        except uplink.EncoderError as e:
+            exit_with_error(error=str(e))
+
+        pool = transcriber.WatsonConnectionPool(username, password)
+
+        def factory(source, freq):
+            return transcriber.WatsonTranscriber(source, freq, username,
+                                                 password,
+                                                 connection_pool=pool,
+                                                 encoding=encoding,
+                                                 frame_delay=frame_delay)
+    elif service == 'pocketsphinx':
+        pool = transcriber.PocketSphinxWorkerPool(
+            size=args.workers, use_processes=args.processes
+        )
+
+        def factory(source, freq):
+            return transcriber.PocketSphinxTranscriber.default_config(
+                source, worker_pool=pool
+            )
+    else:
+        raise RuntimeError('Invalid service')
+    return factory
+
+
+async def handle_events(events):
+    async for ev in events:
         print(ev)
     print('No more events')
 
@@ -41,11 +89,11 @@ def cmd_transcribe(args):
     loop = asyncio.get_event_loop()
 
     ts = transcriber.WatsonTranscriber(squelched, 44100, user=user,
-                                       passwd=passwd)
+                                       password=passwd)
 
     tasks = [
         asyncio.ensure_future(ts.transcribe()),
-        asyncio.ensure_future(handle_events(ts)),
+        asyncio.ensure_future(handle_events(ts.events)),
     ]
     loop.run_until_complete(asyncio.gather(*tasks))
 
@@ -0,0 +1,198 @@
+"""Digital signal processing backends
+
+Audio processors perform their sample level operations through a backend
+obtained from :func:`get_backend`. Two backends are provided:
+
+* :class:`AudioopBackend` uses the standard library ``audioop`` module, which
+  is not available from Python 3.13. It is preferred where available, as
+  per call overhead makes numpy slower at the chunk sizes of live audio,
+  around a thousand frames. See ``streamtotext.benchmarks.dsp_throughput``.
+* :class:`NumpyBackend` operates on ``numpy.frombuffer`` views of audio
+  buffers. It is used where audioop is not available and is faster for
+  chunks of tens of thousands of frames, set it with :func:`set_backend`
+  for such pipelines.
+
+Every backend implements the same subset of the ``audioop`` interface:
+``ratecv``, ``tomono``, ``rms``, ``mul`` and ``lin2lin``.
+"""
+
+import math
+import warnings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import audioop
+except ImportError:
+    audioop = None
+
+
+class NoBackendError(Exception):
+    def __init__(self, name=None):
+        if name is None:
+            msg = 'No DSP backend available, please install numpy'
+        else:
+            msg = 'DSP backend %s is not available' % name
+        super(NoBackendError, self).__init__(msg)
+
+
+class AudioopBackend(object):
+    """DSP backend using the standard library audioop module."""
+    name = 'audioop'
+
+    @staticmethod
+    def available():
+        return audioop is not None
+
+    def ratecv(self, fragment, width, nchannels, inrate, outrate, state):
+        return audioop.ratecv(fragment, width, nchannels, inrate, outrate,
+                              state)
+
+    def tomono(self, fragment, width, lfactor, rfactor):
+        return audioop.tomono(fragment, width, lfactor, rfactor)
+
+    def rms(self, fragment, width):
+        return audioop.rms(fragment, width)
+
+    def mul(self, fragment, width, factor):
+        return audioop.mul(fragment, width, factor)
+
+    def lin2lin(self, fragment, width, newwidth):
+        return audioop.lin2lin(fragment, width, newwidth)
+
+
+class NumpyBackend(object):
+    """Vectorized DSP backend using numpy.
+
+    Input fragments are wrapped with ``numpy.frombuffer`` so no copy is made
+    of the input audio. Samples are signed native endian integers of 1, 2 or
+    4 bytes, as with audioop.
+
+    ``ratecv`` performs linear interpolation between input frames. Its state
+    is opaque and must be passed back in on the next call, as with
+    ``audioop.ratecv``.
+    """
+    name = 'numpy'
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    def __init__(self):
+        self._dtypes = {1: np.dtype('i1'), 2: np.dtype('i2'),
+                        4: np.dtype('i4')}
+
+    def _samples(self, fragment, width):
+        try:
+            dtype = self._dtypes[width]
+        except KeyError:
+            raise ValueError('Unsupported sample width %d' % width)
+        return np.frombuffer(fragment, dtype=dtype)
+
+    def _to_width(self, values, width):
+        info = np.iinfo(self._dtypes[width])
+        values = np.floor(values, out=values)
+        np.clip(values, info.min, info.max, out=values)
+        return values.astype(self._dtypes[width]).tobytes()
+
+    def ratecv(self, fragment, width, nchannels, inrate, outrate, state):
+        gcd = math.gcd(inrate, outrate)
+        inrate //= gcd
+        outrate //= gcd
+
+        frames = self._samples(fragment, width).reshape(-1, nchannels)
+        phase, prev = state or (0, None)
+        if prev is not None:
+            frames = np.concatenate((prev, frames))
+        if len(frames) == 0:
+            return b'', state
+
+        # Positions are in units of 1 / outrate input frames relative to the
+        # first frame. As with audioop, output up to and including the last
+        # frame is produced, and the last frame is carried over to the next
+        # call to interpolate from.
+        span = (len(frames) - 1) * outrate
+        n_out = max(0, (span - phase) // inrate + 1)
+        pos = phase + np.arange(n_out, dtype=np.int64) * inrate
+        ndx = pos // outrate
+        frac = ((pos % outrate) / float(outrate))[:, np.newaxis]
+        first = frames[ndx].astype(np.float64)
+        second = frames[np.minimum(ndx + 1, len(frames) - 1)]
+        out = first + (second - first) * frac
+        out = np.trunc(out, out=out)
+
+        new_state = (phase + n_out * inrate - span, frames[-1:].copy())
+        return out.astype(frames.dtype).tobytes(), new_state
+
+    def tomono(self, fragment, width, lfactor, rfactor):
+        frames = self._samples(fragment, width).reshape(-1, 2)
+        out = frames[:, 0] * float(lfactor)
+        out += frames[:, 1] * float(rfactor)
+        return self._to_width(out, width)
+
+    def rms(self, fragment, width):
+        samples = self._samples(fragment, width)
+        if len(samples) == 0:
+            return 0
+        samples = samples.astype(np.float64)
+        return int(math.sqrt(np.dot(samples, samples) / len(samples)))
+
+    def mul(self, fragment, width, factor):
+        return self._to_width(self._samples(fragment, width) * float(factor),
+                              width)
+
+    def lin2lin(self, fragment, width, newwidth):
+        if width == newwidth:
+            return bytes(fragment)
+        samples = self._samples(fragment, width).astype(np.int32)
+        samples <<= 32 - 8 * width
+        samples >>= 32 - 8 * newwidth
+        return samples.astype(self._dtypes[newwidth]).tobytes()
+
+
+BACKENDS = (AudioopBackend, NumpyBackend)
+"""Backend classes in order of preference."""
+
+_backend = None
+
+
+def get_backend(name=None):
+    """Get a DSP backend.
+
+    :param name: Name of the backend, the preferred available backend (or
+        the one set with :func:`set_backend`) if None.
+    :type name: str
+    """
+    global _backend
+    if name is None:
+        if _backend is None:
+            for backend_cls in BACKENDS:
+                if backend_cls.available():
+                    _backend = backend_cls()
+                    break
+            else:
+                raise NoBackendError()
+        return _backend
+
+    for backend_cls in BACKENDS:
+        if backend_cls.name == name and backend_cls.available():
+            return backend_cls()
+    raise NoBackendError(name)
+
+
+def set_backend(name):
+    """Set the backend returned by :func:`get_backend` by default.
+
+    Processors obtain their backend when they are created, so this should be
+    called before building a pipeline.
+
+    :param name: Name of the backend, or None to pick automatically.
+    :type name: str
+    """
+    global _backend
+    _backend = None if name is None else get_backend(name)
@@ -0,0 +1,262 @@
+"""Pipeline instrumentation
+
+Audio blocks, audio sources and transcribers report timings and counts to
+a metrics sink set with :func:`set_sink`. No sink is set by default, in
+which case instrumentation costs a single check per chunk.
+
+The following metrics are recorded, labelled by stage. A block's stage is
+the class name of the :class:`audio.AudioSource` which returned it.
+
+* ``stage_seconds``: Time spent producing a chunk in a stage, excluding
+  time spent waiting on earlier stages. For blocks fed by a queue, such as
+  :class:`audio.QueueAudioBlock`, this is time waiting on the producer.
+* ``chunk_age_seconds``: Time since capture of a chunk's first sample when
+  it leaves a stage, from :attr:`audio.AudioChunk.start_time`.
+* ``chunks_total`` and ``bytes_total``: Chunks and bytes leaving a stage.
+* ``blocks_total``: Blocks returned by a source.
+* ``event_latency_seconds``: Time from capture of the end of the latest
+  audio read by a transcriber to delivery of an event, labelled by
+  transcriber.
+* ``handler_seconds``: Time spent in an event handler per event.
+* ``events_total``: Events delivered by a transcriber.
+* ``send_seconds``, ``frames_total`` and ``frame_bytes_total``: Time
+  spent sending, and count and size of, websocket frames of audio sent by
+  a transcriber, see :mod:`uplink`.
+
+Ages and latencies are only meaningful for sources whose start times are
+wall clock times, such as :class:`audio.Microphone`.
+"""
+
+import asyncio
+import bisect
+import time
+
+
+_sink = None
+
+_frames = {}
+
+
+def get_sink():
+    return _sink
+
+
+def set_sink(sink):
+    """Set the sink metrics are reported to, None to disable metrics.
+
+    :param sink: The sink.
+    :type sink: MetricsSink
+    """
+    global _sink
+    _sink = sink
+
+
+def enabled():
+    return _sink is not None
+
+
+class MetricsSink(object):
+    """Base class for receivers of metrics."""
+
+    def observe(self, name, value, **labels):
+        """Record a measurement, such as a duration in seconds."""
+        pass
+
+    def increment(self, name, value=1, **labels):
+        """Add to a counter."""
+        pass
+
+
+class Histogram(object):
+    """Counts of observations in buckets with fixed upper bounds."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q):
+        """Upper bound of the bucket containing the q quantile.
+
+        Observations above the last bucket are estimated by the maximum.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for ndx, cnt in enumerate(self.counts[:-1]):
+            seen += cnt
+            if seen >= rank:
+                return self.buckets[ndx]
+        return self.max
+
+
+def _label_key(labels):
+    # Values are strings, as in Prometheus, so keys of any labels sort
+    return tuple(sorted((k, '' if v is None else str(v))
+                        for k, v in labels.items()))
+
+
+class HistogramSink(MetricsSink):
+    """Keep metrics in memory.
+
+    Observations are kept in a :class:`Histogram` and increments in a
+    counter per metric name and set of labels.
+
+    :parameter buckets: Upper bounds of histogram buckets.
+    :type buckets: tuple
+    """
+    DEFAULT_BUCKETS = (.0001, .0005, .001, .005, .01, .025, .05, .1, .25,
+                       .5, 1., 2.5, 5., 10.)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram(self._buckets)
+        hist.observe(value)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def histogram(self, name, **labels):
+        """Histogram of a metric, or None if nothing was observed."""
+        return self.histograms.get((name, _label_key(labels)))
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, _label_key(labels)), 0)
+
+
+def _format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, _escape_label_value(v))
+                             for k, v in labels)
+
+
+def _escape_label_value(value):
+    value = value.replace('\\', '\\\\')
+    value = value.replace('\n', '\\n')
+    return value.replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class PrometheusSink(HistogramSink):
+    """A :class:`HistogramSink` rendered in the Prometheus text format.
+
+    :parameter prefix: Prefix of metric names.
+    :type prefix: str
+    """
+    def __init__(self, buckets=HistogramSink.DEFAULT_BUCKETS,
+                 prefix='streamtotext_'):
+        super(PrometheusSink, self).__init__(buckets)
+        self.prefix = prefix
+
+    def exposition(self):
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            name = self.prefix + name
+            if name not in typed:
+                typed.add(name)
+                lines.append('# TYPE %s counter' % name)
+            lines.append('%s%s %s' % (name, _format_labels(labels),
+                                      _format_value(value)))
+        for (name, labels), hist in sorted(self.histograms.items(),
+                                           key=lambda x: x[0]):
+            name = self.prefix + name
+            if name not in typed:
+                typed.add(name)
+                lines.append('# TYPE %s histogram' % name)
+            cumulative = 0
+            bounds = hist.buckets + (float('inf'),)
+            for bound, cnt in zip(bounds, hist.counts):
+                cumulative += cnt
+                lines.append('%s_bucket%s %d' % (
+                    name,
+                    _format_labels(labels, (('le', _format_value(bound)),)),
+                    cumulative
+                ))
+            lines.append('%s_sum%s %s' % (name, _format_labels(labels),
+                                          _format_value(hist.sum)))
+            lines.append('%s_count%s %d' % (name, _format_labels(labels),
+                                            hist.count))
+        return '\n'.join(lines) + '\n'
+
+
+def _current_task():
+    try:
+        return asyncio.current_task()
+    except AttributeError:
+        # Python < 3.7
+        return asyncio.Task.current_task()
+
+
+class StageTimer(object):
+    """Time a stage producing a chunk, excluding nested stages.
+
+    Stages of a pipeline call into each other within a single task, so the
+    timers running in a task form a stack. The time of a stopped timer is
+    subtracted from the timer below it.
+    """
+    __slots__ = ('stage', '_start', '_nested', '_stack')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._nested = 0.
+        self._stack = _frames.setdefault(_current_task(), [])
+        self._stack.append(self)
+        self._start = time.perf_counter()
+
+    def _pop(self):
+        elapsed = time.perf_counter() - self._start
+        stack = self._stack
+        stack.pop()
+        if stack:
+            stack[-1]._nested += elapsed
+        else:
+            _frames.pop(_current_task(), None)
+        return elapsed
+
+    def cancel(self):
+        """Stop timing without recording, as when a block ends."""
+        self._pop()
+
+    def stop(self, chunk):
+        """Stop timing and record a produced chunk."""
+        sink = _sink
+        elapsed = self._pop()
+        if sink is None:
+            return
+        stage = self.stage
+        sink.observe('stage_seconds', elapsed - self._nested, stage=stage)
+        sink.observe('chunk_age_seconds', time.time() - chunk.start_time,
+                     stage=stage)
+        sink.increment('chunks_total', stage=stage)
+        sink.increment('bytes_total', len(chunk.audio), stage=stage)
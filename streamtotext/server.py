@@ -0,0 +1,237 @@
+"""Transcription server for many concurrent audio streams
+
+A :class:`TranscriptionServer` accepts audio streams from clients over TCP
+and transcribes each with its own pipeline, all multiplexed on one event
+loop.
+
+The protocol is line oriented. A client sends a single JSON header line
+followed by raw PCM audio and closes its side of the connection once the
+audio has been sent. The header may contain:
+
+* ``freq``: Sampling frequency, required.
+* ``width``: Bytes per sample, 2 by default.
+* ``channels``: Number of interleaved channels, 1 by default. Stereo
+  streams are downmixed to mono as they are received.
+* ``stream_id``: Name of the stream, generated if missing.
+* ``squelch_level``: Overrides the server squelch level for the stream.
+
+The server writes a JSON line per :class:`transcriber.TranscribeEvent`, of
+the form ``{"stream_id": ..., "event": {...}}``, and closes the connection
+once the stream has been transcribed.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+
+from streamtotext import audio
+from streamtotext import dsp
+from streamtotext import transcriber
+
+
+LOG = logging.getLogger(__name__)
+
+
+class StreamHeaderError(Exception):
+    def __init__(self, msg):
+        super(StreamHeaderError, self).__init__(
+            'Invalid stream header: %s' % msg
+        )
+
+
+class _Stream(object):
+    def __init__(self, stream_id, freq, width, channels, squelch_level):
+        self.stream_id = stream_id
+        self.freq = freq
+        self.width = width
+        self.channels = channels
+        self.squelch_level = squelch_level
+        self.bytes_received = 0
+        self.events_sent = 0
+        self.started_at = time.time()
+
+
+class TranscriptionServer(object):
+    """Serve transcription of concurrent audio streams over TCP.
+
+    Each stream is fed into an :class:`audio.QueueAudioSource`, optionally
+    filtered by an :class:`audio.SquelchedSource` and converted to out_rate
+    with an :class:`audio.RateConvert`, and then transcribed by a
+    transcriber from transcriber_factory. A failing stream is logged and
+    closed without affecting other streams.
+
+    :parameter transcriber_factory: Callable taking an audio source and its
+        sampling frequency and returning a :class:`transcriber.Transcriber`.
+    :type transcriber_factory: callable
+    :parameter host: Address to listen on.
+    :type host: str
+    :parameter port: Port to listen on, 0 to pick a free port.
+    :type port: int
+    :parameter squelch_level: Squelch level for streams, None to transcribe
+        all audio.
+    :type squelch_level: int
+    :parameter out_rate: Sampling frequency to convert streams to, None to
+        leave them unconverted.
+    :type out_rate: int
+    :parameter queue_size: Maximum number of chunks queued per stream.
+    :type queue_size: int
+    :parameter overflow: Overflow policy of stream queues.
+    :type overflow: str
+    :parameter read_size: Bytes read from a client at a time.
+    :type read_size: int
+    :parameter event_queue_size: Maximum number of events queued per
+        stream for a client. Once a client falls this far behind, queued
+        interim events are replaced by newer ones, then the oldest events
+        are dropped.
+    :type event_queue_size: int
+    """
+    def __init__(self, transcriber_factory, host='127.0.0.1', port=8765,
+                 squelch_level=None, out_rate=None, queue_size=100,
+                 overflow=audio.OVERFLOW_BLOCK, read_size=4096,
+                 event_queue_size=audio.DEFAULT_QUEUE_SIZE):
+        self._transcriber_factory = transcriber_factory
+        self.host = host
+        self.port = port
+        self.squelch_level = squelch_level
+        self.out_rate = out_rate
+        self._queue_size = queue_size
+        self._overflow = overflow
+        self._read_size = read_size
+        self._event_queue_size = event_queue_size
+        self._server = None
+        self._stream_ids = itertools.count()
+        self.streams = {}
+        self.total_streams = 0
+        self.failed_streams = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_client,
+                                                  self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def stats(self):
+        """Counters describing the server.
+
+        :ret: dict with active_streams, total_streams, failed_streams and
+            bytes_received of active streams.
+        """
+        return {
+            'active_streams': len(self.streams),
+            'total_streams': self.total_streams,
+            'failed_streams': self.failed_streams,
+            'bytes_received': sum(x.bytes_received
+                                  for x in self.streams.values()),
+        }
+
+    def _parse_header(self, line):
+        try:
+            header = json.loads(line.decode('utf-8'))
+            freq = int(header['freq'])
+            width = int(header.get('width', 2))
+            channels = int(header.get('channels', 1))
+            squelch_level = header.get('squelch_level', self.squelch_level)
+            if squelch_level is not None:
+                squelch_level = int(squelch_level)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise StreamHeaderError(e)
+        if freq <= 0:
+            raise StreamHeaderError('freq must be positive')
+        if width != 2:
+            raise StreamHeaderError('Only 2 byte samples are supported')
+        if channels not in (1, 2):
+            raise StreamHeaderError('Only 1 or 2 channels are supported')
+        if squelch_level is not None and squelch_level < 0:
+            raise StreamHeaderError('squelch_level must not be negative')
+        stream_id = str(header.get('stream_id') or next(self._stream_ids))
+        if stream_id in self.streams:
+            raise StreamHeaderError('Duplicate stream_id %s' % stream_id)
+        return _Stream(stream_id, freq, width, channels, squelch_level)
+
+    def _build_pipeline(self, stream, source):
+        if stream.squelch_level is not None:
+            source = audio.SquelchedSource(source,
+                                           squelch_level=stream.squelch_level)
+        freq = stream.freq
+        if self.out_rate is not None and self.out_rate != freq:
+            # Audio is downmixed as it is read
+            source = audio.RateConvert(source, 1, self.out_rate)
+            freq = self.out_rate
+        return self._transcriber_factory(source, freq)
+
+    async def _handle_client(self, reader, writer):
+        stream = None
+        try:
+            stream = self._parse_header(await reader.readline())
+            self.streams[stream.stream_id] = stream
+            self.total_streams += 1
+            await self._transcribe_stream(stream, reader, writer)
+        except Exception:
+            self.failed_streams += 1
+            LOG.exception('Stream %s failed',
+                          stream.stream_id if stream else '<no header>')
+        finally:
+            if stream is not None:
+                self.streams.pop(stream.stream_id, None)
+            writer.close()
+
+    async def _transcribe_stream(self, stream, reader, writer):
+        source = audio.QueueAudioSource(self._queue_size, self._overflow)
+        ts = self._build_pipeline(stream, source)
+
+        async def send_event(event):
+            line = json.dumps({'stream_id': stream.stream_id,
+                               'event': event.as_dict()})
+            writer.write(line.encode('utf-8') + b'\n')
+            stream.events_sent += 1
+            await writer.drain()
+
+        # Queue events so a slow client does not hold up transcription, a
+        # client which stops reading loses interim events first.
+        ts.register_event_handler(send_event,
+                                  mode=transcriber.DISPATCH_ORDERED,
+                                  queue_size=self._event_queue_size,
+                                  overflow=audio.OVERFLOW_COALESCE)
+        tasks = [asyncio.ensure_future(ts.transcribe()),
+                 asyncio.ensure_future(self._read_audio(stream, source,
+                                                        reader))]
+        try:
+            # Stop reading if transcription fails, a full queue would
+            # otherwise block the reader forever.
+            done, _ = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_EXCEPTION
+            )
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _read_audio(self, stream, source, reader):
+        frame_size = stream.width * stream.channels
+        tomono = None
+        if stream.channels == 2:
+            tomono = dsp.get_backend().tomono
+        leftover = b''
+        while True:
+            data = await reader.read(self._read_size)
+            if not data:
+                break
+            stream.bytes_received += len(data)
+            if leftover:
+                data = leftover + data
+            usable = len(data) - len(data) % frame_size
+            leftover = data[usable:]
+            if usable:
+                samples = data[:usable]
+                if tomono is not None:
+                    samples = tomono(samples, stream.width, .5, .5)
+                await source.add_chunk(audio.AudioChunk(
+                    time.time(), samples, stream.width, stream.freq
+                ))
+        await source.end()
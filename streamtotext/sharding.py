@@ -0,0 +1,385 @@
+"""Run transcription pipelines across worker processes
+
+A single event loop is limited to one core. :class:`ShardedRunner` starts a
+number of worker processes, each running its own event loop, and assigns
+every stream to a worker by its stream id. Audio is routed to the stream's
+worker and :class:`transcriber.TranscribeEvent` are collected back in the
+parent through a single async iterator.
+
+Every queue between the parent and the workers is bounded. Messages for a
+worker are queued in the parent in an :class:`audio.OverflowQueue` which
+drops the oldest chunks once a worker falls queue_size messages behind,
+and each stream's audio is queued in the worker according to the runner's
+overflow policy, so a slow stream does not hold up the others on its
+worker.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import threading
+import zlib
+
+from streamtotext import audio
+
+
+LOG = logging.getLogger(__name__)
+
+
+class UnknownStreamError(Exception):
+    def __init__(self, stream_id):
+        super(UnknownStreamError, self).__init__(
+            'Unknown stream %s' % stream_id
+        )
+
+
+class StreamEndedError(Exception):
+    def __init__(self, stream_id):
+        super(StreamEndedError, self).__init__(
+            'Stream %s has ended' % stream_id
+        )
+
+
+class StreamFailedError(Exception):
+    def __init__(self, stream_id, error):
+        super(StreamFailedError, self).__init__(
+            'Stream %s failed: %s' % (stream_id, error)
+        )
+
+
+class _ShardWorker(object):
+    def __init__(self, factory, in_q, out_q, queue_size, overflow):
+        self._factory = factory
+        self._in_q = in_q
+        self._out_q = out_q
+        self._queue_size = queue_size
+        self._overflow = overflow
+        self._sources = {}
+        self._tasks = {}
+        self._ending = set()
+        # Messages to the parent are put by a single thread, in order
+        self._sender = concurrent.futures.ThreadPoolExecutor(1)
+
+    async def run(self):
+        try:
+            await self._run()
+        finally:
+            self._sender.shutdown()
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            msg = await loop.run_in_executor(None, self._in_q.get)
+            kind, stream_id, arg = msg
+            if kind == 'shutdown':
+                break
+            if kind == 'open':
+                if stream_id in self._sources:
+                    LOG.warning('Stream %s is already open', stream_id)
+                else:
+                    self._open_stream(stream_id, arg)
+                continue
+            source = self._sources.get(stream_id)
+            if source is None:
+                LOG.warning('Ignoring %s for unknown stream %s', kind,
+                            stream_id)
+            elif kind == 'chunk':
+                source.queue.offer(arg)
+            elif kind == 'end':
+                del self._sources[stream_id]
+                self._end_source(source)
+        for source in self._sources.values():
+            self._end_source(source)
+        await asyncio.gather(*self._tasks.values())
+        # Ends of failed streams can wait on a full queue forever
+        for task in list(self._ending):
+            task.cancel()
+
+    def _end_source(self, source):
+        # A full queue would block the loop until the stream catches up
+        task = asyncio.ensure_future(source.end())
+        self._ending.add(task)
+        task.add_done_callback(self._ending.discard)
+
+    async def _send(self, msg):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self._sender, self._out_q.put, msg)
+
+    def _open_stream(self, stream_id, freq):
+        source = audio.QueueAudioSource(self._queue_size, self._overflow)
+        ts = self._factory(source, freq)
+
+        async def send_event(event):
+            await self._send(('event', stream_id, event))
+
+        ts.register_event_handler(send_event)
+        self._sources[stream_id] = source
+        self._tasks[stream_id] = asyncio.ensure_future(
+            self._run_stream(stream_id, ts)
+        )
+
+    async def _run_stream(self, stream_id, ts):
+        try:
+            await ts.transcribe()
+        except Exception as e:
+            await self._send(('closed', stream_id, repr(e)))
+        else:
+            await self._send(('closed', stream_id, None))
+        finally:
+            del self._tasks[stream_id]
+
+
+def _worker_main(factory, in_q, out_q, queue_size, overflow):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(
+            _ShardWorker(factory, in_q, out_q, queue_size, overflow).run()
+        )
+    finally:
+        loop.close()
+
+
+class _WorkerQueue(audio.OverflowQueue):
+    """Messages for a worker, only chunks are ever dropped."""
+    def _is_control(self, item):
+        return item[0] != 'chunk'
+
+
+class ShardedRunner(object):
+    """Transcribe many streams in a pool of worker processes.
+
+    Iterating over the runner yields (stream_id, event) tuples for all
+    streams until the runner is stopped. Up to queue_size events are held
+    for the iterator, the oldest are dropped after that.
+
+    A stream whose worker process exits fails with
+    :class:`StreamFailedError`.
+
+    :parameter transcriber_factory: Callable taking an audio source and its
+        sampling frequency and returning a :class:`transcriber.Transcriber`.
+        It is called in the worker processes so it must be picklable, e.g. a
+        module level function.
+    :type transcriber_factory: callable
+    :parameter workers: Number of worker processes, defaults to the number
+        of CPUs.
+    :type workers: int
+    :parameter mp_context: multiprocessing context to start workers with.
+    :parameter queue_size: Maximum number of messages queued per worker, of
+        chunks queued per stream and of events queued for the iterator.
+    :type queue_size: int
+    :parameter overflow: Overflow policy of stream queues in workers.
+        Chunks which do not fit a full :data:`audio.OVERFLOW_BLOCK` queue
+        are dropped, as a worker cannot wait on a single stream.
+    :type overflow: str
+    """
+    def __init__(self, transcriber_factory, workers=None, mp_context=None,
+                 queue_size=audio.DEFAULT_QUEUE_SIZE,
+                 overflow=audio.OVERFLOW_DROP_OLDEST):
+        self._factory = transcriber_factory
+        self.workers = workers or os.cpu_count() or 1
+        self._mp = mp_context or multiprocessing.get_context()
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self._procs = []
+        self._in_qs = []
+        self._send_qs = []
+        self._senders = []
+        self._dead = set()
+        self._out_q = None
+        self._reader = None
+        self._watcher = None
+        self._events = None
+        self._closed = {}
+        self._ended = set()
+        self.running = False
+
+    def listen(self):
+        """Async context manager which starts and stops the runner."""
+        return audio._ListenCtxtMgr(self)
+
+    async def start(self):
+        loop = asyncio.get_event_loop()
+        self._events = audio.OverflowQueue(self.queue_size,
+                                           audio.OVERFLOW_DROP_OLDEST)
+        self._out_q = self._mp.Queue(self.queue_size)
+        self._dead = set()
+        for ndx in range(self.workers):
+            in_q = self._mp.Queue(self.queue_size)
+            proc = self._mp.Process(target=_worker_main,
+                                    args=(self._factory, in_q, self._out_q,
+                                          self.queue_size, self.overflow),
+                                    daemon=True)
+            proc.start()
+            self._in_qs.append(in_q)
+            self._procs.append(proc)
+            self._send_qs.append(_WorkerQueue(self.queue_size,
+                                              audio.OVERFLOW_DROP_OLDEST))
+            self._senders.append(asyncio.ensure_future(
+                self._send_worker_msgs(ndx)
+            ))
+        self._reader = threading.Thread(target=self._read_worker_msgs,
+                                        args=(loop,), daemon=True)
+        self._reader.start()
+        self._watcher = threading.Thread(target=self._watch_workers,
+                                         args=(list(self._procs),),
+                                         daemon=True)
+        self._watcher.start()
+        self.running = True
+
+    async def stop(self):
+        """Finish all open streams and stop the workers."""
+        self.running = False
+        loop = asyncio.get_event_loop()
+        for send_q in self._send_qs:
+            send_q.put_nowait(('shutdown', None, None))
+        await asyncio.gather(*self._senders)
+        for proc in self._procs:
+            await loop.run_in_executor(None, proc.join)
+        await loop.run_in_executor(None, self._watcher.join)
+        await loop.run_in_executor(None, self._out_q.put, None)
+        await loop.run_in_executor(None, self._reader.join)
+        self._events.put_nowait(None)
+        self._procs = []
+        self._in_qs = []
+        self._send_qs = []
+        self._senders = []
+
+    def worker_for(self, stream_id):
+        """Index of the worker which handles a stream."""
+        return zlib.crc32(stream_id.encode('utf-8')) % self.workers
+
+    def queue_stats(self):
+        """Counters of the per worker message queues.
+
+        :ret: List of :func:`audio.OverflowQueue.stats` by worker.
+        """
+        return [x.stats() for x in self._send_qs]
+
+    def _send(self, kind, stream_id, arg=None):
+        ndx = self.worker_for(stream_id)
+        if ndx in self._dead:
+            raise StreamFailedError(stream_id, 'worker exited')
+        self._send_qs[ndx].put_nowait((kind, stream_id, arg))
+
+    async def _send_worker_msgs(self, ndx):
+        loop = asyncio.get_event_loop()
+        send_q = self._send_qs[ndx]
+        while True:
+            msg = await send_q.get()
+            send_q.task_done()
+            sent = await loop.run_in_executor(None, self._put, ndx, msg)
+            if not sent or msg[0] == 'shutdown':
+                return
+
+    def _put(self, ndx, msg):
+        # Runs in an executor thread. Wakes up periodically so the thread is
+        # released if the worker exits while its queue is full.
+        in_q = self._in_qs[ndx]
+        while ndx not in self._dead:
+            try:
+                in_q.put(msg, timeout=.1)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def open_stream(self, stream_id, freq):
+        """Start a pipeline for a new stream.
+
+        :param stream_id: Unique name of the stream.
+        :type stream_id: str
+        :param freq: Sampling frequency of the stream.
+        :type freq: int
+        """
+        self._send('open', stream_id, freq)
+        self._closed[stream_id] = asyncio.get_event_loop().create_future()
+        self._ended.discard(stream_id)
+
+    def add_chunk(self, stream_id, chunk):
+        """Send an :class:`audio.AudioChunk` to a stream's pipeline.
+
+        :raises StreamEndedError: :func:`end_stream` was called for the
+            stream.
+        """
+        self._check_open(stream_id)
+        if not isinstance(chunk.audio, bytes):
+            chunk = chunk._replace(audio=bytes(chunk.audio))
+        self._send('chunk', stream_id, chunk)
+
+    def end_stream(self, stream_id):
+        """Signal that a stream has no more audio."""
+        self._check_open(stream_id)
+        self._ended.add(stream_id)
+        self._send('end', stream_id)
+
+    def _check_open(self, stream_id):
+        if stream_id not in self._closed:
+            raise UnknownStreamError(stream_id)
+        if stream_id in self._ended:
+            raise StreamEndedError(stream_id)
+
+    async def wait_stream(self, stream_id):
+        """Wait until a stream's pipeline has finished.
+
+        :raises StreamFailedError: The pipeline raised an exception or its
+            worker exited.
+        """
+        try:
+            await self._closed[stream_id]
+        finally:
+            del self._closed[stream_id]
+            self._ended.discard(stream_id)
+
+    def _watch_workers(self, procs):
+        sentinels = dict((x.sentinel, ndx) for ndx, x in enumerate(procs))
+        while sentinels:
+            for sentinel in multiprocessing.connection.wait(list(sentinels)):
+                ndx = sentinels.pop(sentinel)
+                procs[ndx].join()
+                # Queued behind anything the worker sent before exiting
+                self._out_q.put(('exited', ndx, procs[ndx].exitcode))
+
+    def _read_worker_msgs(self, loop):
+        while True:
+            msg = self._out_q.get()
+            if msg is None:
+                break
+            loop.call_soon_threadsafe(self._handle_worker_msg, msg)
+
+    def _handle_worker_msg(self, msg):
+        kind, stream_id, arg = msg
+        if kind == 'event':
+            self._events.put_nowait((stream_id, arg))
+        elif kind == 'closed':
+            closed = self._closed.get(stream_id)
+            if closed is None or closed.done():
+                return
+            if arg is None:
+                closed.set_result(None)
+            else:
+                closed.set_exception(StreamFailedError(stream_id, arg))
+        elif kind == 'exited':
+            self._worker_exited(stream_id, arg)
+
+    def _worker_exited(self, ndx, exitcode):
+        self._dead.add(ndx)
+        if exitcode:
+            LOG.error('Worker %d exited with %s', ndx, exitcode)
+        error = 'worker exited with %s' % exitcode
+        for stream_id, closed in self._closed.items():
+            if not closed.done() and self.worker_for(stream_id) == ndx:
+                closed.set_exception(StreamFailedError(stream_id, error))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._events.get()
+        if item is None:
+            raise StopAsyncIteration()
+        return item
@@ -0,0 +1,320 @@
+"""Shared memory transport for audio between processes
+
+Passing :class:`audio.AudioChunk` between processes through a
+multiprocessing queue pickles and copies every buffer. Instead a producer
+writes audio once into a :class:`SharedAudioRing` and sends small
+:class:`SharedChunk` descriptors over a channel, such as a
+``multiprocessing.Queue``. The consumer resolves descriptors to
+audio copied out of, or memoryviews of, the shared memory.
+
+On the producer side a :class:`SharedMemorySink` is placed in a pipeline,
+on the consumer side a :class:`SharedMemorySource` is used as any other
+:class:`audio.AudioSource`. There must be a single producer and a single
+consumer per ring.
+"""
+
+import asyncio
+import collections
+import queue
+import struct
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
+
+from streamtotext import audio
+
+
+SharedChunk = collections.namedtuple('SharedChunk',
+                                     ['offset', 'length', 'start_time',
+                                      'width', 'freq'])
+"""Descriptor of an :class:`audio.AudioChunk` in a :class:`SharedAudioRing`.
+
+:param offset: Position of the audio in the ring's stream of bytes.
+:type offset: int
+:param length: Number of bytes of audio.
+:type length: int
+"""
+
+BLOCK_END = 'block_end'
+"""Sent on a channel when an audio block ends."""
+
+_NO_MESSAGE = object()
+
+
+class ChunkTooLargeError(Exception):
+    def __init__(self, length, size):
+        super(ChunkTooLargeError, self).__init__(
+            'Chunk of %d bytes does not fit ring of %d bytes' % (length, size)
+        )
+
+
+class SharedAudioRing(object):
+    """A ring buffer of audio in shared memory.
+
+    Positions are byte counts since the ring was created. The producer
+    advances the head as it writes and the consumer advances the tail as it
+    releases audio, the tail is stored in shared memory so the producer
+    knows when space is free. A chunk is always stored contiguously, if it
+    does not fit before the end of the ring the remaining space is skipped.
+
+    :parameter size: Bytes of audio the ring can hold, required when
+        creating a ring.
+    :type size: int
+    :parameter name: Name of an existing ring to attach to, a new ring is
+        created if None.
+    :type name: str
+    """
+    _header = struct.Struct('Q')
+
+    def __init__(self, size=None, name=None):
+        if name is None:
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=size + self._header.size
+            )
+            self._header.pack_into(self._shm.buf, 0, 0)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.size = self._shm.size - self._header.size
+        self._data = self._shm.buf[self._header.size:]
+        self._head = 0
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def tail(self):
+        return self._header.unpack_from(self._shm.buf, 0)[0]
+
+    def try_write(self, data):
+        """Copy audio into the ring.
+
+        :ret: Position of the audio, or None if the ring is too full.
+        """
+        length = len(data)
+        if length > self.size:
+            raise ChunkTooLargeError(length, self.size)
+        offset = self._head % self.size
+        pad = self.size - offset if offset + length > self.size else 0
+        if self._head + pad + length - self.tail > self.size:
+            return None
+        pos = self._head + pad
+        offset = pos % self.size
+        self._data[offset:offset + length] = data
+        self._head = pos + length
+        return pos
+
+    async def write(self, data, poll_interval=.001):
+        """Copy audio into the ring, waiting for the consumer if full."""
+        pos = self.try_write(data)
+        while pos is None:
+            await asyncio.sleep(poll_interval)
+            pos = self.try_write(data)
+        return pos
+
+    def view(self, pos, length):
+        """Memoryview of audio written at pos."""
+        offset = pos % self.size
+        return self._data[offset:offset + length]
+
+    def release(self, end_pos):
+        """Mark all audio before end_pos as consumed."""
+        self._header.pack_into(self._shm.buf, 0, end_pos)
+
+    def close(self):
+        try:
+            self._data.release()
+            self._shm.close()
+        except BufferError:
+            # Chunks handed out are still referenced, the mapping is freed
+            # once they are collected.
+            pass
+
+    def unlink(self):
+        """Free the shared memory, called by the creator once done."""
+        self._shm.unlink()
+
+
+class _SharedSinkBlock(audio.AudioBlock):
+    def __init__(self, src_block, sink):
+        super(_SharedSinkBlock, self).__init__()
+        self._src_block = src_block
+        self._sink = sink
+
+    async def _next_chunk(self):
+        try:
+            chunk = await self._src_block.__anext__()
+        except StopAsyncIteration:
+            self._sink._channel.put(BLOCK_END)
+            raise
+        await self._sink._publish(chunk)
+        return chunk
+
+
+class SharedMemorySink(audio.AudioSourceProcessor):
+    """Publish audio passing through a pipeline to a shared memory ring.
+
+    Audio is passed through unchanged, use :func:`drain` when nothing else
+    consumes this source.
+
+    :parameter source: Input source
+    :type source: audio.AudioSource
+    :parameter ring: Ring to write audio to.
+    :type ring: SharedAudioRing
+    :parameter channel: Queue to send descriptors on, such as a
+        ``multiprocessing.Queue``.
+    :parameter poll_interval: Seconds between checks of a full ring.
+    :type poll_interval: float
+    """
+    def __init__(self, source, ring, channel, poll_interval=.001):
+        super(SharedMemorySink, self).__init__(source)
+        self._ring = ring
+        self._channel = channel
+        self._poll_interval = poll_interval
+
+    async def stop(self):
+        self._channel.put(None)
+        await super(SharedMemorySink, self).stop()
+
+    async def _publish(self, chunk):
+        pos = await self._ring.write(chunk.audio, self._poll_interval)
+        self._channel.put(SharedChunk(pos, len(chunk.audio), chunk.start_time,
+                                      chunk.width, chunk.freq))
+
+    async def _next_block(self):
+        src_block = await self._source.__anext__()
+        return _SharedSinkBlock(src_block, self)
+
+    async def drain(self):
+        """Publish all audio from the source."""
+        async with self.listen():
+            async for block in self:
+                async for _ in block:  # NOQA
+                    pass
+
+
+class _SharedSourceBlock(audio.AudioBlock):
+    def __init__(self, source, first_desc):
+        super(_SharedSourceBlock, self).__init__()
+        self._source = source
+        self._first_desc = first_desc
+
+    async def _next_chunk(self):
+        desc = self._first_desc
+        if desc is not None:
+            self._first_desc = None
+        else:
+            desc = await self._source._recv()
+            if desc is None:
+                self._source._finished = True
+                raise StopAsyncIteration()
+            if desc == BLOCK_END:
+                raise StopAsyncIteration()
+        return self._source._resolve(desc)
+
+
+class SharedMemorySource(audio.AudioSource):
+    """Audio source reading audio published by a :class:`SharedMemorySink`.
+
+    By default chunk audio is copied out of the shared memory, which is
+    released as each chunk is read, so chunks can be kept for as long as
+    needed, as by the windows of :class:`audio.SquelchedSource`.
+
+    With copy False chunks instead reference the shared memory directly. A
+    chunk's audio then stays valid only until `hold` further chunks have
+    been read, after which the producer may overwrite it. Consumers which
+    keep chunks, or views of them such as those yielded by
+    :class:`audio.EvenChunkIterator`, must copy them or use a hold at least
+    as large as the number of chunks they keep.
+
+    Descriptors are waited for in an executor thread which checks every
+    recv_timeout seconds whether it is still needed, so the thread is
+    released once a read is cancelled or the source is stopped.
+
+    :parameter ring: Ring to read audio from.
+    :type ring: SharedAudioRing
+    :parameter channel: Queue to receive descriptors from.
+    :parameter hold: Number of recent chunks kept valid without copy.
+    :type hold: int
+    :parameter copy: Whether chunk audio is copied out of shared memory.
+    :type copy: bool
+    :parameter recv_timeout: Seconds between checks of a waiting thread.
+    :type recv_timeout: float
+    """
+    def __init__(self, ring, channel, hold=1, copy=True, recv_timeout=.1):
+        super(SharedMemorySource, self).__init__()
+        self._ring = ring
+        self._channel = channel
+        self._held = collections.deque()
+        self._hold = hold
+        self._copy = copy
+        self._recv_timeout = recv_timeout
+        self._finished = False
+        self._getter = None
+        self._waiting = False
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        await super(SharedMemorySource, self).start()
+
+    async def stop(self):
+        self._stopping = True
+        await super(SharedMemorySource, self).stop()
+
+    def _get(self):
+        # Runs in an executor thread
+        while self._waiting and not self._stopping:
+            try:
+                return self._channel.get(timeout=self._recv_timeout)
+            except queue.Empty:
+                pass
+        return _NO_MESSAGE
+
+    async def _recv(self):
+        while not self._stopping:
+            if self._getter is None:
+                try:
+                    return self._channel.get_nowait()
+                except queue.Empty:
+                    pass
+                loop = asyncio.get_event_loop()
+                self._waiting = True
+                self._getter = loop.run_in_executor(None, self._get)
+            self._waiting = True
+            try:
+                # A descriptor received after a read is cancelled is kept
+                # for the next read.
+                desc = await asyncio.shield(self._getter)
+            except asyncio.CancelledError:
+                self._waiting = False
+                raise
+            self._getter = None
+            if desc is not _NO_MESSAGE:
+                return desc
+        return None
+
+    def _resolve(self, desc):
+        end_pos = desc.offset + desc.length
+        if self._copy:
+            data = bytes(self._ring.view(desc.offset, desc.length))
+            self._ring.release(end_pos)
+        else:
+            self._held.append(desc)
+            while len(self._held) > self._hold:
+                old = self._held.popleft()
+                self._ring.release(old.offset + old.length)
+            data = self._ring.view(desc.offset, desc.length)
+        return audio.AudioChunk(desc.start_time, data, desc.width, desc.freq)
+
+    async def _next_block(self):
+        while not self._finished:
+            desc = await self._recv()
+            if desc is None:
+                self._finished = True
+            elif desc != BLOCK_END:
+                return _SharedSourceBlock(self, desc)
+        raise StopAsyncIteration()
@@ -1,9 +1,14 @@
 import asyncio
+import audioop
 import os
+import random
+import struct
+import tempfile
 import time
+import wave
 
 from streamtotext import audio
-from streamtotext.tests import audio_fakes
+from streamtotext.benchmarks import sources
 from streamtotext.tests import base
 
 
@@ -24,7 +29,7 @@ class AListIter(object):
 
 class SilentSourceTestCase(base.TestCase):
     async def test_get_chunk_audio(self):
-        a_s = audio_fakes.SilentAudioSource()
+        a_s = sources.SilentAudioSource()
         block = await a_s.__anext__()
         chunk = await block.__anext__()
         sample = b'\0'
@@ -36,7 +41,7 @@ class SilentSourceTestCase(base.TestCase):
         self.assertEqual(b'\0' * len(chunk.audio), chunk.audio)
 
     async def test_get_chunk_delay(self):
-        a_s = audio_fakes.SilentAudioSource()
+        a_s = sources.SilentAudioSource()
         start_time = time.time()
         block = await a_s.__anext__()
 
@@ -50,6 +55,199 @@ class SilentSourceTestCase(base.TestCase):
         self.assertAlmostEqual(start_time + .2, time.time(), delta=.2)
 
 
+class GeneratedSourceTestCase(base.TestCase):
+    async def read_block(self, block):
+        chunks = []
+        async for chunk in block:
+            chunks.append(chunk)
+        return chunks
+
+    async def test_speed(self):
+        block = sources.ToneAudioBlock(speed=10., chunk_cnt=6)
+        start_time = time.time()
+        chunks = await self.read_block(block)
+        # Chunk 5 is due after 5 chunks of .1 seconds at 10x real time
+        self.assertAlmostEqual(start_time + .05, time.time(), delta=.03)
+        self.assertEqual(6, len(chunks))
+        self.assertAlmostEqual(chunks[0].start_time + .5,
+                               chunks[5].start_time)
+
+    async def test_unthrottled(self):
+        block = sources.NoiseAudioBlock(speed=None, chunk_cnt=1000,
+                                        chunk_samples=160)
+        start_time = time.time()
+        chunks = await self.read_block(block)
+        self.assertLess(time.time() - start_time, 1)
+        self.assertEqual(1000, len(chunks))
+        self.assertEqual(320, len(chunks[-1].audio))
+        self.assertNotEqual(chunks[0].audio, chunks[1].audio)
+
+    async def test_lag(self):
+        block = sources.SilentAudioBlock(chunk_cnt=3)
+        await block.__anext__()
+        await asyncio.sleep(.3)
+        await block.__anext__()
+        self.assertAlmostEqual(.2, block.max_lag, delta=.05)
+
+    async def test_bursts(self):
+        block = sources.BurstAudioBlock(speed=None, chunk_cnt=40,
+                                        duty_cycle=.25)
+        chunks = await self.read_block(block)
+        # 2 second periods of .5 seconds voiced
+        for voiced, quiet in ((chunks[:5], chunks[5:20]),
+                              (chunks[20:25], chunks[25:])):
+            self.assertGreater(
+                audioop.rms(audio.merge_chunks(voiced).audio, 2), 1000
+            )
+            self.assertLess(
+                audioop.rms(audio.merge_chunks(quiet).audio, 2), 200
+            )
+
+    async def test_fan_out(self):
+        streams = await sources.fan_out(
+            200, sources.ToneAudioSource, speed=None, chunk_cnt=5
+        )
+        self.assertEqual(200, len(streams))
+        self.assertTrue(all(x.block.ended for x in streams))
+
+
+class QueueAudioBlockTestCase(base.TestCase):
+    async def test_get_chunks(self):
+        block = audio.QueueAudioBlock()
+        chunk = audio.AudioChunk(time.time(), b'\0\0' * 10, 2, 16000)
+        await block.add_chunk(chunk)
+        await block.add_chunk(None)
+        self.assertEqual(chunk, await block.__anext__())
+        with self.assertRaises(StopAsyncIteration):
+            await block.__anext__()
+        self.assertTrue(block.ended)
+
+    async def test_end_wakes_waiting_consumer(self):
+        block = audio.QueueAudioBlock()
+        next_task = asyncio.ensure_future(block.__anext__())
+        await asyncio.sleep(0)
+        block.end()
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(next_task, .2)
+
+    async def test_stale_end_marker_skipped(self):
+        queue = asyncio.Queue()
+        old_block = audio.QueueAudioBlock(queue)
+        next_task = asyncio.ensure_future(old_block.__anext__())
+        await asyncio.sleep(0)
+        old_block.end()
+        chunk = audio.AudioChunk(time.time(), b'\0\0' * 10, 2, 16000)
+        await queue.put(chunk)
+        next_task.cancel()
+
+        new_block = audio.QueueAudioBlock(queue)
+        self.assertEqual(chunk, await new_block.__anext__())
+
+
+class OverflowQueueTestCase(base.TestCase):
+    def chunks(self, cnt):
+        return [audio.AudioChunk(x, bytes([x, 0]), 2, 16000)
+                for x in range(cnt)]
+
+    def drain(self, queue):
+        items = []
+        while not queue.empty():
+            items.append(queue.get_nowait())
+        return items
+
+    async def test_block(self):
+        queue = audio.OverflowQueue(2)
+        chunks = self.chunks(3)
+        await queue.put(chunks[0])
+        await queue.put(chunks[1])
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(queue.put(chunks[2]), .05)
+        self.assertFalse(queue.offer(chunks[2]))
+        self.assertEqual(1, queue.dropped)
+        self.assertEqual(chunks[:2], self.drain(queue))
+
+    async def test_drop_oldest(self):
+        queue = audio.OverflowQueue(2, audio.OVERFLOW_DROP_OLDEST)
+        chunks = self.chunks(4)
+        for chunk in chunks:
+            await queue.put(chunk)
+        self.assertEqual(chunks[2:], self.drain(queue))
+        self.assertEqual({'depth': 0, 'max_depth': 2, 'dropped': 2,
+                          'coalesced': 0}, queue.stats())
+
+    async def test_drop_oldest_keeps_control(self):
+        queue = audio.OverflowQueue(2, audio.OVERFLOW_DROP_OLDEST)
+        chunks = self.chunks(3)
+        await queue.put(None)
+        for chunk in chunks:
+            await queue.put(chunk)
+        self.assertEqual([None, chunks[2]], self.drain(queue))
+        self.assertEqual(2, queue.dropped)
+
+    async def test_drop_newest(self):
+        queue = audio.OverflowQueue(2, audio.OVERFLOW_DROP_NEWEST)
+        chunks = self.chunks(4)
+        for chunk in chunks:
+            await queue.put(chunk)
+        await queue.put(None)
+        self.assertEqual([chunks[1], None], self.drain(queue))
+        self.assertEqual(3, queue.dropped)
+
+    async def test_coalesce(self):
+        queue = audio.OverflowQueue(2, audio.OVERFLOW_COALESCE)
+        chunks = self.chunks(4)
+        for chunk in chunks:
+            await queue.put(chunk)
+        first, second = self.drain(queue)
+        self.assertEqual(chunks[0], first)
+        self.assertEqual(bytes([1, 0, 2, 0, 3, 0]), second.audio)
+        self.assertEqual(1, second.start_time)
+        self.assertEqual(2, queue.coalesced)
+        self.assertEqual(0, queue.dropped)
+
+    async def test_coalesce_limit(self):
+        queue = audio.OverflowQueue(2, audio.OVERFLOW_COALESCE,
+                                    max_coalesce_bytes=4)
+        for chunk in self.chunks(5):
+            await queue.put(chunk)
+        # Once the tail reaches the limit the oldest chunk is dropped
+        first, second = self.drain(queue)
+        self.assertEqual(bytes([1, 0, 2, 0]), first.audio)
+        self.assertEqual(bytes([3, 0, 4, 0]), second.audio)
+        self.assertEqual(1, queue.dropped)
+        self.assertEqual(2, queue.coalesced)
+
+    async def test_join(self):
+        queue = audio.OverflowQueue(1)
+        chunks = self.chunks(2)
+        await queue.put(chunks[0])
+        put = asyncio.ensure_future(queue.put(chunks[1]))
+        await asyncio.sleep(0)
+        self.assertFalse(put.done())
+        self.assertEqual(chunks[0], await queue.get())
+        queue.task_done()
+        await put
+        join = asyncio.ensure_future(queue.join())
+        await asyncio.sleep(0)
+        self.assertFalse(join.done())
+        await queue.get()
+        queue.task_done()
+        await asyncio.wait_for(join, 1)
+
+    async def test_bounded_queue_block(self):
+        block = audio.QueueAudioBlock(maxsize=2,
+                                      overflow=audio.OVERFLOW_DROP_OLDEST)
+        chunks = self.chunks(2)
+        for chunk in chunks:
+            await block.add_chunk(chunk)
+        await block.add_chunk(None)
+        received = []
+        async for chunk in block:
+            received.append(chunk)
+        self.assertEqual(chunks[1:], received)
+        self.assertEqual(1, block.queue.dropped)
+
+
 class ChunkTestCase(base.TestCase):
     async def test_split_join_chunk(self):
         chunk_audio = bytes(range(100))
@@ -83,6 +281,33 @@ class EvenChunkIteratorTestCase(base.TestCase):
         self.assertEqual(5, len(chunks))
         self.assertEqual(large_chunk, audio.merge_chunks(chunks))
 
+    async def test_chunk_start_times(self):
+        audio1 = b'\0\0' * 160
+        audio2 = b'\0\0' * 80
+        audio3 = b'\0\0' * 240
+        chunks = [audio.AudioChunk(10., audio1, 2, 16000),
+                  audio.AudioChunk(10.01, audio2, 2, 16000),
+                  audio.AudioChunk(10.015, audio3, 2, 16000)]
+        chunk_iter = AListIter(chunks)
+
+        start_times = []
+        async for chunk in audio.EvenChunkIterator(chunk_iter, 100):
+            start_times.append(chunk.start_time)
+        expected = [10. + x * 100 / 16000. for x in range(4)]
+        for expected_time, start_time in zip(expected, start_times):
+            self.assertAlmostEqual(expected_time, start_time)
+
+    async def test_straddling_chunk_audio(self):
+        chunk_audio = bytes(range(200))
+        chunks = [audio.AudioChunk(0, chunk_audio[:30], 2, 16000),
+                  audio.AudioChunk(0, chunk_audio[30:50], 2, 16000),
+                  audio.AudioChunk(0, chunk_audio[50:], 2, 16000)]
+        out = []
+        async for chunk in audio.EvenChunkIterator(AListIter(chunks), 20):
+            out.append(bytes(chunk.audio))
+        self.assertEqual(5, len(out))
+        self.assertEqual(chunk_audio, b''.join(out))
+
 
 class WaveSourceTestCase(base.TestCase):
     async def test_hello_44100_wave_get_chunk(self):
@@ -107,15 +332,172 @@ class WaveSourceTestCase(base.TestCase):
         self.assertEqual(44100, full_chunk.freq)
 
 
+class MappedWaveSourceTestCase(base.TestCase):
+    path = os.path.join(os.path.dirname(__file__),
+                        'test_data/hello_44100.wav')
+
+    async def read_chunks(self, src):
+        chunks = []
+        async with src.listen():
+            async for block in src:
+                async for chunk in block:
+                    chunks.append(chunk)
+        return chunks
+
+    async def test_matches_wave_source(self):
+        wav_chunks = await self.read_chunks(
+            audio.WaveSource(self.path, chunk_frames=1000)
+        )
+        mapped_chunks = await self.read_chunks(
+            audio.MappedWaveSource(self.path, chunk_frames=1000)
+        )
+        self.assertEqual(len(wav_chunks), len(mapped_chunks))
+        for wav_chunk, mapped_chunk in zip(wav_chunks, mapped_chunks):
+            self.assertEqual(wav_chunk.audio, bytes(mapped_chunk.audio))
+            self.assertEqual(wav_chunk.width, mapped_chunk.width)
+            self.assertEqual(wav_chunk.freq, mapped_chunk.freq)
+        self.assertAlmostEqual(1000 / 44100., mapped_chunks[1].start_time)
+
+    async def test_mono_zero_copy(self):
+        frames = struct.pack('<4h', 1, 2, 3, 4)
+        with tempfile.NamedTemporaryFile(suffix='.wav') as f:
+            with wave.open(f.name, 'wb') as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(8000)
+                wav.writeframes(frames)
+            chunks = await self.read_chunks(
+                audio.MappedWaveSource(f.name, chunk_frames=3)
+            )
+            self.assertIsInstance(chunks[0].audio, memoryview)
+            self.assertEqual(frames,
+                             b''.join(bytes(x.audio) for x in chunks))
+
+    def test_extensible_format(self):
+        def extensible_wave(sub_format):
+            fmt = struct.pack('<HHIIHHHHI', 0xFFFE, 1, 8000, 16000, 2, 16,
+                              22, 16, 4) + sub_format
+            data = b'\0\0' * 4
+            body = b''.join([b'WAVE', b'fmt ', struct.pack('<I', len(fmt)),
+                             fmt, b'data', struct.pack('<I', len(data)),
+                             data])
+            return b'RIFF' + struct.pack('<I', len(body)) + body
+
+        pcm = audio._PCM_SUBFORMAT
+        info = audio._parse_wave_header('pcm', extensible_wave(pcm))
+        self.assertEqual((8000, 2, 1, 4), info[:4])
+        # IEEE float sub format
+        float_sub = b'\x03' + pcm[1:]
+        with self.assertRaisesRegex(audio.WaveFormatError, 'not PCM'):
+            audio._parse_wave_header('float', extensible_wave(float_sub))
+
+    async def test_split(self):
+        full = await self.read_chunks(audio.MappedWaveSource(self.path))
+        segments = audio.MappedWaveSource(self.path,
+                                          chunk_frames=777).split(3)
+        results = await asyncio.gather(*[self.read_chunks(x)
+                                         for x in segments])
+        seg_audio = b''.join(bytes(chunk.audio)
+                             for chunks in results for chunk in chunks)
+        self.assertEqual(bytes(full[0].audio), seg_audio)
+        self.assertEqual(0, results[0][0].start_time)
+        self.assertAlmostEqual(segments[1]._start, results[1][0].start_time)
+
+    async def test_seek(self):
+        src = audio.MappedWaveSource(self.path, chunk_frames=100)
+        async with src.listen():
+            src.seek(.1)
+            block = await src.__anext__()
+            chunk = await block.__anext__()
+            self.assertAlmostEqual(.1, chunk.start_time, delta=1 / 44100.)
+            self.assertAlmostEqual(.1 + 100 / 44100., src.tell(),
+                                   delta=1 / 44100.)
+            self.assertAlmostEqual(src.info.nframes / 44100., src.duration)
+
+
+class SquelchDetectorTestCase(base.TestCase):
+    async def test_median_matches_check_squelch(self):
+        rand = random.Random(0)
+        chunks = []
+        for _ in range(30):
+            amp = rand.randint(0, 2000)
+            samples = b''.join(
+                rand.randint(-amp, amp).to_bytes(2, 'little', signed=True)
+                for _ in range(50)
+            )
+            chunks.append(audio.AudioChunk(0, samples, 2, 16000))
+
+        detector = audio.SquelchDetector(AListIter(chunks), 5)
+        async for _ in detector:  # NOQA
+            window = list(detector.memory())
+            rms_vals = sorted(audioop.rms(x.audio, x.width) for x in window)
+            self.assertEqual(rms_vals[int(len(rms_vals) * .5)],
+                             detector.median_rms())
+            for triggered in (True, False):
+                self.assertEqual(
+                    audio.SquelchedSource.check_squelch(800, triggered,
+                                                        window),
+                    detector.check(800, triggered)
+                )
+
+
+class RealtimeMonitorTestCase(base.TestCase):
+    async def consume(self, monitor, delay=0):
+        async with monitor.listen():
+            async for block in monitor:
+                async for _ in block:  # NOQA
+                    await asyncio.sleep(delay)
+
+    async def test_keeping_up(self):
+        monitor = audio.RealtimeMonitor(
+            sources.SilentAudioSource(chunk_cnt=5)
+        )
+        await self.consume(monitor)
+        self.assertAlmostEqual(.5, monitor.audio_time)
+        # Generated chunks are stamped at the start of their audio and
+        # delivered as they start.
+        self.assertAlmostEqual(-.1, monitor.lag, delta=.03)
+        self.assertAlmostEqual(1, monitor.realtime_factor, delta=.2)
+        self.assertAlmostEqual(0, monitor.drift, delta=.2)
+
+    async def test_falling_behind(self):
+        crossings = []
+
+        def callback(monitor, threshold, exceeded):
+            crossings.append((threshold, exceeded))
+
+        monitor = audio.RealtimeMonitor(
+            sources.SilentAudioSource(chunk_cnt=6), thresholds=[.15],
+            callback=callback
+        )
+        await self.consume(monitor, delay=.2)
+        # Audio arrives at .1 seconds per .2 seconds
+        self.assertAlmostEqual(.5, monitor.realtime_factor, delta=.1)
+        self.assertAlmostEqual(.5, monitor.drift, delta=.1)
+        self.assertGreater(monitor.lag, .3)
+        self.assertEqual([(.15, True)], crossings)
+        self.assertEqual('default', monitor.stats()['stream_id'])
+
+    async def test_relative_time(self):
+        monitor = audio.RealtimeMonitor(
+            sources.ToneAudioSource(speed=None, chunk_cnt=50),
+            use_start_times=False, thresholds=[0], callback=self.fail
+        )
+        await self.consume(monitor)
+        self.assertAlmostEqual(5, monitor.audio_time)
+        self.assertLess(monitor.lag, -4)
+        self.assertGreater(monitor.realtime_factor, 10)
+
+
 class SquelchedSourceTestCase(base.TestCase):
     async def test_detect_silent_level(self):
-        a_s = audio.SquelchedSource(audio_fakes.SilentAudioSource())
+        a_s = audio.SquelchedSource(sources.SilentAudioSource())
         level = await a_s.detect_squelch_level(detect_time=.2)
         self.assertEqual(level, a_s.squelch_level)
         self.assertEqual(0, level)
 
     async def test_get_silent_chunk(self):
-        a_s = audio.SquelchedSource(audio_fakes.SilentAudioSource(),
+        a_s = audio.SquelchedSource(sources.SilentAudioSource(),
                                     squelch_level=10)
         async with a_s.listen():
             with self.assertRaises(asyncio.TimeoutError):
@@ -138,3 +520,71 @@ class SquelchedSourceTestCase(base.TestCase):
                     chunks.append(chunk)
         self.assertEqual(1, block_cnt)
         self.assertEqual(15, len(chunks))
+
+
+# Chunk levels of a tenth of a second each: two bursts with a short pause
+# between them, then a single chunk blip.
+SQUELCH_LEVELS = [0] * 5 + [1000] * 3 + [0] * 2 + [1000] * 3 + [0] * 10
+SQUELCH_LEVELS += [1000] + [0] * 10
+
+
+async def squelched_blocks(**kwargs):
+    src = audio.QueueAudioSource()
+    for ndx, level in enumerate(SQUELCH_LEVELS):
+        samples = struct.pack('<h', level) * 1600
+        await src.add_chunk(audio.AudioChunk(ndx * .1, samples, 2, 16000))
+    await src.end()
+    a_s = audio.SquelchedSource(src, squelch_level=500, prefix_samples=1,
+                                **kwargs)
+    blocks = []
+    async with a_s.listen():
+        async for block in a_s:
+            chunks = []
+            async for chunk in block:
+                chunks.append(chunk)
+            blocks.append(chunks)
+    return a_s, blocks
+
+
+class AudioRingBufferTestCase(base.TestCase):
+    def test_keeps_last_seconds(self):
+        ring = audio.AudioRingBuffer(.25)
+        for ndx in range(5):
+            ring.append(audio.AudioChunk(ndx * .1, b'\0\0' * 1600, 2, 16000))
+        self.assertEqual([.3, .4],
+                         [round(x.start_time, 3) for x in ring.chunks()])
+        self.assertAlmostEqual(.2, ring.seconds)
+        ring.clear()
+        self.assertEqual(0, len(ring))
+        self.assertEqual(0., ring.seconds)
+
+
+class SquelchHangoverTestCase(base.TestCase):
+    async def test_defaults(self):
+        _, blocks = await squelched_blocks()
+        self.assertEqual([3, 3, 1], [len(x) for x in blocks])
+
+    async def test_hangover_joins_pauses(self):
+        _, blocks = await squelched_blocks(hangover=.25)
+        self.assertEqual([10, 3], [len(x) for x in blocks])
+        self.assertEqual(.5, blocks[0][0].start_time)
+
+    async def test_min_utterance_drops_blips(self):
+        a_s, blocks = await squelched_blocks(hangover=.25, min_utterance=.3)
+        self.assertEqual([10], [len(x) for x in blocks])
+        self.assertEqual(1, a_s.dropped)
+
+    async def test_preroll_after_dropped(self):
+        _, blocks = await squelched_blocks(preroll=.3, min_utterance=.2)
+        self.assertEqual([3, 3], [len(x) for x in blocks])
+        self.assertAlmostEqual(.2, blocks[0][0].start_time)
+
+    async def test_preroll(self):
+        _, blocks = await squelched_blocks(preroll=.2)
+        self.assertEqual([3, 3, 1], [len(x) for x in blocks])
+        first = blocks[0][0]
+        self.assertAlmostEqual(.3, first.start_time)
+        self.assertEqual(4800, audio.chunk_sample_cnt(first))
+        # Audio already emitted is not repeated in the next pre-roll
+        self.assertAlmostEqual(.8, blocks[1][0].start_time)
+        self.assertEqual(4800, audio.chunk_sample_cnt(blocks[1][0]))
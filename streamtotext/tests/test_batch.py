@@ -0,0 +1,75 @@
+import io
+import json
+import os
+import tempfile
+import wave
+
+from streamtotext import bulk
+from streamtotext.cli import batch
+from streamtotext.benchmarks import sources
+from streamtotext.tests import base
+from streamtotext.tests import test_bulk
+
+
+class BatchTestCase(base.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.dir = tmp_dir.name
+        os.mkdir(os.path.join(self.dir, 'sub'))
+        self.paths = [os.path.join(self.dir, 'a.wav'),
+                      os.path.join(self.dir, 'sub', 'b.wav')]
+        for path in self.paths:
+            sources.write_tone_wave(path, [(.5, 0), (1, 8000), (.5, 0)])
+        open(os.path.join(self.dir, 'notes.txt'), 'w').close()
+
+    def test_find_wave_files(self):
+        self.assertEqual(self.paths, batch.find_wave_files([self.dir]))
+        self.assertEqual(self.paths[:1], batch.find_wave_files(
+            [os.path.join(self.dir, '*.wav'), self.paths[0]]
+        ))
+
+    async def test_run_batch(self):
+        bulk_ts = bulk.BulkTranscriber(
+            test_bulk.SlowByteCountTranscriber, squelch_level=1000
+        )
+        out_fp = io.StringIO()
+        stats = await batch.run_batch(bulk_ts, self.paths, 2, out_fp)
+        results = [json.loads(x) for x in out_fp.getvalue().splitlines()]
+        self.assertEqual(set(self.paths), set(x['path'] for x in results))
+        for result in results:
+            self.assertEqual(1, len(result['events']))
+            self.assertAlmostEqual(2, result['duration'])
+            self.assertAlmostEqual(result['wall_time'] / 2,
+                                   result['processing_ratio'])
+        self.assertEqual(2, stats['files'])
+        self.assertEqual(0, stats['failed'])
+        self.assertAlmostEqual(4, stats['audio_seconds'])
+        self.assertGreater(stats['audio_seconds_per_second'], 0)
+        self.assertLessEqual(stats['latency_p50'], stats['latency_p95'])
+
+    async def test_bad_files(self):
+        corrupt = os.path.join(self.dir, 'corrupt.wav')
+        with open(corrupt, 'wb') as fp:
+            fp.write(b'\0' * 10)
+        empty = os.path.join(self.dir, 'empty.wav')
+        wav = wave.open(empty, 'wb')
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.close()
+        bulk_ts = bulk.BulkTranscriber(
+            test_bulk.SlowByteCountTranscriber, squelch_level=1000
+        )
+        out_fp = io.StringIO()
+        stats = await batch.run_batch(bulk_ts, [corrupt, empty] + self.paths,
+                                      2, out_fp, io.StringIO())
+        results = dict((x['path'], x) for x in
+                       map(json.loads, out_fp.getvalue().splitlines()))
+        self.assertEqual(4, len(results))
+        self.assertIn('error', results[corrupt])
+        self.assertIsNone(results[corrupt]['processing_ratio'])
+        self.assertEqual(0, results[empty]['duration'])
+        self.assertIsNone(results[empty]['processing_ratio'])
+        self.assertEqual(1, len(results[self.paths[0]]['events']))
+        self.assertEqual(1, stats['failed'])
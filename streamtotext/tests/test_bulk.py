@@ -0,0 +1,86 @@
+import asyncio
+import os
+import tempfile
+
+from streamtotext import bulk
+from streamtotext import transcriber
+from streamtotext.benchmarks import sources
+from streamtotext.tests import base
+
+
+class SlowByteCountTranscriber(transcriber.Transcriber):
+    """Emits an event per block with the number of bytes in the block."""
+    running_cnt = 0
+    max_running_cnt = 0
+
+    def __init__(self, source, freq):
+        super(SlowByteCountTranscriber, self).__init__(source)
+
+    async def _handle_audio_block(self, block):
+        cls = SlowByteCountTranscriber
+        cls.running_cnt += 1
+        cls.max_running_cnt = max(cls.max_running_cnt, cls.running_cnt)
+        n_bytes = 0
+        async for chunk in block:
+            n_bytes += len(chunk.audio)
+        await asyncio.sleep(.05)
+        cls.running_cnt -= 1
+        res = transcriber.TranscribeResult(str(n_bytes))
+        await self._handle_event(transcriber.TranscribeEvent((res,), True))
+
+    async def _read_events(self):
+        pass
+
+
+class BulkTestCase(base.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, 'utterances.wav')
+        # Three one second tones separated by silence
+        sources.write_tone_wave(self.path, [
+            (1, 0), (1, 8000), (1, 0), (1, 8000), (1, 0), (1, 8000), (1, 0)
+        ])
+        SlowByteCountTranscriber.running_cnt = 0
+        SlowByteCountTranscriber.max_running_cnt = 0
+
+    async def test_find_utterances(self):
+        utterances = await bulk.find_utterances(self.path, squelch_level=1000)
+        self.assertEqual(3, len(utterances))
+        for ndx, utterance in enumerate(utterances):
+            tone_start = 1 + ndx * 2
+            # Starts include the squelch prefix window and ends the samples
+            # until the window median falls below the level.
+            self.assertLessEqual(utterance.start, tone_start)
+            self.assertGreater(utterance.start, tone_start - .5)
+            self.assertGreater(utterance.end, tone_start + 1)
+            self.assertLess(utterance.end, tone_start + 1.5)
+
+    async def test_find_utterances_hangover(self):
+        # Pauses shorter than the hangover do not split utterances
+        utterances = await bulk.find_utterances(self.path, squelch_level=1000,
+                                                hangover=1.5)
+        self.assertEqual(1, len(utterances))
+        self.assertLessEqual(utterances[0].start, 1)
+        self.assertGreater(utterances[0].end, 6)
+
+    async def test_detect_squelch_level(self):
+        # 4 of 7 seconds are silent
+        level = await bulk.detect_squelch_level(self.path, threshold=.5)
+        self.assertEqual(0, level)
+        level = await bulk.detect_squelch_level(self.path, threshold=.7)
+        self.assertAlmostEqual(8000 / 2 ** .5, level, delta=10)
+
+    async def test_transcribe(self):
+        bulk_ts = bulk.BulkTranscriber(SlowByteCountTranscriber,
+                                       concurrency=2, squelch_level=1000)
+        utterances = await bulk_ts.find_utterances(self.path)
+        events = await bulk_ts.transcribe(self.path, utterances)
+        self.assertEqual(3, len(events))
+        self.assertEqual(utterances, [x.utterance for x in events])
+        for ev in events:
+            duration = ev.utterance.end - ev.utterance.start
+            self.assertEqual(str(int(round(duration * 16000)) * 2),
+                             ev.event.results[0].transcript)
+            self.assertEqual(ev.utterance.start, ev.as_dict()['start'])
+        self.assertEqual(2, SlowByteCountTranscriber.max_running_cnt)
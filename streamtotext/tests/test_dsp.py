@@ -0,0 +1,91 @@
+import random
+import unittest
+
+from streamtotext import dsp
+from streamtotext.tests import base
+
+
+def random_fragment(n_samples, seed=0):
+    rand = random.Random(seed)
+    return b''.join(
+        rand.randint(-30000, 30000).to_bytes(2, 'little', signed=True)
+        for _ in range(n_samples)
+    )
+
+
+@unittest.skipUnless(all(x.available() for x in dsp.BACKENDS),
+                     'Requires numpy and audioop')
+class NumpyBackendTestCase(base.TestCase):
+    def setUp(self):
+        self.np_dsp = dsp.get_backend('numpy')
+        self.ao_dsp = dsp.get_backend('audioop')
+        self.fragment = random_fragment(8820)
+
+    def test_rms(self):
+        self.assertEqual(self.ao_dsp.rms(self.fragment, 2),
+                         self.np_dsp.rms(self.fragment, 2))
+        self.assertEqual(0, self.np_dsp.rms(b'', 2))
+
+    def test_tomono(self):
+        self.assertEqual(self.ao_dsp.tomono(self.fragment, 2, .5, .5),
+                         self.np_dsp.tomono(self.fragment, 2, .5, .5))
+
+    def test_mul(self):
+        self.assertEqual(self.ao_dsp.mul(self.fragment, 2, 1.7),
+                         self.np_dsp.mul(self.fragment, 2, 1.7))
+
+    def test_lin2lin(self):
+        for width in (1, 4):
+            self.assertEqual(
+                self.ao_dsp.lin2lin(self.fragment, 2, width),
+                self.np_dsp.lin2lin(self.fragment, 2, width)
+            )
+
+    def check_ratecv(self, nchannels, inrate, outrate, chunk_bytes):
+        ao_state = np_state = None
+        ao_out = []
+        np_out = []
+        for ndx in range(0, len(self.fragment), chunk_bytes):
+            frag = memoryview(self.fragment)[ndx:ndx + chunk_bytes]
+            out, ao_state = self.ao_dsp.ratecv(frag, 2, nchannels, inrate,
+                                               outrate, ao_state)
+            ao_out.append(out)
+            out, np_state = self.np_dsp.ratecv(frag, 2, nchannels, inrate,
+                                               outrate, np_state)
+            np_out.append(out)
+
+        ao_samples = self.np_dsp._samples(b''.join(ao_out), 2)
+        np_samples = self.np_dsp._samples(b''.join(np_out), 2)
+        self.assertEqual(len(ao_samples), len(np_samples))
+        diff = abs(ao_samples.astype(int) - np_samples.astype(int))
+        self.assertLessEqual(diff.max(), 1)
+
+    def test_ratecv(self):
+        self.check_ratecv(1, 44100, 16000, 882)
+
+    def test_ratecv_lengths(self):
+        # Streams whose last output falls on their last input frame
+        for nchannels in (1, 2):
+            self.check_ratecv(nchannels, 8000, 16000, 1000)
+            self.check_ratecv(nchannels, 16000, 16000, 1000)
+            self.check_ratecv(nchannels, 44100, 16000, 1000)
+
+
+class GetBackendTestCase(base.TestCase):
+    def tearDown(self):
+        dsp.set_backend(None)
+
+    @unittest.skipUnless(dsp.AudioopBackend.available(), 'Requires audioop')
+    def test_prefers_audioop(self):
+        dsp.set_backend(None)
+        self.assertEqual('audioop', dsp.get_backend().name)
+
+    def test_set_backend(self):
+        for backend_cls in dsp.BACKENDS:
+            if backend_cls.available():
+                dsp.set_backend(backend_cls.name)
+                self.assertEqual(backend_cls.name, dsp.get_backend().name)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(dsp.NoBackendError):
+            dsp.get_backend('not-a-backend')
@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+from streamtotext import audio
+from streamtotext import metrics
+from streamtotext import transcriber
+from streamtotext.benchmarks import sources
+from streamtotext.tests import base
+
+
+class SlowBlock(audio.AudioBlock):
+    def __init__(self, src_block):
+        super(SlowBlock, self).__init__()
+        self._src_block = src_block
+
+    async def _next_chunk(self):
+        chunk = await self._src_block.__anext__()
+        time.sleep(.02)
+        return chunk
+
+
+class SlowProcessor(audio.AudioSourceProcessor):
+    async def _next_block(self):
+        return SlowBlock(await self._source.__anext__())
+
+
+class LastChunkTranscriber(transcriber.Transcriber):
+    async def _handle_audio_block(self, block):
+        async for chunk in block:
+            pass
+        res = transcriber.TranscribeResult('done')
+        await self._handle_event(transcriber.TranscribeEvent((res,), True))
+
+    async def _read_events(self):
+        pass
+
+
+class HistogramTestCase(base.TestCase):
+    def test_quantile(self):
+        hist = metrics.Histogram((1, 2, 5))
+        for value in (.5, 1.5, 1.5, 3, 10):
+            hist.observe(value)
+        self.assertEqual([1, 2, 1, 1], hist.counts)
+        self.assertEqual(1, hist.quantile(.2))
+        self.assertEqual(2, hist.quantile(.5))
+        self.assertEqual(10, hist.quantile(1))
+        self.assertAlmostEqual(3.3, hist.mean)
+        self.assertIsNone(metrics.Histogram((1,)).quantile(.5))
+
+
+class PipelineMetricsTestCase(base.TestCase):
+    def setUp(self):
+        self.sink = metrics.PrometheusSink()
+        metrics.set_sink(self.sink)
+        self.addCleanup(metrics.set_sink, None)
+
+    async def drain(self, source):
+        chunks = []
+        async with source.listen():
+            async for block in source:
+                async for chunk in block:
+                    chunks.append(chunk)
+        return chunks
+
+    async def test_stage_counts(self):
+        src = audio.RateConvert(
+            sources.ToneAudioSource(speed=None, chunk_cnt=10), 1, 8000
+        )
+        await self.drain(src)
+        for stage in ('ToneAudioSource', 'RateConvert'):
+            self.assertEqual(10, self.sink.counter('chunks_total',
+                                                   stage=stage))
+            self.assertEqual(1, self.sink.counter('blocks_total',
+                                                  stage=stage))
+            self.assertEqual(10, self.sink.histogram('stage_seconds',
+                                                     stage=stage).count)
+        self.assertEqual(32000, self.sink.counter('bytes_total',
+                                                  stage='ToneAudioSource'))
+        self.assertEqual(16000, self.sink.counter('bytes_total',
+                                                  stage='RateConvert'))
+
+    async def test_stage_time_excludes_upstream(self):
+        # The generated source waits .1 seconds between chunks
+        src = SlowProcessor(sources.SilentAudioSource(chunk_cnt=3))
+        await self.drain(src)
+        slow = self.sink.histogram('stage_seconds', stage='SlowProcessor')
+        generated = self.sink.histogram('stage_seconds',
+                                        stage='SilentAudioSource')
+        self.assertAlmostEqual(.02, slow.max, delta=.01)
+        self.assertAlmostEqual(.1, generated.max, delta=.05)
+
+    async def test_transcriber(self):
+        src = sources.SilentAudioSource(speed=None, chunk_cnt=2)
+        ts = LastChunkTranscriber(src)
+
+        async def handler(ev):
+            await asyncio.sleep(.02)
+
+        ts.register_event_handler(handler)
+        await ts.transcribe()
+        name = 'LastChunkTranscriber'
+        self.assertEqual(1, self.sink.counter('events_total',
+                                              transcriber=name))
+        self.assertEqual(2, self.sink.counter('chunks_total', stage=name))
+        handler_hist = self.sink.histogram('handler_seconds',
+                                           transcriber=name)
+        self.assertGreaterEqual(handler_hist.max, .02)
+        latency = self.sink.histogram('event_latency_seconds',
+                                      transcriber=name)
+        self.assertEqual(1, latency.count)
+
+    async def test_exposition(self):
+        await self.drain(sources.ToneAudioSource(speed=None, chunk_cnt=2))
+        text = self.sink.exposition()
+        self.assertIn('# TYPE streamtotext_chunks_total counter\n', text)
+        self.assertIn(
+            'streamtotext_chunks_total{stage="ToneAudioSource"} 2.0\n', text
+        )
+        self.assertIn('# TYPE streamtotext_stage_seconds histogram\n', text)
+        self.assertIn('streamtotext_stage_seconds_bucket'
+                      '{stage="ToneAudioSource",le="+Inf"} 2\n', text)
+        self.assertIn('streamtotext_stage_seconds_count'
+                      '{stage="ToneAudioSource"} 2\n', text)
+
+    def test_exposition_label_values(self):
+        self.sink.increment('errors_total', stage='a\\b"c\nd')
+        self.sink.increment('errors_total', stage=None)
+        self.sink.increment('errors_total', stage=3)
+        text = self.sink.exposition()
+        self.assertIn('streamtotext_errors_total{stage=""} 1.0\n', text)
+        self.assertIn('streamtotext_errors_total{stage="3"} 1.0\n', text)
+        self.assertIn(
+            'streamtotext_errors_total{stage="a\\\\b\\"c\\nd"} 1.0\n', text
+        )
+        self.assertEqual(1, self.sink.counter('errors_total', stage=None))
+
+    async def test_disabled(self):
+        metrics.set_sink(None)
+        await self.drain(sources.ToneAudioSource(speed=None, chunk_cnt=2))
+        self.assertEqual({}, self.sink.counters)
+        self.assertEqual({}, metrics._frames)
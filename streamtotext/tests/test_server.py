@@ -0,0 +1,145 @@
+import asyncio
+import json
+import struct
+
+from streamtotext import server
+from streamtotext import transcriber
+from streamtotext.tests import base
+
+
+class ByteCountTranscriber(transcriber.Transcriber):
+    """Emits an event per block with the number of bytes in the block."""
+    def __init__(self, source, freq):
+        super(ByteCountTranscriber, self).__init__(source)
+        self.freq = freq
+
+    async def _handle_audio_block(self, block):
+        n_bytes = 0
+        async for chunk in block:
+            n_bytes += len(chunk.audio)
+        res = transcriber.TranscribeResult('%d %d' % (self.freq, n_bytes))
+        await self._handle_event(transcriber.TranscribeEvent((res,), True))
+
+    async def _read_events(self):
+        pass
+
+
+class FailingTranscriber(ByteCountTranscriber):
+    async def _handle_audio_block(self, block):
+        raise RuntimeError('Failed transcription')
+
+
+class TranscriptionServerTestCase(base.TestCase):
+    async def start_server(self, factory=ByteCountTranscriber, **kwargs):
+        srv = server.TranscriptionServer(factory, port=0, **kwargs)
+        await srv.start()
+        self.addCleanup(srv.stop)
+        return srv
+
+    async def send_stream(self, srv, header, audio):
+        reader, writer = await asyncio.open_connection(srv.host, srv.port)
+        writer.write(json.dumps(header).encode('utf-8') + b'\n')
+        # Send in pieces which do not line up with samples
+        for ndx in range(0, len(audio), 333):
+            writer.write(audio[ndx:ndx + 333])
+            await writer.drain()
+        writer.write_eof()
+        lines = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            lines.append(json.loads(line.decode('utf-8')))
+        writer.close()
+        return lines
+
+    async def test_concurrent_streams(self):
+        srv = await self.start_server()
+        results = await asyncio.gather(*[
+            self.send_stream(srv, {'freq': 16000, 'stream_id': 's%d' % x},
+                             b'\0\0' * 1000 * (x + 1))
+            for x in range(3)
+        ])
+        for ndx, lines in enumerate(results):
+            self.assertEqual(1, len(lines))
+            self.assertEqual('s%d' % ndx, lines[0]['stream_id'])
+            self.assertEqual('16000 %d' % (2000 * (ndx + 1)),
+                             lines[0]['event']['results'][0]['transcript'])
+        self.assertEqual(3, srv.stats()['total_streams'])
+        self.assertEqual(0, srv.stats()['active_streams'])
+
+    async def test_rate_convert(self):
+        srv = await self.start_server(out_rate=8000)
+        lines = await self.send_stream(srv, {'freq': 16000},
+                                       b'\0\0' * 16000)
+        transcript = lines[0]['event']['results'][0]['transcript']
+        freq, n_bytes = transcript.split()
+        self.assertEqual('8000', freq)
+        self.assertAlmostEqual(16000, int(n_bytes), delta=4)
+
+    async def test_stream_isolation(self):
+        def factory(source, freq):
+            if freq == 8000:
+                return FailingTranscriber(source, freq)
+            return ByteCountTranscriber(source, freq)
+
+        srv = await self.start_server(factory, queue_size=1)
+        bad, good = await asyncio.gather(
+            self.send_stream(srv, {'freq': 8000}, b'\0\0' * 10000),
+            self.send_stream(srv, {'freq': 16000}, b'\0\0' * 100),
+        )
+        self.assertEqual([], bad)
+        self.assertEqual(1, len(good))
+        self.assertEqual(1, srv.stats()['failed_streams'])
+
+    async def test_bad_header(self):
+        srv = await self.start_server()
+        reader, writer = await asyncio.open_connection(srv.host, srv.port)
+        writer.write(b'not json\n')
+        self.assertEqual(b'', await reader.read())
+        writer.close()
+        self.assertEqual(1, srv.stats()['failed_streams'])
+
+    async def test_stereo_downmix(self):
+        srv = await self.start_server()
+        frames = struct.pack('<hh', 1000, 3000) * 1000
+        lines = await self.send_stream(srv, {'freq': 16000, 'channels': 2},
+                                       frames)
+        self.assertEqual('16000 2000',
+                         lines[0]['event']['results'][0]['transcript'])
+
+    async def test_stereo_rate_convert(self):
+        srv = await self.start_server(out_rate=8000)
+        lines = await self.send_stream(srv, {'freq': 16000, 'channels': 2},
+                                       b'\0\0' * 2 * 16000)
+        freq, n_bytes = lines[0]['event']['results'][0]['transcript'].split()
+        self.assertEqual('8000', freq)
+        self.assertAlmostEqual(16000, int(n_bytes), delta=4)
+
+    async def test_stereo_squelch(self):
+        srv = await self.start_server(squelch_level=100)
+        # A second of silence then a second of a loud stereo signal
+        frames = b'\0\0' * 2 * 16000 + struct.pack('<hh', 1000, 1000) * 16000
+        lines = await self.send_stream(srv, {'freq': 16000, 'channels': 2},
+                                       frames)
+        self.assertEqual(1, len(lines))
+        n_bytes = int(lines[0]['event']['results'][0]['transcript'].split()[1])
+        # A second of mono audio, plus at most the squelch prefix window
+        self.assertGreaterEqual(n_bytes, 32000)
+        self.assertLessEqual(n_bytes, 32000 + 4 * 3200)
+
+    def test_header_validation(self):
+        srv = server.TranscriptionServer(ByteCountTranscriber)
+        for header in ({'freq': 16000, 'width': 'x'},
+                       {'freq': 16000, 'channels': 'x'},
+                       {'freq': 16000, 'channels': 3},
+                       {'freq': 16000, 'squelch_level': 'loud'},
+                       {'freq': 16000, 'squelch_level': -1},
+                       {'freq': 0},
+                       [16000]):
+            with self.assertRaises(server.StreamHeaderError):
+                srv._parse_header(json.dumps(header).encode('utf-8'))
+        stream = srv._parse_header(b'{"freq": 16000, "channels": 2, '
+                                   b'"squelch_level": "200"}')
+        self.assertEqual(2, stream.channels)
+        self.assertEqual(200, stream.squelch_level)
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import queue
+
+from streamtotext import audio
+from streamtotext import sharding
+from streamtotext import transcriber
+from streamtotext.tests import base
+
+
+class PidTranscriber(transcriber.Transcriber):
+    """Emits an event per block with its process id and byte count."""
+    async def _handle_audio_block(self, block):
+        n_bytes = 0
+        async for chunk in block:
+            n_bytes += len(chunk.audio)
+        res = transcriber.TranscribeResult('%d %d' % (os.getpid(), n_bytes))
+        await self._handle_event(transcriber.TranscribeEvent((res,), True))
+
+    async def _read_events(self):
+        pass
+
+
+class FailingTranscriber(PidTranscriber):
+    async def _handle_audio_block(self, block):
+        raise RuntimeError('Failed transcription')
+
+
+class ExitingTranscriber(PidTranscriber):
+    async def _handle_audio_block(self, block):
+        os._exit(3)
+
+
+def pid_transcriber(source, freq):
+    if freq == 8000:
+        return FailingTranscriber(source)
+    if freq == 4000:
+        return ExitingTranscriber(source)
+    return PidTranscriber(source)
+
+
+class ShardWorkerTestCase(base.TestCase):
+    async def test_full_out_queue_does_not_block_loop(self):
+        in_q = queue.Queue()
+        out_q = queue.Queue(1)
+        out_q.put('filler')
+        worker = sharding._ShardWorker(pid_transcriber, in_q, out_q, 10,
+                                       audio.OVERFLOW_BLOCK)
+        task = asyncio.ensure_future(worker.run())
+        chunk = audio.AudioChunk(0, b'\0\0', 2, 16000)
+        for msg in (('open', 'a', 16000), ('chunk', 'a', chunk),
+                    ('end', 'a', None)):
+            in_q.put(msg)
+        # Ticks while the worker waits to put the event
+        for _ in range(5):
+            await asyncio.wait_for(asyncio.sleep(.01), 1)
+        self.assertFalse(task.done())
+
+        loop = asyncio.get_event_loop()
+        msgs = [await loop.run_in_executor(None, out_q.get, True, 5)
+                for _ in range(3)]
+        self.assertEqual('filler', msgs[0])
+        self.assertEqual(('event', 'a'), msgs[1][:2])
+        self.assertEqual(('closed', 'a', None), msgs[2])
+        in_q.put(('shutdown', None, None))
+        await asyncio.wait_for(task, 5)
+
+
+class ShardedRunnerTestCase(base.TestCase):
+    async def test_streams_across_workers(self):
+        runner = sharding.ShardedRunner(pid_transcriber, workers=2)
+        stream_ids = ['stream-%d' % x for x in range(6)]
+        events = {}
+        async with runner.listen():
+            for ndx, stream_id in enumerate(stream_ids):
+                runner.open_stream(stream_id, 16000)
+                chunk = audio.AudioChunk(0, b'\0\0' * (ndx + 1), 2, 16000)
+                runner.add_chunk(stream_id, chunk)
+                runner.add_chunk(stream_id, chunk._replace(
+                    audio=memoryview(chunk.audio)
+                ))
+                runner.end_stream(stream_id)
+            for stream_id in stream_ids:
+                await asyncio.wait_for(runner.wait_stream(stream_id), 10)
+
+            for _ in stream_ids:
+                stream_id, ev = await runner.__anext__()
+                events[stream_id] = ev.results[0].transcript.split()
+
+        pids = set()
+        for ndx, stream_id in enumerate(stream_ids):
+            pid, n_bytes = events[stream_id]
+            self.assertEqual(str(4 * (ndx + 1)), n_bytes)
+            pids.add(pid)
+        self.assertNotIn(str(os.getpid()), pids)
+        self.assertEqual(len(set(runner.worker_for(x) for x in stream_ids)),
+                         len(pids))
+
+    async def test_failed_stream(self):
+        runner = sharding.ShardedRunner(pid_transcriber, workers=1)
+        async with runner.listen():
+            runner.open_stream('bad', 8000)
+            runner.add_chunk('bad', audio.AudioChunk(0, b'\0\0', 2, 8000))
+            runner.end_stream('bad')
+            with self.assertRaises(sharding.StreamFailedError):
+                await asyncio.wait_for(runner.wait_stream('bad'), 10)
+
+    async def test_unknown_stream(self):
+        runner = sharding.ShardedRunner(pid_transcriber, workers=1)
+        with self.assertRaises(sharding.UnknownStreamError):
+            runner.end_stream('missing')
+
+    async def test_chunk_after_end(self):
+        runner = sharding.ShardedRunner(pid_transcriber, workers=1)
+        chunk = audio.AudioChunk(0, b'\0\0', 2, 16000)
+        async with runner.listen():
+            runner.open_stream('a', 16000)
+            runner.end_stream('a')
+            with self.assertRaises(sharding.StreamEndedError):
+                runner.add_chunk('a', chunk)
+            with self.assertRaises(sharding.StreamEndedError):
+                runner.end_stream('a')
+            await asyncio.wait_for(runner.wait_stream('a'), 10)
+
+    async def test_worker_ignores_unknown_stream(self):
+        runner = sharding.ShardedRunner(pid_transcriber, workers=1)
+        chunk = audio.AudioChunk(0, b'\0\0', 2, 16000)
+        async with runner.listen():
+            runner.open_stream('a', 16000)
+            runner.open_stream('b', 16000)
+            runner.end_stream('a')
+            # As sent before the parent checked for ended streams
+            runner._send('chunk', 'a', chunk)
+            runner._send('end', 'missing')
+            runner.add_chunk('b', chunk)
+            runner.end_stream('b')
+            await asyncio.wait_for(runner.wait_stream('a'), 10)
+            await asyncio.wait_for(runner.wait_stream('b'), 10)
+            events = {}
+            for _ in range(2):
+                stream_id, ev = await runner.__anext__()
+                events[stream_id] = ev.results[0].transcript.split()[1]
+        self.assertEqual({'a': '0', 'b': '2'}, events)
+
+    async def test_worker_exits(self):
+        runner = sharding.ShardedRunner(pid_transcriber, workers=1)
+        async with runner.listen():
+            runner.open_stream('pending', 16000)
+            runner.open_stream('exits', 4000)
+            runner.add_chunk('exits', audio.AudioChunk(0, b'\0\0', 2, 4000))
+            with self.assertRaisesRegex(sharding.StreamFailedError, 'exited'):
+                await asyncio.wait_for(runner.wait_stream('exits'), 10)
+            with self.assertRaises(sharding.StreamFailedError):
+                await asyncio.wait_for(runner.wait_stream('pending'), 10)
+            with self.assertRaises(sharding.StreamFailedError):
+                runner.open_stream('other', 16000)
@@ -0,0 +1,133 @@
+import asyncio
+import multiprocessing
+import os
+import unittest
+
+from streamtotext import audio
+from streamtotext import shm
+from streamtotext.tests import base
+
+
+HELLO_PATH = os.path.join(os.path.dirname(__file__),
+                          'test_data/hello_44100.wav')
+
+
+async def read_all(source):
+    blocks = []
+    async with source.listen():
+        async for block in source:
+            audio_data = []
+            async for chunk in block:
+                audio_data.append(bytes(chunk.audio))
+            blocks.append(b''.join(audio_data))
+    return blocks
+
+
+def consume_in_child(ring_name, channel, result_q):
+    ring = shm.SharedAudioRing(name=ring_name)
+    source = shm.SharedMemorySource(ring, channel)
+    loop = asyncio.new_event_loop()
+    result_q.put(loop.run_until_complete(read_all(source)))
+    loop.close()
+    ring.close()
+
+
+@unittest.skipIf(shm.shared_memory is None, 'Requires shared_memory')
+class SharedMemoryTestCase(base.TestCase):
+    def setUp(self):
+        # Smaller than the file so the ring wraps and fills up
+        self.ring = shm.SharedAudioRing(size=7000)
+        self.addCleanup(self.ring.unlink)
+        self.addCleanup(self.ring.close)
+
+    async def wave_blocks(self):
+        return await read_all(audio.WaveSource(HELLO_PATH,
+                                               chunk_frames=1000))
+
+    async def test_same_process(self):
+        channel = multiprocessing.Queue()
+        sink = shm.SharedMemorySink(
+            audio.WaveSource(HELLO_PATH, chunk_frames=1000), self.ring,
+            channel
+        )
+        source = shm.SharedMemorySource(self.ring, channel)
+        _, blocks = await asyncio.gather(sink.drain(), read_all(source))
+        self.assertEqual(await self.wave_blocks(), blocks)
+
+    async def test_kept_chunks_stay_valid(self):
+        channel = multiprocessing.Queue()
+        sink = shm.SharedMemorySink(
+            audio.WaveSource(HELLO_PATH, chunk_frames=1000), self.ring,
+            channel
+        )
+        source = shm.SharedMemorySource(self.ring, channel)
+        chunks = []
+
+        async def keep_chunks():
+            async with source.listen():
+                async for block in source:
+                    async for chunk in block:
+                        chunks.append(chunk)
+
+        await asyncio.gather(sink.drain(), keep_chunks())
+        # The ring wrapped many times, kept chunks were not overwritten
+        expected = await self.wave_blocks()
+        kept = [b''.join(bytes(x.audio) for x in chunks)]
+        self.assertTrue(expected == kept, 'Kept chunks were overwritten')
+
+    async def test_zero_copy(self):
+        channel = multiprocessing.Queue()
+        sink = shm.SharedMemorySink(
+            audio.WaveSource(HELLO_PATH, chunk_frames=1000), self.ring,
+            channel
+        )
+        source = shm.SharedMemorySource(self.ring, channel, copy=False)
+        _, blocks = await asyncio.gather(sink.drain(), read_all(source))
+        self.assertEqual(await self.wave_blocks(), blocks)
+
+    async def test_cancelled_recv(self):
+        channel = multiprocessing.Queue()
+        source = shm.SharedMemorySource(self.ring, channel,
+                                        recv_timeout=.01)
+        recv = asyncio.ensure_future(source._recv())
+        await asyncio.sleep(.05)
+        recv.cancel()
+        getter = source._getter
+        # The waiting thread notices it is no longer needed
+        await asyncio.wait_for(asyncio.wait([getter]), 1)
+        channel.put(shm.BLOCK_END)
+        self.assertEqual(shm.BLOCK_END,
+                         await asyncio.wait_for(source._recv(), 1))
+
+    async def test_stop_releases_recv(self):
+        channel = multiprocessing.Queue()
+        source = shm.SharedMemorySource(self.ring, channel,
+                                        recv_timeout=.01)
+        await source.start()
+        next_block = asyncio.ensure_future(source.__anext__())
+        await asyncio.sleep(.05)
+        await source.stop()
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(next_block, 1)
+
+    async def test_other_process(self):
+        channel = multiprocessing.Queue()
+        result_q = multiprocessing.Queue()
+        proc = multiprocessing.Process(
+            target=consume_in_child,
+            args=(self.ring.name, channel, result_q)
+        )
+        proc.start()
+        sink = shm.SharedMemorySink(
+            audio.WaveSource(HELLO_PATH, chunk_frames=1000), self.ring,
+            channel
+        )
+        await sink.drain()
+        loop = asyncio.get_event_loop()
+        blocks = await loop.run_in_executor(None, result_q.get)
+        await loop.run_in_executor(None, proc.join)
+        self.assertEqual(await self.wave_blocks(), blocks)
+
+    async def test_chunk_too_large(self):
+        with self.assertRaises(shm.ChunkTooLargeError):
+            self.ring.try_write(b'\0' * 7001)
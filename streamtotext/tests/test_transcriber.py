@@ -1,14 +1,17 @@
 import asyncio
 import collections
+import concurrent.futures
 import json
 import os
+import threading
 from unittest import mock
 
 import websockets.exceptions
 
 from streamtotext import audio, transcriber
-from streamtotext.tests import audio_fakes
+from streamtotext.benchmarks import sources
 from streamtotext.tests import base
+from streamtotext.tests import watson_fakes
 
 
 class FakeTranscriber(transcriber.Transcriber):
@@ -40,13 +43,204 @@ class EvHandler(object):
 
 class FakeTranscriberTestCase(base.TestCase):
     async def test_event_handler(self):
-        ts = FakeTranscriber(audio_fakes.SilentAudioSource())
+        ts = FakeTranscriber(sources.SilentAudioSource())
         handler = EvHandler(ts)
         ts.register_event_handler(handler.handle)
         async with ts:
             await handler.called.wait()
 
 
+class SlowEvHandler(object):
+    def __init__(self, delay=.05):
+        self.delay = delay
+        self.events = []
+        self.active = 0
+        self.max_active = 0
+
+    async def handle(self, event):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        self.events.append(event)
+
+
+def make_event(ndx, final=True):
+    return transcriber.TranscribeEvent(
+        [transcriber.TranscribeResult(str(ndx))], final
+    )
+
+
+class EventDispatchTestCase(base.TestCase):
+    async def test_queued_handler_does_not_block(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+        handler = SlowEvHandler(delay=1)
+        ts.register_event_handler(handler.handle,
+                                  mode=transcriber.DISPATCH_ORDERED)
+        await asyncio.wait_for(ts._handle_event(make_event(0)), .1)
+        self.assertEqual([], handler.events)
+        await ts._dispatchers[0].close()
+        self.assertEqual(1, len(handler.events))
+
+    async def test_ordered(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+        handler = SlowEvHandler(delay=.001)
+        ts.register_event_handler(handler.handle,
+                                  mode=transcriber.DISPATCH_ORDERED)
+        events = [make_event(x) for x in range(10)]
+        for event in events:
+            await ts._handle_event(event)
+        await ts._dispatchers[0].close()
+        self.assertEqual(events, handler.events)
+        self.assertEqual(1, handler.max_active)
+
+    async def test_unordered_concurrency(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+        handler = SlowEvHandler(delay=.05)
+        ts.register_event_handler(handler.handle,
+                                  mode=transcriber.DISPATCH_UNORDERED,
+                                  concurrency=3)
+        for ndx in range(9):
+            await ts._handle_event(make_event(ndx))
+        await ts._dispatchers[0].close()
+        self.assertEqual(9, len(handler.events))
+        self.assertEqual(3, handler.max_active)
+
+    async def test_drop_oldest(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+        handler = SlowEvHandler(delay=.01)
+        ts.register_event_handler(handler.handle,
+                                  mode=transcriber.DISPATCH_ORDERED,
+                                  queue_size=2,
+                                  overflow=audio.OVERFLOW_DROP_OLDEST)
+        events = [make_event(x) for x in range(5)]
+        for event in events:
+            await ts._handle_event(event)
+        stats = ts.dispatch_stats()[0]
+        await ts._dispatchers[0].close()
+        self.assertEqual(events[-2:], handler.events)
+        self.assertEqual(3, stats['dropped'])
+
+    async def test_coalesce_interim(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+        handler = SlowEvHandler(delay=.01)
+        ts.register_event_handler(handler.handle,
+                                  mode=transcriber.DISPATCH_ORDERED,
+                                  queue_size=2,
+                                  overflow=audio.OVERFLOW_COALESCE)
+        events = [make_event(0), make_event(1, False), make_event(2, False),
+                  make_event(3, False), make_event(4)]
+        for event in events:
+            await ts._handle_event(event)
+        await ts._dispatchers[0].close()
+        self.assertEqual([events[0], events[4]], handler.events)
+        self.assertEqual(3, ts.dispatch_stats()[0]['coalesced'])
+
+    async def test_queue_bounded_by_default(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+        handler = SlowEvHandler(delay=0)
+        ts.register_event_handler(handler.handle,
+                                  mode=transcriber.DISPATCH_ORDERED)
+        ts.register_event_handler(handler.handle,
+                                  mode=transcriber.DISPATCH_ORDERED,
+                                  queue_size=0)
+        await ts._handle_event(make_event(0))
+        self.assertEqual(audio.DEFAULT_QUEUE_SIZE,
+                         ts._dispatchers[0]._queue.maxsize)
+        self.assertEqual(0, ts._dispatchers[1]._queue.maxsize)
+        for dispatcher in ts._dispatchers:
+            await dispatcher.close()
+
+    async def test_flushed_on_exit(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+        handler = SlowEvHandler(delay=.01)
+        ts.register_event_handler(handler.handle,
+                                  mode=transcriber.DISPATCH_ORDERED)
+        async with ts:
+            for ndx in range(5):
+                await ts._handle_event(make_event(ndx))
+        self.assertEqual(5, len([x for x in handler.events
+                                 if x is not None]))
+
+    async def test_handler_error_logged(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+
+        async def fail(event):
+            raise ValueError('handler failed')
+
+        ts.register_event_handler(fail, mode=transcriber.DISPATCH_ORDERED)
+        with self.assertLogs('streamtotext.transcriber', 'ERROR'):
+            await ts._handle_event(make_event(0))
+            await ts._dispatchers[0].close()
+        self.assertEqual(1, ts.dispatch_stats()[0]['errors'])
+
+    async def test_inline_error_raised(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+
+        async def fail(event):
+            raise ValueError('handler failed')
+
+        ts.register_event_handler(fail)
+        with self.assertRaises(ValueError):
+            await ts._handle_event(make_event(0))
+
+
+def make_scored_event(ndx, confidence, final=True):
+    return transcriber.TranscribeEvent(
+        [transcriber.TranscribeResult(str(ndx), confidence)], final
+    )
+
+
+class SubscriptionTestCase(base.TestCase):
+    async def collect(self, events):
+        return [x async for x in events]
+
+    async def test_fan_out(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+        subs = [ts.subscribe(), ts.events]
+        consumers = [asyncio.ensure_future(self.collect(x)) for x in subs]
+        events = [make_event(x) for x in range(5)]
+        async with ts:
+            for event in events:
+                await ts._handle_event(event)
+        for consumer in consumers:
+            self.assertEqual(events, await consumer)
+
+    async def test_filters(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+        finals = ts.subscribe(final_only=True)
+        confident = ts.subscribe(min_confidence=.5)
+        events = [make_scored_event(0, None, False),
+                  make_scored_event(1, .9),
+                  make_scored_event(2, .2),
+                  make_scored_event(3, None)]
+        async with ts:
+            for event in events:
+                await ts._handle_event(event)
+        self.assertEqual(events[1:], await self.collect(finals))
+        self.assertEqual([events[1]], await self.collect(confident))
+        self.assertEqual(3, confident.stats()['filtered'])
+
+    async def test_slow_subscriber_drops_oldest(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+        sub = ts.subscribe(queue_size=2)
+        events = [make_event(x) for x in range(5)]
+        async with ts:
+            for event in events:
+                await ts._handle_event(event)
+        self.assertEqual(events[-2:], await self.collect(sub))
+        self.assertEqual(3, sub.stats()['dropped'])
+
+    async def test_close(self):
+        ts = FakeTranscriber(sources.SilentAudioSource())
+        sub = ts.subscribe()
+        await ts._handle_event(make_event(0))
+        sub.close()
+        await ts._handle_event(make_event(1))
+        self.assertEqual(1, len(await self.collect(sub)))
+        self.assertEqual([], ts._subscriptions)
+
+
 class FakeWatsonWS(object):
     def __init__(self):
         self._sent_msgs = collections.deque()
@@ -92,7 +286,7 @@ class WatsonTranscriberTestCase(base.TestCase):
         with mock.patch('websockets.connect') as mock_ws:
             fake_ws = FakeWatsonWS()
             mock_ws.return_value = fake_ws.connect()
-            ts = transcriber.WatsonTranscriber(audio_fakes.SilentAudioSource(),
+            ts = transcriber.WatsonTranscriber(sources.SilentAudioSource(),
                                                16000, 'fakeuser', 'fakepass')
             handler = EvHandler(ts)
             ts.register_event_handler(handler.handle)
@@ -100,6 +294,204 @@ class WatsonTranscriberTestCase(base.TestCase):
                 await handler.called.wait()
 
 
+WATSON_FINAL_MSG = json.dumps({
+    'result_index': 0,
+    'results': [{
+        'final': True,
+        'alternatives': [
+            {'transcript': 'hello world', 'confidence': .9,
+             'timestamps': [['hello', .1, .5], ['world', .6, 1.]],
+             'word_confidence': [['hello', .95], ['world', .85]]},
+            {'transcript': 'yellow world'},
+        ],
+    }],
+})
+
+
+class WatsonParseTestCase(base.TestCase):
+    def tearDown(self):
+        transcriber.set_json_backend(None)
+
+    def test_final(self):
+        for backend in transcriber.JSON_BACKENDS:
+            transcriber.set_json_backend(backend)
+            self.assertEqual(backend, transcriber.get_json_backend())
+            ev = transcriber._watson_msg_to_event(
+                transcriber._json_loads(WATSON_FINAL_MSG)
+            )
+            self.assertTrue(ev.final)
+            self.assertEqual(['hello world', 'yellow world'],
+                             [x.transcript for x in ev.results])
+            self.assertEqual([.9, None],
+                             [x.confidence for x in ev.results])
+
+    def test_interim(self):
+        ev = transcriber._watson_msg_to_event({'results': [{
+            'final': False, 'alternatives': [{'transcript': 'hel'}]
+        }]})
+        self.assertFalse(ev.final)
+        self.assertEqual([], ev.results[0].timestamps)
+        self.assertEqual([], ev.results[0].word_confidence)
+
+    def test_lazy_word_fields(self):
+        ev = transcriber._watson_msg_to_event(json.loads(WATSON_FINAL_MSG))
+        result = ev.results[0]
+        self.assertIsNone(result._timestamps)
+        self.assertEqual([transcriber.WordTimestamp('hello', .1, .5),
+                          transcriber.WordTimestamp('world', .6, 1.)],
+                         result.timestamps)
+        self.assertIs(result.timestamps, result.timestamps)
+        self.assertEqual('world', result.word_confidence[1].word)
+        self.assertEqual(.85, result.word_confidence[1].confidence)
+
+    def test_slots(self):
+        result = transcriber.TranscribeResult('hi')
+        ev = transcriber.GoogleTranscribeEvent([result], True, .5)
+        self.assertEqual(.5, ev.stability)
+        self.assertTrue(ev.final)
+        for obj in (result, ev):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            transcriber.set_json_backend('simdjson')
+
+
+def chunks_block(n_chunks, n_samples=160):
+    queue = asyncio.Queue()
+    for _ in range(n_chunks):
+        queue.put_nowait(audio.AudioChunk(0, b'\0\0' * n_samples, 2, 16000))
+    queue.put_nowait(None)
+    return audio.QueueAudioBlock(queue)
+
+
+class WatsonConnectionPoolTestCase(base.TestCase):
+    async def setUp(self):
+        self.server = watson_fakes.FakeWatsonServer()
+        await self.server.start()
+        self.pool = transcriber.WatsonConnectionPool(
+            'fakeuser', 'fakepass', host=self.server.host, uri_base='',
+            secure=False
+        )
+        self.ts = transcriber.WatsonTranscriber(
+            sources.SilentAudioSource(), 16000, 'fakeuser', 'fakepass',
+            connection_pool=self.pool
+        )
+        self.handler = EvHandler(self.ts)
+        self.ts.register_event_handler(self.handler.handle)
+
+    async def tearDown(self):
+        await self.pool.close()
+        await self.server.stop()
+
+    async def test_reuses_connection(self):
+        await self.ts._handle_audio_block(chunks_block(2))
+        await self.ts._handle_audio_block(chunks_block(3))
+        self.assertEqual(['640 bytes', '960 bytes'],
+                         [ev.results[0].transcript
+                          for ev in self.handler.events])
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(2, len(self.server.starts))
+
+    async def test_warm(self):
+        await self.pool.warm(2)
+        self.assertEqual(2, self.server.connections)
+        await self.ts._handle_audio_block(chunks_block(1))
+        self.assertEqual(2, self.pool.connects)
+
+    async def test_evicts_closed_connection(self):
+        await self.ts._handle_audio_block(chunks_block(1))
+        await self.server.drop_connections()
+        await asyncio.sleep(.05)
+        await self.ts._handle_audio_block(chunks_block(1))
+        self.assertEqual(2, self.server.connections)
+        self.assertEqual(2, len(self.handler.events))
+
+
+class WatsonReconnectTestCase(base.TestCase):
+    async def setUp(self):
+        self.server = watson_fakes.FakeWatsonServer(result_seconds=.5)
+        await self.server.start()
+
+    async def tearDown(self):
+        await self.server.stop()
+
+    def make_transcriber(self, chunk_cnt=30, **kwargs):
+        source = sources.ToneAudioSource(speed=4, chunk_cnt=chunk_cnt)
+        return transcriber.WatsonTranscriber(
+            source, 16000, 'fakeuser', 'fakepass', host=self.server.host,
+            uri_base='', secure=False, reconnect_delay=.01, **kwargs
+        )
+
+    async def test_reconnect_replays(self):
+        ts = self.make_transcriber()
+        ends = []
+
+        async def handle(event):
+            ends.extend(x.end for x in event.results[0].timestamps)
+
+        ts.register_event_handler(handle)
+        task = asyncio.ensure_future(ts.transcribe())
+        await asyncio.sleep(.3)
+        await self.server.drop_connections()
+        await task
+        stats = ts.reconnect_stats()
+        self.assertEqual(1, stats['reconnects'])
+        self.assertEqual(2, self.server.connections)
+        self.assertGreater(len(ends), 3)
+        self.assertEqual([.5 * (x + 1) for x in range(len(ends))], ends)
+        # Audio in flight when the connection dropped is lost, and sent
+        # again with the rest of the unacknowledged audio.
+        received = self.server.audio_bytes / 32000.
+        self.assertGreaterEqual(received, 3)
+        self.assertLessEqual(received, 3 + stats['replayed_seconds'] + .001)
+
+    async def test_reconnect_fails(self):
+        ts = self.make_transcriber(max_reconnects=2)
+        task = asyncio.ensure_future(ts.transcribe())
+        await asyncio.sleep(.2)
+        await self.server.stop()
+        with self.assertRaises(transcriber.WatsonReconnectError):
+            await task
+        self.assertFalse(ts.running)
+        await self.server.start()
+
+    async def test_stop_after_failed_replay(self):
+        ts = self.make_transcriber()
+        await ts._start()
+
+        async def fail():
+            raise transcriber.WatsonReconnectError(1, 'replay failed')
+
+        ts._send_buffered = fail
+        with self.assertRaises(transcriber.WatsonReconnectError):
+            await ts._stop()
+        self.assertFalse(ts.running)
+        self.assertIsNone(ts._stream)
+
+    def test_duplicates_suppressed(self):
+        ts = self.make_transcriber()
+        msg = watson_fakes.FakeWatsonServer.timed_result(0., .5)
+        self.assertEqual(.5, ts._session_event(msg).results[0]
+                         .timestamps[0].end)
+        ts._session_offset = .25
+        self.assertIsNone(ts._session_event(
+            watson_fakes.FakeWatsonServer.timed_result(0., .25)
+        ))
+        ev = ts._session_event(msg)
+        self.assertEqual(.75, ev.results[0].timestamps[0].end)
+        self.assertEqual(1, ts.duplicates)
+
+    def test_replay_buffer_bounded(self):
+        ts = self.make_transcriber(replay_seconds=.5)
+        for _ in range(10):
+            ts._buffer_audio(audio.AudioChunk(0, b'\0\0' * 1600, 2, 16000))
+        self.assertEqual(5, len(ts._replay))
+        self.assertAlmostEqual(.5, ts.replay_dropped_seconds)
+        ts._acknowledge(.75)
+        self.assertEqual(3, len(ts._replay))
+
+
 class PocketSphinxTranscriberTestCase(base.TestCase):
     async def test_transcribe(self):
         hello_path = os.path.join(
@@ -119,3 +511,150 @@ class PocketSphinxTranscriberTestCase(base.TestCase):
 
         self.assertEqual(handler.events[0].results[0].transcript,
                          'hello')
+
+
+class FakePocketSphinxHyp(object):
+    def __init__(self, hypstr):
+        self.hypstr = hypstr
+
+
+class FakePocketSphinxDecoder(object):
+    def __init__(self, config):
+        self.config = config
+        self.audio_threads = set()
+        self._utt_bytes = None
+        self._hyp = None
+
+    @staticmethod
+    def default_config():
+        return mock.Mock()
+
+    def start_utt(self):
+        assert self._utt_bytes is None
+        self._utt_bytes = 0
+
+    def process_raw(self, audio, no_search, full_utt):
+        self.audio_threads.add(threading.get_ident())
+        self._utt_bytes += len(audio)
+
+    def end_utt(self):
+        self._hyp = FakePocketSphinxHyp('%d bytes' % self._utt_bytes)
+        self._utt_bytes = None
+
+    def hyp(self):
+        return self._hyp
+
+
+class FakePocketSphinxTestCase(base.TestCase):
+    def setUp(self):
+        self.decoders = []
+
+        def new_decoder(config):
+            decoder = FakePocketSphinxDecoder(config)
+            self.decoders.append(decoder)
+            return decoder
+
+        fake_ps = mock.Mock()
+        fake_ps.Decoder.side_effect = new_decoder
+        fake_ps.Decoder.default_config = FakePocketSphinxDecoder.default_config
+        patcher = mock.patch('streamtotext.transcriber.pocketsphinx', fake_ps,
+                             create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        transcriber.set_default_decoder_pool(
+            transcriber.PocketSphinxDecoderPool()
+        )
+        self.addCleanup(transcriber.set_default_decoder_pool, None)
+
+
+class PocketSphinxDecoderPoolTestCase(FakePocketSphinxTestCase):
+    paths_a = ('hmm', 'lm_a', 'dict')
+    paths_b = ('hmm', 'lm_b', 'dict')
+
+    async def test_lease_reuses_decoder(self):
+        pool = transcriber.PocketSphinxDecoderPool()
+        pool.preload(self.paths_a)
+        self.assertEqual(1, len(self.decoders))
+
+        decoder = await pool.lease(self.paths_a)
+        self.assertIs(self.decoders[0], decoder)
+        other = await pool.lease(self.paths_a)
+        self.assertIsNot(decoder, other)
+        self.assertEqual(2, pool.size)
+
+        pool.release(decoder)
+        pool.release(other)
+        self.assertIn(await pool.lease(self.paths_a), self.decoders)
+        self.assertEqual(2, len(self.decoders))
+
+    async def test_max_decoders_evicts_idle(self):
+        pool = transcriber.PocketSphinxDecoderPool(max_decoders=1)
+        pool.preload(self.paths_a)
+        decoder = await pool.lease(self.paths_b)
+        self.assertIs(self.decoders[1], decoder)
+        self.assertEqual(1, pool.size)
+
+    async def test_max_decoders_waits(self):
+        pool = transcriber.PocketSphinxDecoderPool(max_decoders=1)
+        decoder = pool.acquire(self.paths_a)
+        self.assertIsNone(pool.acquire(self.paths_a, timeout=.01))
+        next_lease = asyncio.ensure_future(pool.lease(self.paths_a))
+        await asyncio.sleep(.05)
+        self.assertFalse(next_lease.done())
+        pool.release(decoder)
+        self.assertIs(decoder, await asyncio.wait_for(next_lease, 1))
+
+    async def test_cancelled_lease_releases(self):
+        pool = transcriber.PocketSphinxDecoderPool(max_decoders=1)
+        decoder = pool.acquire(self.paths_a)
+        next_lease = asyncio.ensure_future(pool.lease(self.paths_a))
+        await asyncio.sleep(.05)
+        # Released while the lease's executor call is waiting on the pool
+        pool.release(decoder)
+        next_lease.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await next_lease
+        await asyncio.sleep(.05)
+        self.assertIs(decoder, pool.try_acquire(self.paths_a))
+
+    async def test_waiting_leases_share_executor(self):
+        executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        loop = asyncio.get_event_loop()
+        loop.set_default_executor(executor)
+        pool = transcriber.PocketSphinxDecoderPool(max_decoders=1)
+        pool.lease_poll_interval = .01
+        pool.acquire(self.paths_a)
+        leases = [asyncio.ensure_future(pool.lease(self.paths_a))
+                  for _ in range(3)]
+        await asyncio.sleep(.05)
+        # Waiting leases do not keep the only executor thread to themselves
+        self.assertEqual(1, await asyncio.wait_for(
+            loop.run_in_executor(None, lambda: 1), 1))
+        for lease in leases:
+            lease.cancel()
+        await asyncio.gather(*leases, return_exceptions=True)
+
+
+class PocketSphinxWorkerPoolTestCase(FakePocketSphinxTestCase):
+    async def test_transcribe_in_worker(self):
+        pool = transcriber.PocketSphinxWorkerPool(size=2)
+        self.addCleanup(pool.shutdown)
+        block = audio.QueueAudioBlock()
+        for _ in range(3):
+            await block.add_chunk(audio.AudioChunk(0, b'\0\0' * 100, 2,
+                                                   16000))
+        await block.add_chunk(None)
+        ts = transcriber.PocketSphinxTranscriber(
+            sources.SilentAudioSource(), 'hmm', 'lm', 'dict',
+            worker_pool=pool
+        )
+        handler = EvHandler(ts)
+        ts.register_event_handler(handler.handle)
+        await ts._handle_audio_block(block)
+
+        self.assertEqual('600 bytes', handler.events[0].results[0].transcript)
+        self.assertEqual(1, len(self.decoders))
+        self.assertNotIn(threading.get_ident(),
+                         self.decoders[0].audio_threads)
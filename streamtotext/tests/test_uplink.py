@@ -0,0 +1,228 @@
+import asyncio
+import sys
+import zlib
+from unittest import mock
+
+from streamtotext import transcriber, uplink
+from streamtotext.benchmarks import sources
+from streamtotext.tests import base
+from streamtotext.tests import watson_fakes
+
+
+ZLIB_SCRIPT = '''
+import sys, zlib
+c = zlib.compressobj()
+while True:
+    data = sys.stdin.buffer.read1(65536)
+    if not data:
+        break
+    sys.stdout.buffer.write(c.compress(data))
+    sys.stdout.buffer.flush()
+sys.stdout.buffer.write(c.flush())
+'''
+
+
+class ZlibEncoder(uplink.ProcessEncoder):
+    name = 'zlib'
+    program = sys.executable
+
+    def content_type(self, rate):
+        return 'application/zlib'
+
+    def command(self, rate):
+        return [self.program, '-c', ZLIB_SCRIPT]
+
+
+class FailingEncoder(ZlibEncoder):
+    def command(self, rate):
+        return [self.program, '-c',
+                'import sys; sys.stderr.write("bad input"); sys.exit(3)']
+
+
+class MissingEncoder(ZlibEncoder):
+    program = 'streamtotext-no-such-encoder'
+
+    def command(self, rate):
+        return [self.program]
+
+
+def tone_audio(seconds=1):
+    block = sources.ToneAudioBlock()
+    return block.gen_period() * seconds
+
+
+class EncoderTestCase(base.TestCase):
+    def setUp(self):
+        self.sent = []
+
+    async def send(self, data):
+        self.sent.append(data)
+
+    async def test_pcm(self):
+        encoder = uplink.PCMEncoder()
+        self.assertEqual('audio/l16;rate=16000',
+                         encoder.content_type(16000))
+        await encoder.start(16000, self.send)
+        await encoder.write(memoryview(b'\1\2' * 10))
+        await encoder.close()
+        self.assertEqual([b'\1\2' * 10], self.sent)
+        self.assertEqual(20, encoder.bytes_out)
+
+    async def test_process(self):
+        data = tone_audio(2)
+        encoder = ZlibEncoder()
+        await encoder.start(16000, self.send)
+        for ndx in range(0, len(data), 3200):
+            await encoder.write(data[ndx:ndx + 3200])
+        await encoder.close()
+        self.assertEqual(data, zlib.decompress(b''.join(self.sent)))
+        self.assertEqual(len(data), encoder.bytes_in)
+        self.assertLess(encoder.bytes_out, encoder.bytes_in)
+
+    async def test_process_fails(self):
+        encoder = FailingEncoder()
+        await encoder.start(16000, self.send)
+        await encoder.write(b'\0\0' * 1600)
+        with self.assertRaisesRegex(uplink.EncoderError, 'bad input'):
+            await encoder.close()
+
+    async def test_process_abort(self):
+        encoder = ZlibEncoder()
+        await encoder.start(16000, self.send)
+        await encoder.write(b'\0\0' * 1600)
+        await encoder.abort()
+        await encoder.close()
+
+    async def test_missing_program(self):
+        self.assertFalse(MissingEncoder.available())
+        with self.assertRaises(uplink.EncoderError):
+            await MissingEncoder().start(16000, self.send)
+
+    def test_get_encoder_factory(self):
+        self.assertIs(uplink.PCMEncoder, uplink.get_encoder_factory('l16'))
+        self.assertIs(ZlibEncoder, uplink.get_encoder_factory(ZlibEncoder))
+        with self.assertRaises(ValueError):
+            uplink.get_encoder_factory('wav')
+        with mock.patch.dict(uplink.ENCODERS, {'missing': MissingEncoder}):
+            with self.assertRaises(uplink.EncoderError):
+                uplink.get_encoder_factory('missing')
+
+    def test_commands(self):
+        self.assertIn('--sample-rate=16000',
+                      uplink.FlacEncoder().command(16000))
+        self.assertEqual(['-', '-'], uplink.OpusEncoder(
+            bitrate=24).command(16000)[-2:])
+
+
+class SenderTestCase(base.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.send_delay = 0
+
+    async def send(self, data):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self.sent.append(data)
+
+    async def test_frame_sender(self):
+        sender = uplink.FrameSender(self.send)
+        await sender.send(b'\0' * 10)
+        await sender.send(b'\0' * 30)
+        await sender.close()
+        stats = sender.stats()
+        self.assertEqual(2, stats['frames'])
+        self.assertEqual(20., stats['avg_frame_size'])
+
+    async def test_coalesces_to_frame_size(self):
+        sender = uplink.CoalescingSender(self.send, max_delay=10,
+                                         min_frame_size=100)
+        for _ in range(10):
+            await sender.send(b'\1' * 40)
+        self.assertEqual([120, 120, 120], [len(x) for x in self.sent])
+        await sender.close()
+        self.assertEqual(b'\1' * 400, b''.join(self.sent))
+        self.assertEqual(4, sender.stats()['frames'])
+
+    async def test_max_delay(self):
+        sender = uplink.CoalescingSender(self.send, max_delay=.01,
+                                         min_frame_size=100)
+        await sender.send(b'\1' * 10)
+        await sender.send(b'\2' * 10)
+        self.assertEqual([], self.sent)
+        await asyncio.sleep(.05)
+        self.assertEqual([b'\1' * 10 + b'\2' * 10], self.sent)
+        await sender.close()
+        self.assertEqual(1, len(self.sent))
+
+    async def test_adapts_to_slow_sends(self):
+        self.send_delay = .02
+        sender = uplink.CoalescingSender(self.send, max_delay=10,
+                                         min_frame_size=100,
+                                         max_frame_size=400,
+                                         slow_send=.01)
+        for _ in range(20):
+            await sender.send(b'\0' * 100)
+        self.assertEqual(400, sender.frame_size)
+        self.send_delay = 0
+        for _ in range(40):
+            await sender.send(b'\0' * 100)
+        await sender.close()
+        self.assertEqual(100, sender.frame_size)
+
+    async def test_abort(self):
+        sender = uplink.CoalescingSender(self.send, max_delay=.01,
+                                         min_frame_size=100)
+        await sender.send(b'\0' * 10)
+        sender.abort()
+        await asyncio.sleep(.03)
+        self.assertEqual([], self.sent)
+
+
+class WatsonUplinkTestCase(base.TestCase):
+    async def setUp(self):
+        self.server = watson_fakes.FakeWatsonServer()
+        await self.server.start()
+        self.pool = transcriber.WatsonConnectionPool(
+            'fakeuser', 'fakepass', host=self.server.host, uri_base='',
+            secure=False
+        )
+
+    async def tearDown(self):
+        await self.pool.close()
+        await self.server.stop()
+
+    async def transcribe(self, encoding, frame_delay=None,
+                         chunk_samples=1600):
+        source = sources.ToneAudioSource(chunk_samples=chunk_samples,
+                                         speed=None, chunk_cnt=20)
+        ts = transcriber.WatsonTranscriber(
+            source, 16000, 'fakeuser', 'fakepass', connection_pool=self.pool,
+            encoding=encoding, frame_delay=frame_delay
+        )
+        await ts.transcribe()
+        return ts
+
+    async def test_l16(self):
+        ts = await self.transcribe('l16')
+        self.assertEqual('audio/l16;rate=16000',
+                         self.server.starts[0]['content-type'])
+        self.assertEqual(64000, self.server.audio_bytes)
+        self.assertEqual(1., ts.uplink_stats()['ratio'])
+
+    async def test_encoded(self):
+        ts = await self.transcribe(ZlibEncoder)
+        stats = ts.uplink_stats()
+        self.assertEqual('application/zlib',
+                         self.server.starts[0]['content-type'])
+        self.assertEqual(64000, stats['bytes_in'])
+        self.assertEqual(self.server.audio_bytes, stats['bytes_out'])
+        self.assertLess(stats['ratio'], .5)
+
+    async def test_frame_delay(self):
+        ts = await self.transcribe('l16', frame_delay=10, chunk_samples=160)
+        stats = ts.uplink_stats()
+        self.assertEqual(6400, self.server.audio_bytes)
+        self.assertEqual(self.server.audio_frames, stats['frames'])
+        self.assertLess(stats['frames'], 20)
+        self.assertEqual(self.server.audio_bytes / stats['frames'],
+                         stats['avg_frame_size'])
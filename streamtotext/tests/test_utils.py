@@ -0,0 +1,11 @@
+from streamtotext import utils
+from streamtotext.tests import base
+
+
+class PercentileTestCase(base.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, utils.percentile(values, 50))
+        self.assertEqual(95, utils.percentile(values, 95))
+        self.assertEqual(3, utils.percentile([3], 95))
+        self.assertIsNone(utils.percentile([], 50))
@@ -0,0 +1,104 @@
+import json
+
+import websockets
+import websockets.exceptions
+
+
+class FakeWatsonServer(object):
+    """Local websocket server speaking a subset of the Watson protocol.
+
+    Each utterance is answered with a single final result whose transcript
+    is the number of audio bytes received, e.g. '3200 bytes'. With
+    result_seconds set, a final result with a word timestamp is also sent
+    for every result_seconds of 16 bit audio received.
+    """
+    def __init__(self, result_seconds=None):
+        self.result_seconds = result_seconds
+        self._server = None
+        self._conns = set()
+        self.port = None
+        self.connections = 0
+        self.starts = []
+        self.audio_bytes = 0
+        self.audio_frames = 0
+
+    @property
+    def host(self):
+        return '127.0.0.1:%d' % self.port
+
+    async def start(self):
+        self._server = await websockets.serve(self._handle, '127.0.0.1', 0)
+        self.port = list(self._server.sockets)[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def drop_connections(self):
+        """Close all client connections from the server side."""
+        for ws in list(self._conns):
+            await ws.close()
+
+    async def _handle(self, ws, path=None):
+        self.connections += 1
+        self._conns.add(ws)
+        utt_bytes = 0
+        result_bytes = next_result = None
+        bytes_per_sec = 32000.
+        try:
+            async for msg in ws:
+                if isinstance(msg, bytes):
+                    utt_bytes += len(msg)
+                    self.audio_bytes += len(msg)
+                    self.audio_frames += 1
+                    while result_bytes and utt_bytes >= next_result:
+                        await ws.send(json.dumps(self.timed_result(
+                            (next_result - result_bytes) / bytes_per_sec,
+                            next_result / bytes_per_sec
+                        )))
+                        next_result += result_bytes
+                    continue
+                msg = json.loads(msg)
+                action = msg.get('action')
+                if action == 'start':
+                    self.starts.append(msg)
+                    utt_bytes = 0
+                    if self.result_seconds:
+                        content_type = msg.get('content-type', '')
+                        if 'rate=' in content_type:
+                            rate = int(content_type.split('rate=')[1])
+                            bytes_per_sec = 2. * rate
+                        seconds = self.result_seconds
+                        result_bytes = int(seconds * bytes_per_sec)
+                        next_result = result_bytes
+                    await ws.send(json.dumps({'state': 'listening'}))
+                elif action == 'stop':
+                    await ws.send(json.dumps(self.final_result(utt_bytes)))
+                    await ws.send(json.dumps({'state': 'listening'}))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._conns.discard(ws)
+
+    @staticmethod
+    def timed_result(start, end):
+        return {
+            'result_index': 0,
+            'results': [{
+                'final': True,
+                'alternatives': [{'transcript': 'word',
+                                  'confidence': .9,
+                                  'timestamps': [['word', start, end]]}],
+            }],
+        }
+
+    @staticmethod
+    def final_result(n_bytes):
+        return {
+            'result_index': 0,
+            'results': [{
+                'final': True,
+                'alternatives': [{'transcript': '%d bytes' % n_bytes,
+                                  'confidence': .9}],
+            }],
+        }
@@ -6,9 +6,14 @@ The main base class which is responsible for performing transcription is
 
 import asyncio
 import base64
+import collections
+from concurrent import futures
 from contextlib import contextmanager
 import json
+import logging
 import os
+import threading
+import time
 
 import websockets
 try:
@@ -18,6 +23,23 @@ except ImportError:
     # TODO(greghaynes): Only fail open during doc gen
     pass
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+from streamtotext import audio
+from streamtotext import metrics
+from streamtotext import uplink
+
+
+LOG = logging.getLogger(__name__)
+
 
 class AlreadyRunningError(Exception):
     def __init__(self):
@@ -33,18 +55,112 @@ class AlreadyStoppedError(Exception):
         )
 
 
+def _json_backends():
+    ret = collections.OrderedDict()
+    if orjson is not None:
+        ret['orjson'] = orjson.loads
+    if ujson is not None:
+        ret['ujson'] = ujson.loads
+    ret['json'] = json.loads
+    return ret
+
+
+JSON_BACKENDS = tuple(_json_backends())
+"""Names of available JSON decoders for service messages, fastest first."""
+
+_json_backend = JSON_BACKENDS[0]
+_json_loads = _json_backends()[_json_backend]
+
+
+def get_json_backend():
+    return _json_backend
+
+
+def set_json_backend(name=None):
+    """Set the JSON decoder used for service messages.
+
+    :param name: One of :data:`JSON_BACKENDS`, or None for the fastest.
+    :type name: str
+    """
+    global _json_backend, _json_loads
+    backends = _json_backends()
+    if name is None:
+        name = JSON_BACKENDS[0]
+    if name not in backends:
+        raise ValueError('JSON backend %s is not available' % name)
+    _json_backend = name
+    _json_loads = backends[name]
+
+
+WordTimestamp = collections.namedtuple('WordTimestamp',
+                                       ['word', 'start', 'end'])
+"""Seconds into the transcribed audio at which a word starts and ends."""
+
+WordConfidence = collections.namedtuple('WordConfidence',
+                                        ['word', 'confidence'])
+
+
 class TranscribeResult(object):
-    def __init__(self, transcript, confidence=None):
+    """A transcription alternative.
+
+    Word timestamps and confidences are kept as received in raw, the
+    alternative's message, and only parsed when first accessed.
+
+    :parameter transcript: The transcribed text.
+    :type transcript: str
+    :parameter confidence: Confidence of the transcript, if known.
+    :type confidence: float
+    :parameter raw: Decoded message of the alternative.
+    :type raw: dict
+    :parameter offset: Seconds added to the timestamps in raw, the start of
+        the service's session in the transcribed audio.
+    :type offset: float
+    """
+    __slots__ = ('transcript', 'confidence', '_raw', '_offset',
+                 '_timestamps', '_word_confidence')
+
+    def __init__(self, transcript, confidence=None, raw=None, offset=0.):
         self.transcript = transcript
         self.confidence = confidence
+        self._raw = raw
+        self._offset = offset
+        self._timestamps = None
+        self._word_confidence = None
+
+    @property
+    def timestamps(self):
+        """List of :class:`WordTimestamp`, empty if not known."""
+        if self._timestamps is None:
+            raw = ()
+            if self._raw is not None:
+                raw = self._raw.get('timestamps', ())
+            offset = self._offset
+            self._timestamps = [WordTimestamp(w, start + offset, end + offset)
+                                for w, start, end in raw]
+        return self._timestamps
+
+    @property
+    def word_confidence(self):
+        """List of :class:`WordConfidence`, empty if not known."""
+        if self._word_confidence is None:
+            raw = ()
+            if self._raw is not None:
+                raw = self._raw.get('word_confidence', ())
+            self._word_confidence = [WordConfidence(*x) for x in raw]
+        return self._word_confidence
 
     def __str__(self):
         return 'TranscribeResult(transcript=%s, confidence=%s)' % (
             self.transcript, self.confidence
         )
 
+    def as_dict(self):
+        return {'transcript': self.transcript, 'confidence': self.confidence}
+
 
 class TranscribeEvent(object):
+    __slots__ = ('results', 'final')
+
     def __init__(self, results, final):
         self.results = results
         self.final = final
@@ -54,19 +170,230 @@ class TranscribeEvent(object):
         results_str = ', '.join([str(x) for x in self.results])
         return ret % (results_str, self.final)
 
+    def as_dict(self):
+        """A JSON serializable representation of the event."""
+        return {'results': [x.as_dict() for x in self.results],
+                'final': self.final}
+
 
 class GoogleTranscribeEvent(TranscribeEvent):
+    __slots__ = ('stability',)
+
     def __init__(self, results, final, stability):
-        super(TranscribeEvent, self).__init__(results, final)
+        super(GoogleTranscribeEvent, self).__init__(results, final)
         self.stability = stability
 
 
+DISPATCH_INLINE = 'inline'
+"""Await the handler for each event before the transcriber continues."""
+DISPATCH_ORDERED = 'ordered'
+"""Queue events for the handler, which receives them one at a time."""
+DISPATCH_UNORDERED = 'unordered'
+"""Queue events for the handler, which may handle several at once."""
+DISPATCH_MODES = (DISPATCH_INLINE, DISPATCH_ORDERED, DISPATCH_UNORDERED)
+
+
+class EventQueue(audio.OverflowQueue):
+    """An :class:`audio.OverflowQueue` of :class:`TranscribeEvent`.
+
+    With the :data:`audio.OVERFLOW_COALESCE` policy an event put on a full
+    queue replaces the newest queued event if that event is not final, as
+    interim results are superseded by later ones.
+    """
+    def _coalesce(self, event):
+        tail = self._items[-1]
+        if tail is None or getattr(tail, 'final', True):
+            return False
+        self._items[-1] = event
+        self.coalesced += 1
+        return True
+
+
+class _EventDispatcher(object):
+    def __init__(self, handler, name, mode, queue_size, overflow,
+                 concurrency):
+        if mode not in DISPATCH_MODES:
+            raise ValueError('Unknown dispatch mode %s' % mode)
+        self.handler = handler
+        self._name = name
+        self.mode = mode
+        self._queue_size = queue_size
+        self._overflow = overflow
+        self._concurrency = concurrency
+        self._queue = None
+        self._task = None
+        self.errors = 0
+
+    async def put(self, event):
+        if self.mode == DISPATCH_INLINE:
+            await self._call(event)
+            return
+        if self._task is None:
+            self._queue = EventQueue(self._queue_size, self._overflow)
+            if self.mode == DISPATCH_ORDERED:
+                self._task = asyncio.ensure_future(self._run_ordered())
+            else:
+                self._task = asyncio.ensure_future(self._run_unordered())
+        await self._queue.put(event)
+
+    async def close(self):
+        """Deliver queued events and stop."""
+        if self._task is None:
+            return
+        task = self._task
+        self._task = None
+        try:
+            await self._queue.join()
+        finally:
+            task.cancel()
+            await asyncio.wait([task])
+
+    def stats(self):
+        if self._queue is None:
+            return {'mode': self.mode, 'errors': self.errors}
+        ret = self._queue.stats()
+        ret.update({'mode': self.mode, 'errors': self.errors})
+        return ret
+
+    async def _call(self, event):
+        sink = metrics._sink
+        if sink is None:
+            await self.handler(event)
+            return
+        start = time.perf_counter()
+        await self.handler(event)
+        sink.observe('handler_seconds', time.perf_counter() - start,
+                     transcriber=self._name)
+
+    async def _deliver(self, event):
+        try:
+            await self._call(event)
+        except Exception:
+            self.errors += 1
+            LOG.exception('Event handler %r failed', self.handler)
+
+    async def _run_ordered(self):
+        queue = self._queue
+        while True:
+            event = await queue.get()
+            try:
+                await self._deliver(event)
+            finally:
+                queue.task_done()
+
+    async def _run_unordered(self):
+        queue = self._queue
+        slots = asyncio.Semaphore(self._concurrency)
+
+        def delivered(task):
+            slots.release()
+            queue.task_done()
+
+        while True:
+            event = await queue.get()
+            await slots.acquire()
+            asyncio.ensure_future(
+                self._deliver(event)
+            ).add_done_callback(delivered)
+
+
+class EventSubscription(object):
+    """An async iterator of the events of a :class:`Transcriber`.
+
+    Created with :func:`Transcriber.subscribe`. Events which pass the
+    filters are put on the subscription's own :class:`EventQueue`, and
+    iteration ends once queued events have been read after the transcriber
+    stops or the subscription is closed.
+
+    :parameter final_only: Only receive final events.
+    :type final_only: bool
+    :parameter min_confidence: Only receive events with a result of at
+        least this confidence. Results without a confidence, such as
+        interim results from Watson, do not pass.
+    :type min_confidence: float
+    :parameter queue_size: Maximum number of queued events, 0 for no limit.
+    :type queue_size: int
+    :parameter overflow: Overflow policy of the queue.
+    :type overflow: str
+    """
+    def __init__(self, final_only=False, min_confidence=None,
+                 queue_size=audio.DEFAULT_QUEUE_SIZE,
+                 overflow=audio.OVERFLOW_DROP_OLDEST):
+        self.final_only = final_only
+        self.min_confidence = min_confidence
+        self._queue = EventQueue(queue_size, overflow)
+        self._ended = False
+        self._transcriber = None
+        self.filtered = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._ended and self._queue.empty():
+            raise StopAsyncIteration
+        event = await self._queue.get()
+        if event is None:
+            self._ended = True
+            raise StopAsyncIteration
+        return event
+
+    def accepts(self, event):
+        """Whether an event passes the subscription's filters."""
+        if self.final_only and not event.final:
+            return False
+        if self.min_confidence is not None:
+            confidences = [x.confidence for x in event.results
+                           if x.confidence is not None]
+            if not confidences or max(confidences) < self.min_confidence:
+                return False
+        return True
+
+    async def put(self, event):
+        if event is None or not self.accepts(event):
+            self.filtered += 1
+            return
+        await self._queue.put(event)
+
+    def end(self):
+        """End iteration after the queued events."""
+        if self._ended:
+            return
+        if self._queue.full():
+            # Nothing is waiting on a full queue, and an end marker would
+            # displace an event.
+            self._ended = True
+        else:
+            self._queue.put_nowait(None)
+
+    def close(self):
+        """Stop receiving events from the transcriber and end iteration."""
+        if self._transcriber is not None:
+            self._transcriber._subscriptions.remove(self)
+            self._transcriber = None
+        self.end()
+
+    def stats(self):
+        ret = self._queue.stats()
+        ret['filtered'] = self.filtered
+        return ret
+
+
 class Transcriber(object):
     """Base class for implementing a transcriber.
 
     Once :func:`transcribe` is called a transcriber awaits on get_chunk from
     an audio source and then streams them to a transcription service.
 
+    Events are delivered to handlers registered with
+    :func:`register_event_handler`, and to any number of iterators from
+    :func:`subscribe`. Queued handlers receive their remaining events
+    before the transcriber stops.
+
+    When a :mod:`metrics` sink is set, blocks are timed and counted under
+    the transcriber's class name as they are read, and the latency from
+    capture of the latest audio read to each event is recorded.
+
     :parameter source: Input audio source
     :type source: audio.AudioSource
     """
@@ -74,7 +401,9 @@ class Transcriber(object):
         self._source = source
         self.running = False
         self._stopped_running = asyncio.Event()
-        self._ev_handlers = []
+        self._dispatchers = []
+        self._subscriptions = []
+        self._last_audio_time = None
 
     async def __aenter__(self):
         await self._start()
@@ -84,7 +413,20 @@ class Transcriber(object):
     async def __aexit__(self, exc_type, exc, tb):
         self._audio_task.cancel()
         self._read_task.cancel()
-        await self._stop()
+        try:
+            for dispatcher in self._dispatchers:
+                await dispatcher.close()
+        finally:
+            for subscription in self._subscriptions:
+                subscription._transcriber = None
+                subscription.end()
+            self._subscriptions = []
+            await self._stop()
+
+    async def transcribe(self):
+        """Transcribe the audio source until it runs out of audio."""
+        async with self:
+            await self._audio_task
 
     async def _start(self):
         if self.running:
@@ -99,19 +441,102 @@ class Transcriber(object):
         else:
             raise AlreadyStoppedError()
 
-    def register_event_handler(self, handler):
-        self._ev_handlers.append(handler)
+    def register_event_handler(self, handler, mode=DISPATCH_INLINE,
+                               queue_size=audio.DEFAULT_QUEUE_SIZE,
+                               overflow=audio.OVERFLOW_BLOCK,
+                               concurrency=1):
+        """Register a coroutine function to call with each event.
+
+        Inline handlers are awaited in turn by the task which produced the
+        event, so a slow handler delays transcription and an exception
+        propagates to the transcriber. Other handlers each have a queue and
+        a task delivering from it, their exceptions are logged.
+
+        :param handler: Coroutine function taking a :class:`TranscribeEvent`.
+        :param mode: One of :data:`DISPATCH_MODES`.
+        :type mode: str
+        :param queue_size: Maximum number of queued events. 0 opts in to an
+            unbounded queue.
+        :type queue_size: int
+        :param overflow: Overflow policy of the queue, see
+            :class:`EventQueue`.
+        :type overflow: str
+        :param concurrency: Maximum number of events handled at once with
+            :data:`DISPATCH_UNORDERED`.
+        :type concurrency: int
+        """
+        self._dispatchers.append(_EventDispatcher(
+            handler, self.__class__.__name__, mode, queue_size, overflow,
+            concurrency
+        ))
+
+    def subscribe(self, final_only=False, min_confidence=None,
+                  queue_size=audio.DEFAULT_QUEUE_SIZE,
+                  overflow=audio.OVERFLOW_DROP_OLDEST):
+        """Subscribe to events.
+
+        The default drop-oldest overflow policy keeps a slow subscriber from
+        slowing transcription, use :data:`audio.OVERFLOW_BLOCK` for a
+        subscriber which must see every event. Iteration ends when the
+        transcriber stops, a subscriber leaving early should call
+        :func:`EventSubscription.close`.
+
+        :ret: :class:`EventSubscription` receiving events from now on, see
+            it for parameters.
+        """
+        subscription = EventSubscription(final_only, min_confidence,
+                                         queue_size, overflow)
+        subscription._transcriber = self
+        self._subscriptions.append(subscription)
+        return subscription
+
+    @property
+    def events(self):
+        """A new :class:`EventSubscription` to all events."""
+        return self.subscribe()
+
+    def dispatch_stats(self):
+        """Queue counters and handler errors of each registered handler."""
+        return [x.stats() for x in self._dispatchers]
 
     async def _handle_event(self, event):
-        for handler in self._ev_handlers:
-            await handler(event)
+        sink = metrics._sink
+        if sink is not None:
+            name = self.__class__.__name__
+            if self._last_audio_time is not None:
+                sink.observe('event_latency_seconds',
+                             time.time() - self._last_audio_time,
+                             transcriber=name)
+            sink.increment('events_total', transcriber=name)
+        for dispatcher in self._dispatchers:
+            await dispatcher.put(event)
+        for subscription in self._subscriptions:
+            await subscription.put(event)
 
     async def _handle_audio(self):
         async with self._source.listen():
             async for block in self._source:
+                if metrics._sink is not None:
+                    block = _TranscriberInputBlock(block, self)
                 await self._handle_audio_block(block)
 
 
+class _TranscriberInputBlock(audio.AudioBlock):
+    """Records the capture time of audio read by a transcriber."""
+    def __init__(self, block, ts):
+        super(_TranscriberInputBlock, self).__init__()
+        self._block = block
+        self._ts = ts
+        self.metrics_stage = ts.__class__.__name__
+
+    async def _next_chunk(self):
+        chunk = await self._block.__anext__()
+        self._ts._last_audio_time = audio.sample_time(
+            chunk, audio.chunk_sample_cnt(chunk)
+        )
+        return chunk
+
+
 class WatsonStartError(Exception):
     def __init__(self, msg):
         super(WatsonStartError, self).__init__(
@@ -119,11 +544,191 @@ class WatsonStartError(Exception):
         )
 
 
+class WatsonReconnectError(Exception):
+    def __init__(self, attempts, error):
+        super(WatsonReconnectError, self).__init__(
+            'Unable to reconnect after %d attempts: %r' % (attempts, error)
+        )
+
+
+def _watson_url(host, uri_base, secure=True):
+    return '%s://%s/%s' % ('wss' if secure else 'ws', host, uri_base)
+
+
+def _basic_auth_header(user, passwd):
+    seed = ':'.join((user, passwd))
+    return ' '.join(('Basic',
+                     base64.b64encode(seed.encode('utf-8')).decode()))
+
+
+async def _ws_connect(url, headers):
+    try:
+        return await websockets.connect(url, extra_headers=headers)
+    except TypeError:
+        # websockets 14 renamed extra_headers
+        return await websockets.connect(url, additional_headers=headers)
+
+
+async def _ws_close(ws):
+    try:
+        ret = ws.close()
+        if ret is not None:
+            await ret
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+
+def _ws_is_open(ws):
+    is_open = getattr(ws, 'open', None)
+    if is_open is None:
+        # websockets 14 replaced open with state
+        return ws.state is websockets.protocol.State.OPEN
+    return is_open
+
+
+class WatsonConnectionPool(object):
+    """Pool of authenticated websocket connections to Watson.
+
+    Opening a connection requires a TLS handshake and authentication, which
+    for short utterances can take longer than transcribing them. A pool
+    keeps connections open between utterances so that a
+    :class:`WatsonTranscriber` only needs to send a new start action.
+    Connections are checked before reuse and discarded once closed.
+
+    :parameter user: Service username.
+    :type user: str
+    :parameter password: Service password.
+    :type password: str
+    :parameter max_idle: Maximum number of idle connections kept open.
+    :type max_idle: int
+    :parameter secure: Connect using wss rather than ws.
+    :type secure: bool
+    """
+    def __init__(self, user, password,
+                 host='stream.watsonplatform.net',
+                 uri_base='/speech-to-text/api/v1/recognize',
+                 max_idle=4, secure=True):
+        self._url = _watson_url(host, uri_base, secure)
+        self._headers = {'Authorization': _basic_auth_header(user, password)}
+        self.max_idle = max_idle
+        self._idle = collections.deque()
+        self.connects = 0
+
+    async def _connect(self):
+        ws = await _ws_connect(self._url, self._headers)
+        self.connects += 1
+        return ws
+
+    async def warm(self, count):
+        """Open connections so later acquires do not wait for them."""
+        conns = await asyncio.gather(*[self._connect() for _ in
+                                       range(count)])
+        for ws in conns:
+            await self.release(ws)
+
+    async def acquire(self):
+        """Get an open connection, opening a new one if none are idle."""
+        while self._idle:
+            ws = self._idle.pop()
+            if _ws_is_open(ws):
+                return ws
+            await self.discard(ws)
+        return await self._connect()
+
+    async def release(self, ws):
+        """Return a healthy connection for reuse."""
+        if len(self._idle) < self.max_idle and _ws_is_open(ws):
+            self._idle.append(ws)
+        else:
+            await self.discard(ws)
+
+    async def discard(self, ws):
+        """Close a connection which should not be reused."""
+        try:
+            await ws.close()
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def close(self):
+        """Close all idle connections."""
+        while self._idle:
+            await self.discard(self._idle.pop())
+
+
+class _UplinkStream(object):
+    def __init__(self, encoder, sender):
+        self.encoder = encoder
+        self.sender = sender
+
+    async def close(self):
+        try:
+            await self.encoder.close()
+        finally:
+            await self.sender.close()
+
+    async def abort(self):
+        try:
+            await self.encoder.abort()
+        finally:
+            self.sender.abort()
+
+
 class WatsonTranscriber(Transcriber):
+    """Transcriber which streams audio to the Watson speech to text service.
+
+    By default a single websocket session is held open while the transcriber
+    runs. If the connection drops it is reopened, immediately and then with
+    exponentially increasing delays, and audio which may not have been
+    transcribed is sent again. Sent audio is kept until a final result
+    with timestamps past its end arrives, for up to replay_seconds. Results
+    in the new session which end before the last final result are
+    suppressed, and result timestamps are relative to the start of the
+    transcribed audio rather than of the session.
+
+    If a :class:`WatsonConnectionPool` is given each
+    :class:`audio.AudioBlock` is instead transcribed as an utterance on a
+    pooled connection: a start action is sent, the block's audio streamed,
+    and results are read until the service is listening again.
+
+    :parameter source: Input audio source
+    :type source: audio.AudioSource
+    :parameter source_freq: Sampling frequency of the source.
+    :type source_freq: int
+    :parameter connection_pool: Pool to transcribe utterances with.
+    :type connection_pool: WatsonConnectionPool
+    :parameter secure: Connect using wss rather than ws.
+    :type secure: bool
+    :parameter encoding: Encoding of audio sent to the service, a name in
+        :data:`uplink.ENCODERS` or a callable returning a new
+        :class:`uplink.Encoder`. Each websocket session or utterance is
+        encoded as a separate stream.
+    :type encoding: str
+    :parameter frame_delay: Maximum seconds encoded audio is held back to
+        join it into larger websocket frames with an
+        :class:`uplink.CoalescingSender`. By default each write is sent as
+        a frame.
+    :type frame_delay: float
+    :parameter max_reconnects: Failed reconnect attempts after which
+        transcription fails with :class:`WatsonReconnectError`, 0 to not
+        reconnect, None to retry forever.
+    :type max_reconnects: int
+    :parameter reconnect_delay: Seconds to wait before the second reconnect
+        attempt, doubling for each later attempt up to
+        :attr:`MAX_RECONNECT_DELAY`.
+    :type reconnect_delay: float
+    :parameter replay_seconds: Maximum seconds of sent audio kept to send
+        again after reconnecting.
+    :type replay_seconds: float
+    """
+    MAX_RECONNECT_DELAY = 5.
+
     def __init__(self, source, source_freq, user, password,
                  host='stream.watsonplatform.net',
                  uri_base='/speech-to-text/api/v1/recognize',
-                 model='en-US_BroadbandModel'):
+                 model='en-US_BroadbandModel',
+                 connection_pool=None, secure=True, encoding='l16',
+                 frame_delay=None, max_reconnects=5, reconnect_delay=.1,
+                 replay_seconds=20.):
         super(WatsonTranscriber, self).__init__(source)
         self._source_freq = source_freq
         self._user = user
@@ -131,27 +736,171 @@ class WatsonTranscriber(Transcriber):
         self._host = host
         self._uri_base = uri_base
         self._model = model
+        self._pool = connection_pool
+        self._secure = secure
+        self._encoder_factory = uplink.get_encoder_factory(encoding)
+        self._frame_delay = frame_delay
         self._ws = None
+        self._stream = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.frames = 0
+        self._send_seconds = 0.
+        self._stream_seconds = 0.
+        self.max_reconnects = max_reconnects
+        self.reconnect_delay = reconnect_delay
+        self.replay_seconds = replay_seconds
+        self._reconnect_lock = asyncio.Lock()
+        self._reconnect_error = None
+        self._replay = collections.deque()
+        self._audio_samples = 0
+        self._audio_time = 0.
+        self._sent_time = 0.
+        self._session_offset = 0.
+        self._final_end = None
+        self.reconnects = 0
+        self.replayed_seconds = 0.
+        self.replay_dropped_seconds = 0.
+        self.duplicates = 0
 
     async def _start(self):
-        connect_url = 'wss://%s/%s' % (self._host, self._uri_base)
-        auth_header = self._to_auth_header(self._user, self._passwd)
-        self._ws = await websockets.connect(
-            connect_url,
-            extra_headers={'Authorization': auth_header}
-        )
-        await self._send_start(self._ws, self._source_freq)
+        if self._pool is None:
+            self._replay.clear()
+            self._audio_samples = 0
+            self._audio_time = 0.
+            self._sent_time = 0.
+            self._session_offset = 0.
+            self._final_end = None
+            self._reconnect_error = None
+            self._ws = await self._connect()
+            self._stream = await self._start_stream(self._ws)
         await super(WatsonTranscriber, self)._start()
 
+    async def _connect(self):
+        connect_url = _watson_url(self._host, self._uri_base, self._secure)
+        auth_header = self._to_auth_header(self._user, self._passwd)
+        return await _ws_connect(connect_url, {'Authorization': auth_header})
+
     async def _stop(self):
-        await self._send_complete()
-        self._ws.close()
-        await super(WatsonTranscriber, self)._stop()
+        try:
+            if self._pool is None:
+                try:
+                    if self._stream is not None:
+                        if self.max_reconnects != 0:
+                            await self._send_buffered()
+                        await self._end_stream(self._stream)
+                        await self._send_complete()
+                finally:
+                    self._stream = None
+                    await _ws_close(self._ws)
+        finally:
+            await super(WatsonTranscriber, self)._stop()
+
+    def reconnect_stats(self):
+        """Counters of reconnects of the websocket session.
 
-    async def _send_start(self, ws, rate):
+        :ret: dict with reconnects, replayed_seconds of audio sent again,
+            replay_dropped_seconds of audio too old to keep for replay and
+            duplicates, the number of suppressed events.
+        """
+        return {'reconnects': self.reconnects,
+                'replayed_seconds': self.replayed_seconds,
+                'replay_dropped_seconds': self.replay_dropped_seconds,
+                'duplicates': self.duplicates}
+
+    async def _reconnect(self, failed_ws):
+        """Replace a failed session.
+
+        Both the reading and sending tasks notice a dropped connection, the
+        first to do so reconnects. Buffered audio is sent to the new session
+        by :func:`_send_buffered`.
+        """
+        async with self._reconnect_lock:
+            if self._ws is not failed_ws:
+                return
+            if self._reconnect_error is not None:
+                raise self._reconnect_error
+            if self._stream is not None:
+                await self._stream.abort()
+                self._stream = None
+            await _ws_close(failed_ws)
+            attempt = 0
+            while True:
+                if attempt:
+                    await asyncio.sleep(min(
+                        self.reconnect_delay * 2 ** (attempt - 1),
+                        self.MAX_RECONNECT_DELAY
+                    ))
+                try:
+                    ws = await self._connect()
+                    stream = await self._start_stream(ws)
+                except (OSError, WatsonStartError,
+                        websockets.exceptions.WebSocketException) as e:
+                    attempt += 1
+                    unlimited = self.max_reconnects is None
+                    if not unlimited and attempt > self.max_reconnects:
+                        self._reconnect_error = WatsonReconnectError(
+                            attempt, e
+                        )
+                        raise self._reconnect_error
+                    LOG.warning('Reconnecting to Watson failed: %r', e)
+                    continue
+                break
+            offset = self._audio_time
+            if self._replay:
+                offset = self._replay[0][0]
+            LOG.info('Reconnected to Watson, sending %.2fs of audio again',
+                     self._audio_time - offset)
+            self._ws = ws
+            self._stream = stream
+            self._session_offset = offset
+            self._sent_time = offset
+            self.reconnects += 1
+            self.replayed_seconds += self._audio_time - offset
+
+    def uplink_stats(self):
+        """Audio and frames sent in finished streams.
+
+        :ret: dict with bytes_in, audio bytes read, bytes_out, encoded
+            bytes sent, and their ratio, as well as the frame counters of
+            :func:`uplink.FrameSender.stats` over time spent streaming.
+        """
+        ret = uplink.frame_stats(self.frames, self.bytes_out,
+                                 self._send_seconds, self._stream_seconds)
+        ratio = None
+        if self.bytes_in:
+            ratio = float(self.bytes_out) / self.bytes_in
+        ret.update({'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out,
+                    'ratio': ratio})
+        del ret['bytes']
+        return ret
+
+    async def _start_stream(self, ws):
+        label = self.__class__.__name__
+        if self._frame_delay is None:
+            sender = uplink.FrameSender(ws.send, label=label)
+        else:
+            sender = uplink.CoalescingSender(ws.send, self._frame_delay,
+                                             label=label)
+        encoder = self._encoder_factory()
+        await self._send_start(ws, encoder.content_type(self._source_freq))
+        await encoder.start(self._source_freq, sender.send)
+        return _UplinkStream(encoder, sender)
+
+    async def _end_stream(self, stream):
+        try:
+            await stream.close()
+        finally:
+            self.bytes_in += stream.encoder.bytes_in
+            self.bytes_out += stream.encoder.bytes_out
+            self.frames += stream.sender.frames
+            self._send_seconds += stream.sender.send_seconds
+            self._stream_seconds += stream.sender.seconds
+
+    async def _send_start(self, ws, content_type):
         start_data = {
             "action": "start",
-            "content-type": "audio/l16;rate=%d" % rate,
+            "content-type": content_type,
             "continuous": True,
             "interim_results": True,
             "word_confidence": True,
@@ -159,43 +908,406 @@ class WatsonTranscriber(Transcriber):
             "max_alternatives": 3
         }
         await ws.send(json.dumps(start_data))
-        msg = json.loads(await ws.recv())
+        msg = _json_loads(await ws.recv())
         if msg.get('state') != 'listening':
             raise WatsonStartError(msg)
 
     async def _handle_audio_block(self, block):
+        if self._pool is not None:
+            await self._transcribe_utterance(block)
+            return
         async for chunk in block:
             await self._send_chunk(chunk)
 
+    async def _transcribe_utterance(self, block):
+        ws = await self._pool.acquire()
+        stream = None
+        try:
+            stream = await self._start_stream(ws)
+            reader = asyncio.ensure_future(self._read_utterance_events(ws))
+            try:
+                async for chunk in block:
+                    await stream.encoder.write(chunk.audio)
+                await self._end_stream(stream)
+                await ws.send(json.dumps({'action': 'stop'}))
+                await reader
+            finally:
+                reader.cancel()
+        except BaseException:
+            if stream is not None:
+                await stream.abort()
+            await self._pool.discard(ws)
+            raise
+        await self._pool.release(ws)
+
+    async def _read_utterance_events(self, ws):
+        while True:
+            msg = _json_loads(await ws.recv())
+            if msg.get('state') == 'listening':
+                break
+            await self._handle_event(self._msg_to_event(msg))
+
     async def _send_chunk(self, audio_chunk):
-        await self._ws.send(bytes(audio_chunk.audio))
+        if self.max_reconnects == 0:
+            await self._stream.encoder.write(audio_chunk.audio)
+            return
+        self._buffer_audio(audio_chunk)
+        await self._send_buffered()
+
+    async def _send_buffered(self):
+        """Send buffered audio the current session has not been sent."""
+        while True:
+            if self._reconnect_lock.locked():
+                async with self._reconnect_lock:
+                    pass
+            if self._reconnect_error is not None:
+                raise self._reconnect_error
+            ws = self._ws
+            stream = self._stream
+            pending = []
+            for entry in reversed(self._replay):
+                if entry[0] < self._sent_time:
+                    break
+                pending.append(entry)
+            try:
+                for _, end, data in reversed(pending):
+                    await stream.encoder.write(data)
+                    if self._stream is not stream:
+                        # Reconnected while sending, start over
+                        break
+                    self._sent_time = end
+                else:
+                    return
+            except websockets.exceptions.ConnectionClosed:
+                await self._reconnect(ws)
+
+    def _buffer_audio(self, audio_chunk):
+        # Times are kept from a sample count so they do not drift
+        start = self._audio_time
+        self._audio_samples += audio.chunk_sample_cnt(audio_chunk)
+        self._audio_time = self._audio_samples / float(audio_chunk.freq)
+        replay = self._replay
+        replay.append((start, self._audio_time, bytes(audio_chunk.audio)))
+        oldest = self._audio_time - self.replay_seconds
+        while replay and replay[0][1] <= oldest:
+            start, end, _ = replay.popleft()
+            self.replay_dropped_seconds += end - start
+
+    def _acknowledge(self, end):
+        """Drop buffered audio before end, it has been transcribed."""
+        replay = self._replay
+        while replay and replay[0][1] <= end:
+            replay.popleft()
 
     async def _send_complete(self):
         await self._ws.send(json.dumps({'action': 'stop'}))
 
     async def _read_events(self):
+        if self._pool is not None:
+            # Events are read per utterance
+            return
         while self.running:
+            ws = self._ws
             try:
-                read = await self._ws.recv()
-            except websockets.exceptions.ConnectionClosed as e:
-                break
-            msg = json.loads(read)
-            ev = self._msg_to_event(msg)
-            await self._handle_event(ev)
+                read = await ws.recv()
+            except websockets.exceptions.ConnectionClosed:
+                if not self.running or self.max_reconnects == 0:
+                    break
+                try:
+                    await self._reconnect(ws)
+                except WatsonReconnectError as e:
+                    LOG.error('Lost connection to Watson: %s', e)
+                    break
+                continue
+            ev = self._session_event(_json_loads(read))
+            if ev is not None:
+                await self._handle_event(ev)
+
+    def _session_event(self, msg):
+        """Event of a message of the current session.
+
+        :ret: The event, or None if it repeats results from before a
+            reconnect.
+        """
+        offset = self._session_offset
+        end = _watson_msg_end(msg)
+        if end is None:
+            return _watson_msg_to_event(msg, offset)
+        end += offset
+        final_end = self._final_end
+        if final_end is not None and end <= final_end + .001:
+            self.duplicates += 1
+            return None
+        ev = _watson_msg_to_event(msg, offset)
+        if ev.final:
+            self._final_end = end
+            self._acknowledge(end)
+        return ev
 
     def _to_auth_header(self, user, passwd):
-        seed = ':'.join((user, passwd))
-        return ' '.join(('Basic',
-                         base64.b64encode(seed.encode('utf-8')).decode()))
+        return _basic_auth_header(user, passwd)
 
     def _msg_to_event(self, msg):
-        t_rs = []
-        for result in msg.get('results', [{}]):
-            for alt in result.get('alternatives', []):
-                t_rs.append(TranscribeResult(alt['transcript'],
-                                             alt.get('confidence', None)))
+        return _watson_msg_to_event(msg)
+
+
+def _watson_msg_to_event(msg, offset=0.):
+    # Watson marks each result final, an event is final if any result is.
+    final = msg.get('final', False)
+    t_rs = []
+    for result in msg.get('results', ()):
+        if result.get('final'):
+            final = True
+        for alt in result.get('alternatives', ()):
+            t_rs.append(TranscribeResult(alt['transcript'],
+                                         alt.get('confidence'), alt, offset))
+    return TranscribeEvent(t_rs, final)
+
+
+def _watson_msg_end(msg):
+    """Session time of the end of the last word in a message, or None."""
+    results = msg.get('results')
+    if not results:
+        return None
+    alternatives = results[-1].get('alternatives')
+    if not alternatives:
+        return None
+    timestamps = alternatives[0].get('timestamps')
+    if not timestamps:
+        return None
+    return timestamps[-1][2]
 
-        return TranscribeEvent(t_rs, msg.get('final', False))
+
+def _new_ps_decoder(hmm_path, lm_path, dict_path):
+    config = pocketsphinx.Decoder.default_config()
+    config.set_string('-hmm', hmm_path)
+    config.set_string('-lm', lm_path)
+    config.set_string('-dict', dict_path)
+    return pocketsphinx.Decoder(config)
+
+
+class PocketSphinxDecoderPool(object):
+    """Process wide pool of pocketsphinx decoders.
+
+    Loading a decoder's models takes seconds, so decoders are kept once
+    built and leased out again to later users of the same models. Decoders
+    are keyed by their (hmm_path, lm_path, dict_path) model paths. Methods
+    are thread safe.
+
+    :parameter max_decoders: Maximum number of decoders alive at once, or
+        None for no limit. When the limit is reached an idle decoder for
+        other models is discarded, otherwise callers wait for a release.
+    :type max_decoders: int
+    """
+    # Longest a lease waits for a full pool in a single executor call
+    lease_poll_interval = .1
+
+    def __init__(self, max_decoders=None):
+        self.max_decoders = max_decoders
+        self._cond = threading.Condition()
+        self._idle = collections.OrderedDict()
+        self._leased = {}
+        self._n_decoders = 0
+
+    @property
+    def size(self):
+        """Number of decoders alive, leased or idle."""
+        return self._n_decoders
+
+    def _take_idle(self, model_paths):
+        for decoder_id, (paths, decoder) in self._idle.items():
+            if paths == model_paths:
+                del self._idle[decoder_id]
+                self._leased[decoder_id] = model_paths
+                return decoder
+        return None
+
+    def try_acquire(self, model_paths):
+        """Lease an idle decoder without building or waiting.
+
+        :ret: A decoder, or None if there are no idle decoders for the
+            models.
+        """
+        with self._cond:
+            return self._take_idle(tuple(model_paths))
+
+    def acquire(self, model_paths, timeout=None):
+        """Lease a decoder, building one if needed.
+
+        This blocks while models load or while the pool is full, use
+        :func:`lease` from a coroutine.
+
+        :param model_paths: (hmm_path, lm_path, dict_path)
+        :type model_paths: tuple
+        :param timeout: Seconds to wait for a full pool, forever if None.
+        :type timeout: float
+        :ret: A decoder, or None on timeout.
+        """
+        model_paths = tuple(model_paths)
+        with self._cond:
+            while True:
+                decoder = self._take_idle(model_paths)
+                if decoder is not None:
+                    return decoder
+                if self.max_decoders is None:
+                    break
+                if self._n_decoders < self.max_decoders:
+                    break
+                if self._idle:
+                    # Make room by discarding the least recently used
+                    self._idle.popitem(last=False)
+                    self._n_decoders -= 1
+                    break
+                if not self._cond.wait(timeout):
+                    return None
+            self._n_decoders += 1
+
+        try:
+            decoder = _new_ps_decoder(*model_paths)
+        except Exception:
+            with self._cond:
+                self._n_decoders -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._leased[id(decoder)] = model_paths
+        return decoder
+
+    async def lease(self, model_paths):
+        """Lease a decoder without blocking the event loop.
+
+        A full pool is waited on in executor calls of at most
+        :attr:`lease_poll_interval` seconds, so waiting leases do not hold
+        executor threads and can be cancelled. A decoder acquired for a
+        cancelled lease is released.
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            decoder = self.try_acquire(model_paths)
+            if decoder is not None:
+                return decoder
+            fut = loop.run_in_executor(None, self.acquire, model_paths,
+                                       self.lease_poll_interval)
+            try:
+                decoder = await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                fut.add_done_callback(self._release_abandoned)
+                raise
+            if decoder is not None:
+                return decoder
+
+    def _release_abandoned(self, fut):
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        if fut.result() is not None:
+            self.release(fut.result())
+
+    def release(self, decoder):
+        """Return a leased decoder to the pool."""
+        with self._cond:
+            model_paths = self._leased.pop(id(decoder))
+            self._idle[id(decoder)] = (model_paths, decoder)
+            self._cond.notify()
+
+    def preload(self, model_paths, count=1):
+        """Build decoders ahead of time so later leases are immediate."""
+        decoders = [self.acquire(model_paths) for _ in range(count)]
+        for decoder in decoders:
+            self.release(decoder)
+
+
+_default_decoder_pool = None
+_default_decoder_pool_lock = threading.Lock()
+
+
+def default_decoder_pool():
+    """The process wide :class:`PocketSphinxDecoderPool`."""
+    global _default_decoder_pool
+    with _default_decoder_pool_lock:
+        if _default_decoder_pool is None:
+            _default_decoder_pool = PocketSphinxDecoderPool()
+        return _default_decoder_pool
+
+
+def set_default_decoder_pool(pool):
+    """Replace the process wide :class:`PocketSphinxDecoderPool`."""
+    global _default_decoder_pool
+    with _default_decoder_pool_lock:
+        _default_decoder_pool = pool
+
+
+# Decoder leased by the current pool worker, see PocketSphinxWorkerPool
+_ps_worker = threading.local()
+
+
+def _ps_worker_start_utt(model_paths):
+    pool = default_decoder_pool()
+    decoder = getattr(_ps_worker, 'decoder', None)
+    if decoder is not None:
+        # A previous utterance was abandoned before it ended
+        decoder.end_utt()
+        pool.release(decoder)
+    _ps_worker.decoder = pool.acquire(model_paths)
+    _ps_worker.decoder.start_utt()
+
+
+def _ps_worker_process_raw(audio):
+    _ps_worker.decoder.process_raw(audio, False, False)
+
+
+def _ps_worker_end_utt():
+    decoder = _ps_worker.decoder
+    _ps_worker.decoder = None
+    try:
+        decoder.end_utt()
+        hyp = decoder.hyp()
+    finally:
+        default_decoder_pool().release(decoder)
+    if hyp:
+        return hyp.hypstr
+    return None
+
+
+class PocketSphinxWorkerPool(object):
+    """Pool of workers which each own a pocketsphinx decoder.
+
+    An utterance is decoded entirely by one worker: its audio chunks are
+    submitted to the worker as they arrive and the hypothesis is returned
+    once the utterance ends, without blocking the event loop. A pool may be
+    shared by many :class:`PocketSphinxTranscriber` so that up to `size`
+    utterances are decoded in parallel.
+
+    :parameter size: Number of workers, defaults to the number of CPUs.
+    :type size: int
+    :parameter use_processes: Run workers in processes rather than threads.
+    :type use_processes: bool
+    """
+    def __init__(self, size=None, use_processes=False):
+        self.size = size or os.cpu_count() or 1
+        self.use_processes = use_processes
+        if use_processes:
+            executor_cls = futures.ProcessPoolExecutor
+        else:
+            executor_cls = futures.ThreadPoolExecutor
+        self._workers = [executor_cls(max_workers=1)
+                         for _ in range(self.size)]
+        self._idle = None
+
+    async def lease(self):
+        """Wait for an idle worker and reserve it."""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for worker in self._workers:
+                self._idle.put_nowait(worker)
+        return await self._idle.get()
+
+    def release(self, worker):
+        """Return a worker obtained from :func:`lease` to the pool."""
+        self._idle.put_nowait(worker)
+
+    def shutdown(self, wait=True):
+        for worker in self._workers:
+            worker.shutdown(wait)
 
 
 class PocketSphinxTranscriber(Transcriber):
@@ -207,23 +1319,39 @@ class PocketSphinxTranscriber(Transcriber):
 
     :parameter source: Input audio source
     :type source: audio.AudioSource
+    :parameter worker_pool: Pool to decode in, if None decoding happens in
+        the event loop.
+    :type worker_pool: PocketSphinxWorkerPool
+    :parameter decoder_pool: Pool to lease a decoder from when decoding in
+        the event loop, :func:`default_decoder_pool` if None.
+    :type decoder_pool: PocketSphinxDecoderPool
 
     .. _Bulk Transcription: ../bulk.html
     """
-    def __init__(self, source, hmm_path, lm_path, dict_path):
+    def __init__(self, source, hmm_path, lm_path, dict_path,
+                 worker_pool=None, decoder_pool=None):
         super(PocketSphinxTranscriber, self).__init__(source)
         self._decoder = None
         self.hmm_path = hmm_path
         self.lm_path = lm_path
         self.dict_path = dict_path
+        self._worker_pool = worker_pool
+        self._decoder_pool = decoder_pool
+
+    @property
+    def model_paths(self):
+        return (self.hmm_path, self.lm_path, self.dict_path)
 
     @staticmethod
-    def default_config(source, model_dir=None):
+    def default_config(source, model_dir=None, worker_pool=None,
+                       decoder_pool=None):
         model_dir = model_dir or '/usr/share/pocketsphinx/model/'
         hmm_path = os.path.join(model_dir, 'en-us/en-us')
         lm_path = os.path.join(model_dir, 'en-us/en-us.lm.bin')
         dict_path = os.path.join(model_dir, 'en-us/cmudict-en-us.dict')
-        return PocketSphinxTranscriber(source, hmm_path, lm_path, dict_path)
+        return PocketSphinxTranscriber(source, hmm_path, lm_path, dict_path,
+                                       worker_pool=worker_pool,
+                                       decoder_pool=decoder_pool)
 
     @contextmanager
     def utterance(self):
@@ -235,25 +1363,48 @@ class PocketSphinxTranscriber(Transcriber):
         self._decoder.end_utt()
 
     async def _start(self):
-        config = pocketsphinx.Decoder.default_config()
-        config.set_string('-hmm', self.hmm_path)
-        config.set_string('-lm', self.lm_path)
-        config.set_string('-dict', self.dict_path)
-        self._decoder = pocketsphinx.Decoder(config)
+        if self._worker_pool is None:
+            pool = self._decoder_pool or default_decoder_pool()
+            self._decoder = await pool.lease(self.model_paths)
         await super(PocketSphinxTranscriber, self)._start()
 
     async def _stop(self):
         await super(PocketSphinxTranscriber, self)._stop()
+        if self._decoder is not None:
+            pool = self._decoder_pool or default_decoder_pool()
+            pool.release(self._decoder)
         self._decoder = None
 
     async def _handle_audio_block(self, block):
-        with self.utterance():
-            async for audio_chunk in block:
-                self._decoder.process_raw(audio_chunk.audio, False, False)
-        hyp = self._decoder.hyp()
-        if hyp:
-            res = TranscribeResult(hyp.hypstr)
+        if self._worker_pool is None:
+            with self.utterance():
+                async for audio_chunk in block:
+                    self._decoder.process_raw(audio_chunk.audio, False, False)
+            hyp = self._decoder.hyp()
+            hypstr = hyp.hypstr if hyp else None
+        else:
+            hypstr = await self._decode_in_worker(block)
+        if hypstr:
+            res = TranscribeResult(hypstr)
             await self._handle_event(TranscribeEvent((res,), True))
 
+    async def _decode_in_worker(self, block):
+        loop = asyncio.get_event_loop()
+        worker = await self._worker_pool.lease()
+        try:
+            # The worker runs calls in order so chunks are submitted without
+            # waiting, results are only collected once the utterance ends.
+            pending = [loop.run_in_executor(worker, _ps_worker_start_utt,
+                                            self.model_paths)]
+            async for audio_chunk in block:
+                pending.append(loop.run_in_executor(
+                    worker, _ps_worker_process_raw, bytes(audio_chunk.audio)
+                ))
+            pending.append(loop.run_in_executor(worker, _ps_worker_end_utt))
+            results = await asyncio.gather(*pending)
+        finally:
+            self._worker_pool.release(worker)
+        return results[-1]
+
     async def _read_events(self):
         pass
@@ -0,0 +1,421 @@
+"""Encoding of audio sent to transcription services
+
+Transcribers send 16 bit mono PCM. An encoder compresses a stream of this
+audio as it is written and sends the encoded stream on, so less data goes
+over the wire. :class:`FlacEncoder` and :class:`OpusEncoder` run the
+``flac`` and ``opusenc`` command line encoders in a subprocess, so encoding
+runs off the event loop and alongside it.
+
+An encoder encodes a single stream: it is started with the stream's
+sampling frequency and a coroutine function to send encoded data with,
+audio is written to it, and closing it sends the end of the stream.
+
+Encoded data is sent as websocket frames by a :class:`FrameSender`, which
+counts frames, or a :class:`CoalescingSender`, which joins small writes
+into larger frames.
+"""
+
+import asyncio
+import shutil
+import time
+
+from streamtotext import metrics
+
+
+class EncoderError(Exception):
+    pass
+
+
+class Encoder(object):
+    """Base class for stream encoders.
+
+    :attr:`bytes_in` and :attr:`bytes_out` count audio written and encoded
+    data sent.
+    """
+    name = None
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._send = None
+
+    @staticmethod
+    def available():
+        return True
+
+    def content_type(self, rate):
+        """MIME type of the encoded stream, as sent to Watson."""
+        raise NotImplementedError()
+
+    async def start(self, rate, send):
+        """Start a stream.
+
+        :param rate: Sampling frequency of the audio.
+        :type rate: int
+        :param send: Coroutine function called with encoded bytes.
+        """
+        self._send = send
+
+    async def write(self, data):
+        """Encode audio, sending encoded data as it is available."""
+        raise NotImplementedError()
+
+    async def close(self):
+        """End the stream, sending any remaining encoded data."""
+        pass
+
+    async def abort(self):
+        """End the stream without sending remaining data."""
+        pass
+
+    async def _sent(self, data):
+        self.bytes_out += len(data)
+        await self._send(data)
+
+
+class PCMEncoder(Encoder):
+    """Send audio unencoded as ``audio/l16``."""
+    name = 'l16'
+
+    def content_type(self, rate):
+        return 'audio/l16;rate=%d' % rate
+
+    async def write(self, data):
+        self.bytes_in += len(data)
+        await self._sent(bytes(data))
+
+
+class ProcessEncoder(Encoder):
+    """Encode with a command reading PCM on stdin and writing to stdout.
+
+    Subclasses set :attr:`program` and implement :func:`command`.
+
+    :parameter read_size: Maximum bytes read from the command at once.
+    :type read_size: int
+    """
+    program = None
+
+    def __init__(self, read_size=65536):
+        super(ProcessEncoder, self).__init__()
+        self._read_size = read_size
+        self._proc = None
+        self._reader = None
+
+    @classmethod
+    def available(cls):
+        return shutil.which(cls.program) is not None
+
+    def command(self, rate):
+        """Arguments to run the encoder with."""
+        raise NotImplementedError()
+
+    async def start(self, rate, send):
+        await super(ProcessEncoder, self).start(rate, send)
+        try:
+            self._proc = await asyncio.create_subprocess_exec(
+                *self.command(rate),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except OSError as e:
+            raise EncoderError('Unable to run %s: %s' % (self.program, e))
+        self._reader = asyncio.ensure_future(self._read(self._proc.stdout))
+
+    async def _read(self, stdout):
+        while True:
+            data = await stdout.read(self._read_size)
+            if not data:
+                return
+            await self._sent(data)
+
+    async def write(self, data):
+        self.bytes_in += len(data)
+        self._proc.stdin.write(data)
+        try:
+            await self._proc.stdin.drain()
+        except ConnectionError:
+            # The encoder exited, close() reports why.
+            pass
+
+    async def close(self):
+        proc = self._proc
+        if proc is None:
+            return
+        self._proc = None
+        proc.stdin.close()
+        try:
+            await self._reader
+        finally:
+            stderr = await proc.stderr.read()
+            await proc.wait()
+        if proc.returncode != 0:
+            raise EncoderError('%s exited with %d: %s' % (
+                self.program, proc.returncode,
+                stderr.decode('utf-8', 'replace').strip()
+            ))
+
+    async def abort(self):
+        proc = self._proc
+        if proc is None:
+            return
+        self._proc = None
+        reader = self._reader
+        if reader.done() and not reader.cancelled():
+            # As when sending failed on a dropped connection
+            reader.exception()
+        reader.cancel()
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+
+
+class FlacEncoder(ProcessEncoder):
+    """Encode as ``audio/flac`` with the ``flac`` command.
+
+    :parameter compression_level: 0, fastest, to 8, smallest.
+    :type compression_level: int
+    """
+    name = 'flac'
+    program = 'flac'
+
+    def __init__(self, compression_level=5, read_size=65536):
+        super(FlacEncoder, self).__init__(read_size)
+        self.compression_level = compression_level
+
+    def content_type(self, rate):
+        return 'audio/flac'
+
+    def command(self, rate):
+        return [self.program, '--silent', '--force-raw-format',
+                '--endian=little', '--sign=signed', '--channels=1',
+                '--bps=16', '--sample-rate=%d' % rate,
+                '-%d' % self.compression_level, '-o', '-', '-']
+
+
+class OpusEncoder(ProcessEncoder):
+    """Encode as ``audio/ogg;codecs=opus`` with the ``opusenc`` command.
+
+    :parameter bitrate: Target bitrate in kbit/s, opusenc's default if
+        None.
+    :type bitrate: float
+    :parameter max_delay: Maximum milliseconds of audio buffered before an
+        Ogg page is written.
+    :type max_delay: int
+    """
+    name = 'opus'
+    program = 'opusenc'
+
+    def __init__(self, bitrate=None, max_delay=100, read_size=65536):
+        super(OpusEncoder, self).__init__(read_size)
+        self.bitrate = bitrate
+        self.max_delay = max_delay
+
+    def content_type(self, rate):
+        return 'audio/ogg;codecs=opus'
+
+    def command(self, rate):
+        cmd = [self.program, '--quiet', '--raw', '--raw-bits', '16',
+               '--raw-rate', str(rate), '--raw-chan', '1',
+               '--raw-endianness', '0', '--max-delay', str(self.max_delay)]
+        if self.bitrate is not None:
+            cmd.extend(['--bitrate', str(self.bitrate)])
+        return cmd + ['-', '-']
+
+
+ENCODERS = dict((x.name, x) for x in (PCMEncoder, FlacEncoder, OpusEncoder))
+
+
+def get_encoder_factory(encoding):
+    """Find the encoder class for an encoding.
+
+    :param encoding: A name in :data:`ENCODERS`, or a callable returning a
+        new :class:`Encoder`.
+    :ret: Callable returning a new :class:`Encoder`.
+    """
+    if callable(encoding):
+        return encoding
+    try:
+        encoder_cls = ENCODERS[encoding]
+    except KeyError:
+        raise ValueError('Unknown encoding %s' % encoding)
+    if not encoder_cls.available():
+        raise EncoderError('%s encoding requires the %s program' % (
+            encoding, encoder_cls.program
+        ))
+    return encoder_cls
+
+
+class FrameSender(object):
+    """Send each write as a frame, counting frames and time spent sending.
+
+    When a :mod:`metrics` sink is set, ``send_seconds`` is observed and
+    ``frames_total`` and ``frame_bytes_total`` are incremented per frame,
+    labelled by transcriber.
+
+    :parameter send: Coroutine function sending a frame, such as a
+        websocket's send.
+    :parameter label: Transcriber label of metrics.
+    :type label: str
+    """
+    def __init__(self, send, label=None):
+        self._send = send
+        self._label = label
+        self.frames = 0
+        self.bytes = 0
+        self.send_seconds = 0.
+        self._started = time.perf_counter()
+        self.seconds = None
+
+    async def send(self, data):
+        await self._send_frame(data)
+
+    async def close(self):
+        """Send anything held back and stop timing."""
+        self.seconds = time.perf_counter() - self._started
+
+    def abort(self):
+        """Stop without sending anything held back."""
+        self.seconds = time.perf_counter() - self._started
+
+    async def _send_frame(self, data):
+        start = time.perf_counter()
+        await self._send(data)
+        elapsed = time.perf_counter() - start
+        self.frames += 1
+        self.bytes += len(data)
+        self.send_seconds += elapsed
+        sink = metrics._sink
+        if sink is not None:
+            sink.observe('send_seconds', elapsed, transcriber=self._label)
+            sink.increment('frames_total', transcriber=self._label)
+            sink.increment('frame_bytes_total', len(data),
+                           transcriber=self._label)
+        return elapsed
+
+    def stats(self):
+        """Frame counters.
+
+        :ret: dict with frames, bytes, frames_per_sec, avg_frame_size and
+            avg_send_seconds.
+        """
+        seconds = self.seconds
+        if seconds is None:
+            seconds = time.perf_counter() - self._started
+        return frame_stats(self.frames, self.bytes, self.send_seconds,
+                           seconds)
+
+
+def frame_stats(frames, n_bytes, send_seconds, seconds):
+    ret = {'frames': frames, 'bytes': n_bytes, 'frames_per_sec': None,
+           'avg_frame_size': None, 'avg_send_seconds': None}
+    if seconds > 0:
+        ret['frames_per_sec'] = frames / seconds
+    if frames:
+        ret['avg_frame_size'] = float(n_bytes) / frames
+        ret['avg_send_seconds'] = send_seconds / frames
+    return ret
+
+
+class CoalescingSender(FrameSender):
+    """Join writes into frames of a target size sent within a delay.
+
+    Writes are buffered until they reach :attr:`frame_size` bytes, or for
+    at most max_delay seconds, and writes made while a frame is being sent
+    join the next frame. The target size adapts to the average time sends
+    take: it doubles, up to max_frame_size, while sends are slower than
+    slow_send seconds, and halves, down to min_frame_size, while they take
+    less than half that. A slow connection therefore gets fewer, larger
+    frames, while a fast one gets audio with less delay.
+
+    :parameter max_delay: Maximum seconds a write is held back.
+    :type max_delay: float
+    :parameter min_frame_size: Smallest target frame size in bytes.
+    :type min_frame_size: int
+    :parameter max_frame_size: Largest target frame size in bytes.
+    :type max_frame_size: int
+    :parameter slow_send: Average send time in seconds above which frames
+        grow.
+    :type slow_send: float
+    """
+    def __init__(self, send, max_delay=.05, min_frame_size=1024,
+                 max_frame_size=65536, slow_send=.005, label=None):
+        super(CoalescingSender, self).__init__(send, label)
+        self.max_delay = max_delay
+        self.min_frame_size = min_frame_size
+        self.max_frame_size = max_frame_size
+        self.slow_send = slow_send
+        self.frame_size = min_frame_size
+        self.avg_send = None
+        self._buf = []
+        self._buf_len = 0
+        self._lock = asyncio.Lock()
+        self._timer = None
+        self._error = None
+
+    async def send(self, data):
+        self._raise_error()
+        self._buf.append(bytes(data))
+        self._buf_len += len(data)
+        if self._buf_len >= self.frame_size:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.ensure_future(self._flush_later())
+
+    async def flush(self):
+        """Send buffered writes as a frame now."""
+        self._cancel_timer()
+        async with self._lock:
+            if not self._buf:
+                return
+            data = b''.join(self._buf)
+            self._buf = []
+            self._buf_len = 0
+            elapsed = await self._send_frame(data)
+        self._adapt(elapsed)
+
+    async def close(self):
+        await self.flush()
+        self._raise_error()
+        await super(CoalescingSender, self).close()
+
+    def abort(self):
+        self._cancel_timer()
+        self._buf = []
+        self._buf_len = 0
+        super(CoalescingSender, self).abort()
+
+    def stats(self):
+        ret = super(CoalescingSender, self).stats()
+        ret['frame_size'] = self.frame_size
+        return ret
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        # Past here flush() must not cancel this task mid send.
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            self._error = e
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _raise_error(self):
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+
+    def _adapt(self, elapsed):
+        if self.avg_send is None:
+            self.avg_send = elapsed
+        else:
+            self.avg_send += .2 * (elapsed - self.avg_send)
+        if self.avg_send > self.slow_send:
+            self.frame_size = min(self.frame_size * 2, self.max_frame_size)
+        elif self.avg_send < self.slow_send / 2:
+            self.frame_size = max(self.frame_size // 2, self.min_frame_size)
@@ -3,3 +3,13 @@ import os
 
 def wav_dir():
     return os.path.join(os.path.dirname(__file__), 'tests/test_data')
+
+
+def percentile(values, pct):
+    """Nearest rank percentile of a list of values."""
+    if not values:
+        return None
+    values = sorted(values)
+    ndx = max(0, min(len(values) - 1,
+                     int(round(pct / 100. * len(values))) - 1))
+    return values[ndx]